@@ -0,0 +1,2 @@
+from .response_cache import ResponseCache
+from .store import MemoryStore, RedisStore
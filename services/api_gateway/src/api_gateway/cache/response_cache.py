@@ -0,0 +1,240 @@
+import asyncio
+import fnmatch
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .store import MemoryStore
+
+logger = logging.getLogger(__name__)
+
+Headers = List[Tuple[str, str]]
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Split a Cache-Control header into lowercase directives"""
+    directives = {}
+    for part in value.split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+def _seconds(directives: Dict[str, Optional[str]], name: str) -> Optional[int]:
+    try:
+        return int(directives[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _header(headers: Headers, name: str) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
+
+class ResponseCache:
+    """HTTP cache for idempotent GETs the gateway proxies to backend services.
+
+    Only routes matching a TTL rule are cached. Upstream Cache-Control
+    (no-store, private, max-age, s-maxage, stale-while-revalidate) overrides the
+    rule. Stale entries are served while a background request refreshes them,
+    and expired ones are revalidated with If-None-Match/If-Modified-Since.
+    Each key holds one variant: the request headers named by Vary (and
+    Accept-Encoding, since bodies are stored still encoded) must match for an
+    entry to be served.
+    """
+
+    def __init__(
+        self,
+        rules: Dict[str, int],
+        stale_while_revalidate: int = 30,
+        retain_seconds: int = 600,
+        max_entry_bytes: int = 1024 * 1024,
+        store=None,
+    ):
+        self.rules = rules
+        self.stale_while_revalidate = stale_while_revalidate
+        self.retain_seconds = retain_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.store = store if store is not None else MemoryStore(64 * 1024 * 1024)
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidated": 0, "stores": 0}
+
+    def ttl_for(self, service_name: str, path: str) -> Optional[int]:
+        """TTL of the first rule matching service/path, or None if the route is not cached"""
+        route = f"{service_name}/{path}".rstrip("/")
+        for pattern, ttl in self.rules.items():
+            if fnmatch.fnmatchcase(route, pattern):
+                return ttl
+        return None
+
+    @staticmethod
+    def is_cacheable_request(request: Request) -> bool:
+        # Responses to authorized requests are per user, so a shared cache must skip them
+        if request.method != "GET" or "authorization" in request.headers:
+            return False
+        return "no-store" not in parse_cache_control(request.headers.get("cache-control", ""))
+
+    def make_key(self, service_name: str, path: str, query: str) -> str:
+        return hashlib.sha256(f"{service_name}/{path}?{query}".encode()).hexdigest()
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(key)
+
+    @staticmethod
+    def matches(entry: Dict[str, Any], request: Request) -> bool:
+        """Whether entry is the variant for request's Vary'd headers"""
+        return all(request.headers.get(name) == value for name, value in entry.get("vary", {}).items())
+
+    def state(self, entry: Dict[str, Any]) -> str:
+        """Classify entry as fresh, stale (servable while revalidating) or expired"""
+        age = time.time() - entry["stored_at"]
+        if age < entry["ttl"]:
+            return "fresh"
+        if age < entry["ttl"] + entry["swr"]:
+            return "stale"
+        return "expired"
+
+    @staticmethod
+    def validators(entry: Dict[str, Any]) -> Headers:
+        """Conditional request headers for revalidating entry upstream"""
+        validators = []
+        if entry.get("etag"):
+            validators.append(("if-none-match", entry["etag"]))
+        if entry.get("last_modified"):
+            validators.append(("if-modified-since", entry["last_modified"]))
+        return validators
+
+    def revalidate_in_background(self, key: str, refresh: Callable[[], Awaitable[Any]]):
+        """Run refresh once per key, however many stale hits arrive meanwhile"""
+        if key in self._revalidating:
+            return
+        task = asyncio.create_task(refresh())
+        self._revalidating[key] = task
+        task.add_done_callback(lambda _: self._revalidating.pop(key, None))
+
+    async def store_response(
+        self,
+        key: str,
+        status: int,
+        headers: Headers,
+        body: bytes,
+        rule_ttl: int,
+        request_headers: Headers = (),
+    ) -> Dict[str, Any]:
+        """Build an entry from an upstream response and persist it if it may be cached"""
+        self.counters["misses"] += 1
+        directives = parse_cache_control(_header(headers, "cache-control") or "")
+        vary = {name.strip().lower() for name in (_header(headers, "vary") or "").split(",") if name.strip()}
+        sent = {k.lower(): v for k, v in request_headers}
+        entry = {
+            "status": status,
+            "headers": headers,
+            "body": body,
+            "stored_at": time.time(),
+            "etag": _header(headers, "etag"),
+            "last_modified": _header(headers, "last-modified"),
+            "vary": {name: sent.get(name) for name in vary | {"accept-encoding"}},
+            **self._lifetime(directives, rule_ttl),
+        }
+
+        storable = (
+            status == 200
+            and "*" not in vary
+            and "no-store" not in directives
+            and "private" not in directives
+            and _header(headers, "set-cookie") is None
+            and len(body) <= self.max_entry_bytes
+        )
+        if storable:
+            await self.store.set(key, entry, entry["ttl"] + entry["swr"] + self.retain_seconds)
+            self.counters["stores"] += 1
+        return entry
+
+    async def refresh(self, key: str, entry: Dict[str, Any], headers: Headers, rule_ttl: int) -> Dict[str, Any]:
+        """Renew an entry after the upstream answered 304 Not Modified"""
+        self.counters["revalidated"] += 1
+        # A 304 carries updated metadata (Cache-Control, ETag, Date) but no body
+        updated = dict(entry["headers"])
+        updated.update(headers)
+        directives = parse_cache_control(updated.get("cache-control", ""))
+        entry = {
+            **entry,
+            "headers": list(updated.items()),
+            "stored_at": time.time(),
+            "etag": updated.get("etag"),
+            "last_modified": updated.get("last-modified"),
+            **self._lifetime(directives, rule_ttl),
+        }
+        await self.store.set(key, entry, entry["ttl"] + entry["swr"] + self.retain_seconds)
+        return entry
+
+    def _lifetime(self, directives: Dict[str, Optional[str]], rule_ttl: int) -> Dict[str, int]:
+        if "no-cache" in directives:
+            ttl = 0
+        else:
+            ttl = _seconds(directives, "s-maxage")
+            if ttl is None:
+                ttl = _seconds(directives, "max-age")
+            if ttl is None:
+                ttl = rule_ttl
+        swr = _seconds(directives, "stale-while-revalidate")
+        if "no-cache" in directives or (ttl <= 0 and swr is None):
+            # Must be revalidated before every use, never served stale meanwhile
+            swr = 0
+        return {"ttl": ttl, "swr": self.stale_while_revalidate if swr is None else swr}
+
+    def serve(self, entry: Dict[str, Any], request: Request, outcome: str) -> Response:
+        """Answer from an entry, with 304 when the client already has this version"""
+        if outcome == "HIT":
+            self.counters["hits"] += 1
+        elif outcome == "STALE":
+            self.counters["stale_hits"] += 1
+
+        cache_headers = [
+            ("age", str(int(time.time() - entry["stored_at"]))),
+            ("x-cache", outcome),
+        ]
+        if entry["status"] == 200 and self._client_has(entry, request):
+            response = Response(status_code=304)
+            kept = [(k, v) for k, v in entry["headers"] if k in ("etag", "cache-control", "last-modified")]
+            response.raw_headers = self._encode(kept + cache_headers)
+            return response
+
+        response = Response(content=entry["body"], status_code=entry["status"])
+        response.raw_headers = self._encode(
+            entry["headers"] + [("content-length", str(len(entry["body"])))] + cache_headers
+        )
+        return response
+
+    @staticmethod
+    def _client_has(entry: Dict[str, Any], request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match or not entry.get("etag"):
+            return False
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        etag = entry["etag"].replace("W/", "", 1)
+        tags = [tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    @staticmethod
+    def _encode(headers: Headers) -> List[Tuple[bytes, bytes]]:
+        return [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.counters["hits"] + self.counters["stale_hits"]
+        total = served + self.counters["misses"] + self.counters["revalidated"]
+        return {
+            **self.counters,
+            "hit_ratio": round(served / total, 3) if total else 0.0,
+            "revalidating": len(self._revalidating),
+            "entries": len(self.store) if isinstance(self.store, MemoryStore) else None,
+        }
+
+    async def close(self):
+        for task in list(self._revalidating.values()):
+            task.cancel()
+        self._revalidating.clear()
+        await self.store.close()
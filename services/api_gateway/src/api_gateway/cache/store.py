@@ -0,0 +1,87 @@
+import base64
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # installed with the "redis" extra
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryStore:
+    """Bounded LRU of cached responses, sized by body bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Dict[str, Any], expire: int):
+        # Entries are dropped by LRU pressure; freshness is checked by the caller
+        await self.delete(key)
+        size = len(entry["body"])
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted["body"])
+
+    async def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry["body"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def close(self):
+        self._entries.clear()
+        self.size = 0
+
+class RedisStore:
+    """Cached responses in Redis, shared by all gateway replicas"""
+
+    def __init__(self, url: str, prefix: str = "gateway:http:"):
+        if redis is None:
+            raise RuntimeError("RedisStore requires redis; install api-gateway[redis]")
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = await self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.error(f"Response cache get error: {e}")
+            return None
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        entry["body"] = base64.b64decode(entry["body"])
+        return entry
+
+    async def set(self, key: str, entry: Dict[str, Any], expire: int):
+        payload = json.dumps({**entry, "body": base64.b64encode(entry["body"]).decode("ascii")})
+        try:
+            await self.client.set(self.prefix + key, payload, ex=expire)
+        except Exception as e:
+            logger.error(f"Response cache set error: {e}")
+
+    async def delete(self, key: str):
+        try:
+            await self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.error(f"Response cache delete error: {e}")
+
+    async def close(self):
+        await self.client.aclose()
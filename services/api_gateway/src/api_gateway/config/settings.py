@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Service URLs
@@ -7,12 +7,68 @@ class Settings(BaseSettings):
     content_processor_url: str = "http://localhost:8003"
     search_service_url: str = "http://localhost:8004"
     websocket_hub_url: str = "http://localhost:8005"
+    github_mcp_url: str = "http://localhost:8006"
     
     # API Gateway settings
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = True
     
+    # Relay upstream bodies byte for byte; False re-encodes responses as JSON
+    proxy_passthrough: bool = True
+    
+    # Upstream connection pools (one per service)
+    proxy_max_connections: int = 100
+    proxy_max_keepalive_connections: int = 20
+    proxy_keepalive_expiry: float = 30.0
+    proxy_http2: bool = False
+    proxy_connect_timeout: float = 5.0
+    proxy_read_timeout: float = 30.0
+    proxy_write_timeout: float = 30.0
+    # How long a request may wait for a free connection before failing with 503
+    proxy_pool_timeout: float = 5.0
+    # Per-service max_connections, e.g. {"llm": 200}
+    proxy_service_max_connections: Dict[str, int] = {}
+    
+    # Per-service circuit breaker
+    breaker_failure_rate: float = 0.5
+    breaker_min_requests: int = 20
+    breaker_window_seconds: float = 30.0
+    # Calls slower than this count as failures
+    breaker_slow_call_seconds: float = 10.0
+    # Per-service slow-call threshold; None counts only errors and 5xx, for
+    # backends whose normal calls are long (LLM generations take seconds)
+    breaker_service_slow_call_seconds: Dict[str, Optional[float]] = {"llm": None}
+    breaker_open_seconds: float = 15.0
+    breaker_half_open_probes: int = 3
+    
+    # Per-service adaptive (AIMD) concurrency limit
+    limiter_initial: int = 20
+    limiter_min: int = 2
+    limiter_max: int = 200
+    limiter_latency_target_seconds: float = 2.0
+    # Per-service latency target; None backs off only on errors and 5xx
+    limiter_service_latency_target_seconds: Dict[str, Optional[float]] = {"llm": None}
+    # How long a request may queue for a permit before failing with 503
+    limiter_queue_timeout_seconds: float = 0.5
+    
+    # Response cache for idempotent GETs
+    cache_enabled: bool = True
+    # "service/path" glob -> TTL in seconds; only GETs matching a rule are cached
+    cache_rules: Dict[str, int] = {
+        "llm/chat/health": 5,
+        "github/resources": 60,
+        "github/resources/*": 60,
+        "search/api/v1/search": 30,
+    }
+    cache_stale_while_revalidate: int = 30
+    # Expired entries are kept this long so they can be revalidated with their ETag
+    cache_retain_seconds: int = 600
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_max_entry_bytes: int = 1024 * 1024
+    # Shares the cache between gateway replicas; needs the "redis" extra
+    cache_redis_url: Optional[str] = None
+    
     # CORS settings
     cors_origins: List[str] = ["http://localhost:3000", "http://localhost:5173"]
     
@@ -26,4 +82,5 @@ SERVICE_REGISTRY = {
     "content": settings.content_processor_url,
     "search": settings.search_service_url,
     "ws": settings.websocket_hub_url,
+    "github": settings.github_mcp_url,
 }
\ No newline at end of file
@@ -49,4 +49,11 @@ async def root():
 async def list_services():
     return {"services": SERVICE_REGISTRY}
 
+@app.get("/api/v1/stats")
+async def gateway_stats():
+    return {
+        "proxy": service_proxy.stats(),
+        "cache": service_proxy.cache.stats() if service_proxy.cache else None,
+    }
+
 app.include_router(proxy_router, prefix="/api/v1")
\ No newline at end of file
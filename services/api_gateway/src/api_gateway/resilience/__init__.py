@@ -0,0 +1,11 @@
+from .circuit_breaker import CircuitBreaker
+from .concurrency_limiter import AIMDLimiter
+
+class BackendUnavailable(Exception):
+    """Raised instead of calling a backend whose breaker is open or whose limiter is full"""
+
+    def __init__(self, service_name: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"Service '{service_name}' {reason}")
+        self.service_name = service_name
+        self.reason = reason
+        self.retry_after = retry_after
@@ -0,0 +1,113 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Per-backend breaker over a rolling window of call outcomes.
+
+    Opens once at least min_requests calls in the window failed at
+    failure_rate or more (calls slower than slow_call_seconds count as
+    failures unless it is None), rejects calls while open, and after open_seconds half-opens to
+    let half_open_probes calls through. All probes succeeding closes it again.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_requests: int = 20,
+        window_seconds: float = 30.0,
+        slow_call_seconds: Optional[float] = 10.0,
+        open_seconds: float = 15.0,
+        half_open_probes: int = 3,
+    ):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        # (finished_at, failed) for calls inside the window
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.counters = {"rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.counters["rejected"] += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.counters["rejected"] += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, latency: float, failed: bool):
+        """Record the outcome of a call admitted by allow()"""
+        if self.slow_call_seconds is not None and latency >= self.slow_call_seconds:
+            failed = True
+        if self.state == HALF_OPEN:
+            if failed:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._close()
+            return
+        if self.state == OPEN:
+            # Calls started before the breaker opened; nothing left to decide
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed))
+        self._failures += failed
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            _, expired_failed = self._calls.popleft()
+            self._failures -= expired_failed
+
+        if len(self._calls) >= self.min_requests and self._failures / len(self._calls) >= self.failure_rate:
+            self._open()
+
+    def abandon(self):
+        """Give back a half-open probe slot for a call that never completed"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets probes through again"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.counters["opened"] += 1
+
+    def _close(self):
+        self.state = CLOSED
+        self._calls.clear()
+        self._failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        calls = len(self._calls)
+        return {
+            **self.counters,
+            "state": self.state,
+            "window_calls": calls,
+            "window_failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+        }
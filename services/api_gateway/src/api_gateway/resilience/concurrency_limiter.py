@@ -0,0 +1,85 @@
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+class AIMDLimiter:
+    """Adaptive cap on concurrent upstream calls (additive increase, multiplicative decrease).
+
+    The limit grows by one after a successful call made while at least half
+    of it was in use, and shrinks by backoff_ratio after a failed call or one
+    slower than latency_target (when set). Callers wait up to queue_timeout for a
+    permit and are turned away after that instead of piling up.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 2,
+        max_limit: int = 200,
+        latency_target: Optional[float] = 2.0,
+        backoff_ratio: float = 0.9,
+        queue_timeout: float = 0.5,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        # Plain futures rather than an asyncio.Condition, which would bind to one event loop
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.counters = {"rejected": 0, "increases": 0, "decreases": 0}
+
+    async def acquire(self) -> bool:
+        """Take a permit, waiting up to queue_timeout; False means the caller should shed the request"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return True
+            self.counters["rejected"] += 1
+            return False
+        except asyncio.CancelledError:
+            # A permit granted just as the caller went away must not leak
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: float, failed: bool):
+        """Return a permit and adapt the limit to how the call went"""
+        utilized = self.in_flight * 2 >= self.limit
+        self.in_flight -= 1
+        slow = self.latency_target is not None and latency > self.latency_target
+        if failed or slow:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            self.counters["decreases"] += 1
+        elif utilized and self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self.counters["increases"] += 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+        }
@@ -1,17 +1,94 @@
-from fastapi import APIRouter, Request, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, Response, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import httpx
 import logging
-from api_gateway.config import SERVICE_REGISTRY
+import time
+from api_gateway.cache import MemoryStore, RedisStore, ResponseCache
+from api_gateway.config import settings, SERVICE_REGISTRY
+from api_gateway.resilience import AIMDLimiter, BackendUnavailable, CircuitBreaker
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Upstream content types that are relayed chunk by chunk instead of buffered
+STREAMING_CONTENT_TYPES = ("application/x-ndjson", "text/event-stream")
+
+# Connection-level headers that must not be forwarded by a proxy (RFC 9110 7.6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
 class ServiceProxy:
+    """Forwards requests to backend services, each through its own connection pool.
+
+    Separate pools keep a slow backend from holding connections that the
+    other services need.
+    """
+
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.http2 = settings.proxy_http2 and _http2_available()
+        if settings.proxy_http2 and not self.http2:
+            logger.warning("PROXY_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.limiters: Dict[str, AIMDLimiter] = {}
+        self.cache = self._create_cache() if settings.cache_enabled else None
+    
+    @staticmethod
+    def _create_cache() -> ResponseCache:
+        store = None
+        if settings.cache_redis_url:
+            try:
+                store = RedisStore(settings.cache_redis_url)
+            except RuntimeError as e:
+                logger.warning(f"Falling back to in-memory response cache: {e}")
+        return ResponseCache(
+            settings.cache_rules,
+            stale_while_revalidate=settings.cache_stale_while_revalidate,
+            retain_seconds=settings.cache_retain_seconds,
+            max_entry_bytes=settings.cache_max_entry_bytes,
+            store=store or MemoryStore(settings.cache_max_bytes),
+        )
+    
+    def get_client(self, service_name: str) -> httpx.AsyncClient:
+        """Return the pooled client for a service, creating it on first use"""
+        client = self.clients.get(service_name)
+        if client is None:
+            max_connections = self._max_connections(service_name)
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=min(settings.proxy_max_keepalive_connections, max_connections),
+                    keepalive_expiry=settings.proxy_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    connect=settings.proxy_connect_timeout,
+                    read=settings.proxy_read_timeout,
+                    write=settings.proxy_write_timeout,
+                    pool=settings.proxy_pool_timeout,
+                ),
+            )
+            self.clients[service_name] = client
+        return client
+    
+    @staticmethod
+    def _max_connections(service_name: str) -> int:
+        return settings.proxy_service_max_connections.get(service_name, settings.proxy_max_connections)
     
-    async def proxy_request(self, service_name: str, path: str, request: Request) -> JSONResponse:
+    async def proxy_request(self, service_name: str, path: str, request: Request) -> Response:
         service_url = SERVICE_REGISTRY.get(service_name)
         if not service_url:
             raise HTTPException(
@@ -20,24 +97,58 @@ class ServiceProxy:
             )
         
         target_url = f"{service_url}/{path}" if path else service_url
-        body = await request.body()
+        headers = [
+            (k, v) for k, v in request.headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != "host"
+        ]
+        # Forward the body as it arrives instead of buffering it; Content-Length is kept
+        # so upstreams still see a sized body rather than a chunked one
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
         
-        headers = {
-            k: v for k, v in request.headers.items() 
-            if k.lower() not in ['host', 'content-length']
-        }
+        client = self.get_client(service_name)
+        counters = self.counters.setdefault(
+            service_name, {"requests": 0, "errors": 0, "rejected": 0, "in_flight": 0, "peak_in_flight": 0}
+        )
+        counters["requests"] += 1
+        counters["in_flight"] += 1
+        counters["peak_in_flight"] = max(counters["peak_in_flight"], counters["in_flight"])
+        streaming = False
+        
+        cache_ttl = None
+        if self.cache is not None and self.cache.is_cacheable_request(request):
+            cache_ttl = self.cache.ttl_for(service_name, path)
         
         try:
+            if cache_ttl is not None:
+                return await self._proxy_cached(client, service_name, path, target_url, request, headers, cache_ttl)
+            
             logger.info(f"Proxying {request.method} {target_url}")
             
-            response = await self.client.request(
+            upstream_request = client.build_request(
                 method=request.method,
                 url=target_url,
                 params=request.query_params,
-                content=body,
+                content=request.stream() if has_body else None,
                 headers=headers
             )
+            response = await self._send(service_name, client, upstream_request)
+            
+            content_type = response.headers.get("content-type", "")
+            if settings.proxy_passthrough or content_type.startswith(STREAMING_CONTENT_TYPES):
+                streaming = True
+                relayed = StreamingResponse(
+                    response.aiter_raw(),
+                    status_code=response.status_code,
+                    background=BackgroundTask(self._finish_stream, response, counters)
+                )
+                # Raw bytes are relayed still encoded, so Content-Encoding/Length stay valid
+                relayed.raw_headers = [
+                    (k.lower(), v) for k, v in response.headers.raw
+                    if k.lower().decode("latin-1") not in HOP_BY_HOP_HEADERS
+                ]
+                return relayed
             
+            await response.aread()
             if response.headers.get("content-type", "").startswith("application/json"):
                 content = response.json()
             else:
@@ -48,21 +159,192 @@ class ServiceProxy:
                 status_code=response.status_code
             )
             
+        except BackendUnavailable as e:
+            counters["rejected"] += 1
+            logger.warning(str(e))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Service '{service_name}' unavailable",
+                headers={"Retry-After": str(max(1, round(e.retry_after)))}
+            )
         except httpx.RequestError as e:
+            counters["errors"] += 1
             logger.error(f"Request error: {e}")
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Service '{service_name}' unavailable"
             )
         except Exception as e:
+            counters["errors"] += 1
             logger.error(f"Unexpected error: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Internal server error"
             )
+        finally:
+            # Relayed responses hold their connection until the body has been sent
+            if not streaming:
+                counters["in_flight"] -= 1
+    
+    async def _send(self, service_name: str, client: httpx.AsyncClient, upstream_request: httpx.Request) -> httpx.Response:
+        """Send through the service's circuit breaker and concurrency limiter.
+
+        Latency is measured to the response headers; streamed bodies do not
+        hold a limiter permit while they are relayed.
+        """
+        breaker = self.breakers.get(service_name)
+        if breaker is None:
+            breaker = self.breakers[service_name] = CircuitBreaker(
+                failure_rate=settings.breaker_failure_rate,
+                min_requests=settings.breaker_min_requests,
+                window_seconds=settings.breaker_window_seconds,
+                slow_call_seconds=settings.breaker_service_slow_call_seconds.get(
+                    service_name, settings.breaker_slow_call_seconds
+                ),
+                open_seconds=settings.breaker_open_seconds,
+                half_open_probes=settings.breaker_half_open_probes,
+            )
+        limiter = self.limiters.get(service_name)
+        if limiter is None:
+            limiter = self.limiters[service_name] = AIMDLimiter(
+                initial_limit=settings.limiter_initial,
+                min_limit=settings.limiter_min,
+                max_limit=settings.limiter_max,
+                latency_target=settings.limiter_service_latency_target_seconds.get(
+                    service_name, settings.limiter_latency_target_seconds
+                ),
+                queue_timeout=settings.limiter_queue_timeout_seconds,
+            )
+        
+        if not breaker.allow():
+            raise BackendUnavailable(service_name, "circuit is open", breaker.retry_after())
+        if not await limiter.acquire():
+            breaker.abandon()
+            raise BackendUnavailable(service_name, "is at its concurrency limit")
+        
+        start = time.perf_counter()
+        try:
+            response = await client.send(upstream_request, stream=True)
+        except asyncio.CancelledError:
+            # The client went away; that says nothing about the backend's health
+            breaker.abandon()
+            limiter.release(time.perf_counter() - start, failed=False)
+            raise
+        except Exception:
+            latency = time.perf_counter() - start
+            limiter.release(latency, failed=True)
+            breaker.record(latency, failed=True)
+            raise
+        
+        latency = time.perf_counter() - start
+        failed = response.status_code >= 500
+        limiter.release(latency, failed)
+        breaker.record(latency, failed)
+        return response
+    
+    async def _proxy_cached(
+        self,
+        client: httpx.AsyncClient,
+        service_name: str,
+        path: str,
+        target_url: str,
+        request: Request,
+        headers: List[Tuple[str, str]],
+        ttl: int,
+    ) -> Response:
+        """Serve a cacheable GET from the response cache, going upstream only when needed"""
+        key = self.cache.make_key(service_name, path, str(request.query_params))
+        params = request.query_params
+        entry = await self.cache.lookup(key)
+        if entry is not None and not self.cache.matches(entry, request):
+            # Another variant (Vary, Accept-Encoding): fetch this one, replacing it
+            entry = None
+        
+        # Client "no-cache" skips fresh hits but can still revalidate with the stored ETag
+        if entry is not None and "no-cache" not in request.headers.get("cache-control", ""):
+            state = self.cache.state(entry)
+            if state == "fresh":
+                return self.cache.serve(entry, request, "HIT")
+            if state == "stale":
+                self.cache.revalidate_in_background(
+                    key, lambda: self._revalidate(service_name, client, target_url, params, headers, key, entry, ttl)
+                )
+                return self.cache.serve(entry, request, "STALE")
+        
+        logger.info(f"Proxying {request.method} {target_url} (cache miss)")
+        entry, outcome = await self._fetch_into_cache(service_name, client, target_url, params, headers, key, entry, ttl)
+        return self.cache.serve(entry, request, outcome)
+    
+    async def _fetch_into_cache(
+        self,
+        service_name: str,
+        client: httpx.AsyncClient,
+        target_url: str,
+        params,
+        headers: List[Tuple[str, str]],
+        key: str,
+        entry: Optional[Dict[str, Any]],
+        ttl: int,
+    ) -> Tuple[Dict[str, Any], str]:
+        # Conditionals are the cache's to send; the client's own are answered from the entry
+        upstream_headers = [
+            (k, v) for k, v in headers
+            if k.lower() not in ("if-none-match", "if-modified-since", "cache-control")
+        ]
+        if entry is not None:
+            upstream_headers.extend(self.cache.validators(entry))
+        
+        upstream_request = client.build_request("GET", target_url, params=params, headers=upstream_headers)
+        response = await self._send(service_name, client, upstream_request)
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        
+        response_headers = [
+            (k.lower(), v) for k, v in response.headers.multi_items()
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != "content-length"
+        ]
+        if response.status_code == 304 and entry is not None:
+            return await self.cache.refresh(key, entry, response_headers, ttl), "REVALIDATED"
+        entry = await self.cache.store_response(key, response.status_code, response_headers, body, ttl, headers)
+        return entry, "MISS"
+    
+    async def _revalidate(self, service_name, client, target_url, params, headers, key, entry, ttl):
+        try:
+            await self._fetch_into_cache(service_name, client, target_url, params, headers, key, entry, ttl)
+        except Exception as e:
+            # The stale copy keeps being served until a refresh succeeds
+            logger.warning(f"Background revalidation of {target_url} failed: {e}")
+    
+    async def _finish_stream(self, response: httpx.Response, counters: Dict[str, int]):
+        try:
+            await response.aclose()
+        finally:
+            counters["in_flight"] -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Request counters and connection pool utilization per service"""
+        stats = {}
+        for service_name in self.clients:
+            counters = self.counters.get(service_name, {})
+            # Each in-flight request holds one pooled connection (HTTP/1.1) until it finishes
+            max_connections = self._max_connections(service_name)
+            stats[service_name] = {
+                **counters,
+                "breaker": self.breakers[service_name].stats() if service_name in self.breakers else None,
+                "limiter": self.limiters[service_name].stats() if service_name in self.limiters else None,
+                "max_connections": max_connections,
+                "utilization": round(counters.get("in_flight", 0) / max_connections, 3),
+            }
+        return {"http2": self.http2, "services": stats}
     
     async def close(self):
-        await self.client.aclose()
+        if self.cache is not None:
+            await self.cache.close()
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
 
 service_proxy = ServiceProxy()
 
@@ -1,9 +1,16 @@
+import asyncio
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from api_gateway.main import app
+from api_gateway.routes import service_proxy
 
 client = TestClient(app)
 
+async def _chunks(body: bytes):
+    # MockTransport pre-reads plain bytes bodies, which cannot then be streamed raw
+    yield body
+
 def test_health_check():
     """Test health check endpoint"""
     response = client.get("/health")
@@ -28,4 +35,246 @@ def test_service_discovery():
 def test_proxy_invalid_service():
     """Test proxy with invalid service returns 404"""
     response = client.get("/api/v1/invalid/test")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_proxy_streams_ndjson(monkeypatch):
+    """Test streaming upstream responses are relayed unchanged"""
+    body = b'{"type": "token", "content": "Hi"}\n{"type": "done"}\n'
+
+    async def chunks():
+        for line in body.splitlines(keepends=True):
+            yield line
+
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "application/x-ndjson"}, content=chunks())
+
+    monkeypatch.setitem(service_proxy.clients, "llm", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    response = client.post("/api/v1/llm/chat/stream", json={"message": "Hi"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.content == body
+
+def test_proxy_uses_separate_pools_and_reports_stats(monkeypatch):
+    """Test each service gets its own pooled client and shows up in /api/v1/stats"""
+    assert service_proxy.get_client("search") is not service_proxy.get_client("content")
+
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "application/json"}, content=_chunks(b'{"ok": true}'))
+
+    monkeypatch.setitem(service_proxy.clients, "search", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    assert client.get("/api/v1/search/api/v1/search").status_code == 200
+
+    response = client.get("/api/v1/stats")
+    assert response.status_code == 200
+    search_stats = response.json()["proxy"]["services"]["search"]
+    assert search_stats["requests"] >= 1
+    assert search_stats["in_flight"] == 0 and search_stats["utilization"] == 0
+    assert "max_connections" in response.json()["proxy"]["services"]["content"]
+
+def test_proxy_passes_bodies_through_unchanged(monkeypatch):
+    """Test request and response bytes, status and headers are relayed without re-encoding"""
+    seen = {}
+
+    async def handler(request):
+        seen["body"] = await request.aread()
+        seen["content-type"] = request.headers["content-type"]
+        return httpx.Response(
+            201,
+            headers={"content-type": "text/plain", "x-request-id": "abc", "connection": "keep-alive"},
+            content=_chunks(b"plain text, not JSON"),
+        )
+
+    monkeypatch.setitem(service_proxy.clients, "content", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    payload = b'{"vector": [0.1, 0.2, 0.3]}'
+    response = client.post("/api/v1/content/documents", content=payload, headers={"content-type": "application/json"})
+
+    assert seen == {"body": payload, "content-type": "application/json"}
+    assert response.status_code == 201
+    assert response.content == b"plain text, not JSON"
+    assert response.headers["x-request-id"] == "abc"
+    assert response.headers["content-type"] == "text/plain"
+
+def test_response_cache_serves_repeat_gets_and_revalidates(monkeypatch):
+    """Test cached GETs skip the backend, answer If-None-Match and revalidate with the ETag"""
+    from api_gateway.cache import ResponseCache
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'}, content=_chunks(b""))
+        return httpx.Response(
+            200,
+            headers={"content-type": "application/json", "etag": '"v1"'},
+            content=_chunks(b'[{"name": "repo"}]'),
+        )
+
+    cache = ResponseCache({"github/resources": 60}, stale_while_revalidate=0)
+    monkeypatch.setattr(service_proxy, "cache", cache)
+    monkeypatch.setitem(service_proxy.clients, "github", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    first = client.get("/api/v1/github/resources")
+    second = client.get("/api/v1/github/resources")
+    assert first.json() == second.json() == [{"name": "repo"}]
+    assert (first.headers["x-cache"], second.headers["x-cache"]) == ("MISS", "HIT")
+
+    not_modified = client.get("/api/v1/github/resources", headers={"if-none-match": '"v1"'})
+    assert not_modified.status_code == 304
+
+    # Expire the entry: the next request revalidates instead of refetching the body
+    for entry in cache.store._entries.values():
+        entry["stored_at"] -= 120
+    revalidated = client.get("/api/v1/github/resources")
+    assert revalidated.headers["x-cache"] == "REVALIDATED"
+    assert revalidated.json() == [{"name": "repo"}]
+    assert calls == [None, '"v1"']
+
+def test_response_cache_skips_uncached_routes_and_no_store(monkeypatch):
+    """Test only GETs matching a rule and allowed by Cache-Control are stored"""
+    from api_gateway.cache import ResponseCache
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            headers={"content-type": "application/json", "cache-control": "no-store"},
+            content=_chunks(b'{"results": []}'),
+        )
+
+    cache = ResponseCache({"search/api/v1/search": 30})
+    monkeypatch.setattr(service_proxy, "cache", cache)
+    monkeypatch.setitem(service_proxy.clients, "search", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    client.get("/api/v1/search/api/v1/search", params={"q": "redis"})
+    client.get("/api/v1/search/api/v1/documents")
+    assert len(cache.store) == 0
+    assert cache.stats()["misses"] == 1
+
+def test_response_cache_revalidates_no_cache_responses_before_serving(monkeypatch):
+    """Test upstream no-cache entries are revalidated on every use instead of served stale"""
+    from api_gateway.cache import ResponseCache
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers.get("if-none-match"))
+        headers = {"etag": '"v1"', "cache-control": "no-cache"}
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers=headers, content=_chunks(b""))
+        return httpx.Response(200, headers=headers, content=_chunks(b'{"ok": true}'))
+
+    cache = ResponseCache({"github/resources": 60}, stale_while_revalidate=30)
+    monkeypatch.setattr(service_proxy, "cache", cache)
+    monkeypatch.setitem(service_proxy.clients, "github", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    responses = [client.get("/api/v1/github/resources") for _ in range(3)]
+    assert [r.headers["x-cache"] for r in responses] == ["MISS", "REVALIDATED", "REVALIDATED"]
+    assert all(r.json() == {"ok": True} for r in responses)
+    assert calls == [None, '"v1"', '"v1"']
+
+def test_response_cache_serves_only_the_matching_vary_variant(monkeypatch):
+    """Test an entry is served only to requests whose Vary'd headers match, and Vary: * is not stored"""
+    from api_gateway.cache import ResponseCache
+
+    def handler(request):
+        language = request.headers.get("accept-language", "en")
+        vary = "*" if request.url.path.endswith("/any") else "Accept-Language"
+        return httpx.Response(200, headers={"vary": vary}, content=_chunks(language.encode()))
+
+    cache = ResponseCache({"github/*": 60})
+    monkeypatch.setattr(service_proxy, "cache", cache)
+    monkeypatch.setitem(service_proxy.clients, "github", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    responses = [
+        client.get("/api/v1/github/resources", headers={"accept-language": language})
+        for language in ("en", "de", "de")
+    ]
+    assert [r.content for r in responses] == [b"en", b"de", b"de"]
+    assert [r.headers["x-cache"] for r in responses] == ["MISS", "MISS", "HIT"]
+
+    client.get("/api/v1/github/any")
+    assert client.get("/api/v1/github/any").headers["x-cache"] == "MISS"
+
+def test_circuit_breaker_fails_fast_once_open(monkeypatch):
+    """Test a failing backend trips its breaker and further calls get 503 without a backend hop"""
+    from api_gateway.resilience import CircuitBreaker
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setitem(service_proxy.clients, "content", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setitem(service_proxy.breakers, "content", CircuitBreaker(min_requests=3, open_seconds=30))
+
+    statuses = [client.post("/api/v1/content/documents", json={}).status_code for _ in range(5)]
+
+    assert statuses == [503] * 5
+    assert len(calls) == 3
+    rejected = client.post("/api/v1/content/documents", json={})
+    assert int(rejected.headers["retry-after"]) > 0
+    assert service_proxy.breakers["content"].stats()["state"] == "open"
+
+def test_circuit_breaker_half_opens_and_closes_after_probes():
+    """Test the breaker lets probes through after open_seconds and closes when they succeed"""
+    from api_gateway.resilience import CircuitBreaker
+
+    breaker = CircuitBreaker(min_requests=2, open_seconds=0, half_open_probes=2)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(0.01, failed=True)
+    assert breaker.state == "open"
+
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record(0.01, failed=False)
+    breaker.record(0.01, failed=False)
+    assert breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_aimd_limiter_adapts_and_sheds_excess_load():
+    """Test the limit backs off on slow calls, grows under load and rejects after the queue timeout"""
+    from api_gateway.resilience import AIMDLimiter
+
+    limiter = AIMDLimiter(initial_limit=2, min_limit=1, latency_target=1.0, backoff_ratio=0.5, queue_timeout=0.01)
+    assert await limiter.acquire() and await limiter.acquire()
+    assert not await limiter.acquire()
+
+    limiter.release(5.0, failed=False)
+    assert limiter.stats()["limit"] == 1
+    limiter.release(0.1, failed=False)
+    assert limiter.stats()["limit"] == 2
+    assert limiter.stats()["rejected"] == 1
+
+def test_slow_llm_calls_do_not_shed_load(monkeypatch):
+    """Test long but successful generations neither shrink the llm limit nor open its breaker"""
+    from api_gateway.config import settings
+
+    async def handler(request):
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, headers={"content-type": "application/json"}, content=_chunks(b'{"answer": "ok"}'))
+
+    monkeypatch.setattr(settings, "breaker_slow_call_seconds", 0.001)
+    monkeypatch.setattr(settings, "breaker_min_requests", 3)
+    monkeypatch.setattr(settings, "limiter_latency_target_seconds", 0.001)
+    for service_name in ("llm", "content"):
+        monkeypatch.setitem(service_proxy.clients, service_name, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        # Fresh breaker and limiter built from the patched settings, removed again afterwards
+        monkeypatch.setitem(service_proxy.breakers, service_name, None)
+        monkeypatch.setitem(service_proxy.limiters, service_name, None)
+
+    statuses = [client.post("/api/v1/llm/chat/", json={"message": "Hi"}).status_code for _ in range(10)]
+
+    assert statuses == [200] * 10
+    assert service_proxy.limiters["llm"].stats()["limit"] == settings.limiter_initial
+    assert service_proxy.limiters["llm"].stats()["decreases"] == 0
+    assert service_proxy.breakers["llm"].stats()["state"] == "closed"
+
+    # Services without an override still treat slow calls as overload
+    for _ in range(3):
+        client.post("/api/v1/content/documents", json={})
+    assert service_proxy.limiters["content"].stats()["decreases"] == 3
+    assert service_proxy.breakers["content"].stats()["state"] == "open"
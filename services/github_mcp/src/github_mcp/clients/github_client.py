@@ -1,11 +1,52 @@
+import asyncio
 import httpx
-from typing import List, Dict, Any
+import math
+import re
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import logging
 
+from clients.rate_limiter import GithubRateLimiter
+
 logger = logging.getLogger(__name__)
 
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+# GitHub's largest page size for list endpoints
+MAX_PER_PAGE = 100
+
+def _page_number(url: Optional[str]) -> Optional[int]:
+    if not url:
+        return None
+    page = httpx.URL(url).params.get("page")
+    return int(page) if page and page.isdigit() else None
+
+class CachedResponse:
+    def __init__(
+        self,
+        body: Any,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        fresh_until: float,
+        links: Dict[str, str],
+    ):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = fresh_until
+        # rel -> URL from the Link header, used for pagination
+        self.links = links
+
 class GithubClient:
-    def __init__(self, token: str, username: str):
+    def __init__(
+        self,
+        token: str,
+        username: str,
+        cache_max_entries: int = 512,
+        rate_limit_max_wait: float = 30.0,
+        page_concurrency: int = 4,
+    ):
         self.token = token
         self.username = username
         self.base_url = "https://api.github.com"
@@ -14,16 +55,160 @@ class GithubClient:
             "Accept": "application/vnd.github.v3+json"
         }
         self.client = httpx.AsyncClient(timeout=30.0)
+        # Conditional-request cache: 304s do not count against the GitHub quota
+        self.cache: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self.cache_max_entries = cache_max_entries
+        self.rate_limiter = GithubRateLimiter(max_wait=rate_limit_max_wait)
+        self.counters = {"fresh_hits": 0, "revalidated": 0, "misses": 0}
+        self.page_concurrency = page_concurrency
+
+    async def _get(self, url: str, params: Optional[Dict[str, Any]] = None, resource: str = "core") -> Any:
+        """GET JSON through the conditional-request cache and rate limiter"""
+        return (await self._fetch(url, params, resource)).body
+
+    async def _fetch(self, url: str, params: Optional[Dict[str, Any]] = None, resource: str = "core") -> CachedResponse:
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None and cached.fresh_until > time.monotonic():
+            # Within GitHub's own max-age the entry is served without a request
+            self.cache.move_to_end(key)
+            self.counters["fresh_hits"] += 1
+            return cached
+        
+        headers = dict(self.headers)
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        
+        await self.rate_limiter.acquire(resource)
+        response = await self.client.get(url, headers=headers, params=params)
+        self.rate_limiter.update(response.headers, response.status_code)
+        
+        fresh_until = time.monotonic() + self._max_age(response)
+        if response.status_code == 304 and cached is not None:
+            self.counters["revalidated"] += 1
+            cached.fresh_until = fresh_until
+            self.cache.move_to_end(key)
+            return cached
+        
+        response.raise_for_status()
+        self.counters["misses"] += 1
+        links = {rel: link["url"] for rel, link in response.links.items()}
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        entry = CachedResponse(response.json(), etag, last_modified, fresh_until, links)
+        if etag or last_modified:
+            self.cache[key] = entry
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_max_entries:
+                self.cache.popitem(last=False)
+        return entry
+
+    async def _paginate(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield items from a paginated list endpoint in order, up to limit"""
+        yielded = 0
+        async with aclosing(self._pages(url, params, limit)) as pages:
+            async for page in pages:
+                for item in page:
+                    if limit is not None and yielded >= limit:
+                        return
+                    yield item
+                    yielded += 1
+
+    async def _pages(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        limit: Optional[int],
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages of a list endpoint.
+
+        The first page's Link header gives the last page; the rest are then
+        fetched page_concurrency at a time while earlier ones are consumed.
+        Without a "last" link, "next" links are followed one by one.
+        """
+        per_page = min(limit or MAX_PER_PAGE, MAX_PER_PAGE)
+        first = await self._fetch(url, {**params, "per_page": per_page, "page": 1})
+        yield first.body
+        
+        last_page = _page_number(first.links.get("last"))
+        if last_page is None:
+            page = first
+            while "next" in page.links:
+                # The next URL already carries every query parameter
+                page = await self._fetch(page.links["next"])
+                yield page.body
+            return
+        
+        if limit is not None:
+            last_page = min(last_page, math.ceil(limit / per_page))
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+        
+        async def fetch_page(number: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return (await self._fetch(url, {**params, "per_page": per_page, "page": number})).body
+        
+        tasks = [asyncio.create_task(fetch_page(number)) for number in range(2, last_page + 1)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            # The caller may stop early; don't keep downloading pages nobody reads
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _max_age(response: httpx.Response) -> int:
+        match = MAX_AGE_PATTERN.search(response.headers.get("cache-control", ""))
+        return int(match.group(1)) if match else 0
+
+    def iter_user_repos(self, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the user's repositories, most recently updated first"""
+        return self._paginate(
+            f"{self.base_url}/users/{self.username}/repos",
+            {"sort": "updated", "type": "owner"},
+            limit,
+        )
+
+    def iter_repo_issues(
+        self,
+        repo_name: str,
+        state: str = "open",
+        limit: Optional[int] = None,
+        since: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream repository issues, only those updated at or after since when given"""
+        params = {"state": state}
+        if since:
+            params.update({"since": since, "sort": "updated", "direction": "asc"})
+        return self._paginate(f"{self.base_url}/repos/{self.username}/{repo_name}/issues", params, limit)
+
+    def iter_recent_commits(
+        self,
+        repo_name: str,
+        limit: Optional[int] = None,
+        since: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream commits newest first, only those at or after since when given"""
+        params = {"since": since} if since else {}
+        return self._paginate(f"{self.base_url}/repos/{self.username}/{repo_name}/commits", params, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": {**self.counters, "entries": len(self.cache), "max_entries": self.cache_max_entries},
+            "rate_limit": self.rate_limiter.stats(),
+        }
 
     async def get_user_repos(self, limit: str = 30):
         try:
-            response = await self.client.get(
-            url = f"{self.base_url}/users/{self.username}/repos",
-            headers=self.headers,
-            params = {"sort": "updated", "per_page": limit, "type": "owner"}
-            )
-            response.raise_for_status()
-            return response.json()
+            return [repo async for repo in self.iter_user_repos(int(limit))]
         except Exception as e:
             logger.error(f"Failed to get repos: {e}")
             return []
@@ -34,10 +219,7 @@ class GithubClient:
             url = f"{self.base_url}/search/repositories"
             params = {"q": f"{query} user:{self.username}", "per_page": limit, "sort": "updated"}
             
-            response = await self.client.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(url, params, resource="search")
             return data.get("items", [])  
         except Exception as e:
             logger.error(f"Failed to search repos: {e}")
@@ -49,29 +231,31 @@ class GithubClient:
             url = f"{self.base_url}/search/code"
             params = {"q": f"{query} user:{self.username}", "per_page": limit}
             
-            response = await self.client.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            # Code search has its own, smaller quota
+            data = await self._get(url, params, resource="code_search")
             return data.get("items", [])
             
         except Exception as e:
             logger.error(f"Failed to search code: {e}")
             return []
     
+    async def fetch_repo_readme(self, repo_name: str) -> str:
+        """Repository README, "" when the repo has none; other failures raise"""
+        url = f"{self.base_url}/repos/{self.username}/{repo_name}/readme"
+        try:
+            data = await self._get(url)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return ""
+            raise
+        # README content is base64 encoded
+        import base64
+        return base64.b64decode(data.get("content", "")).decode('utf-8')
+    
     async def get_repo_readme(self, repo_name: str) -> str:
         """Get repository README"""
         try:
-            url = f"{self.base_url}/repos/{self.username}/{repo_name}/readme"
-            
-            response = await self.client.get(url, headers=self.headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            # README content is base64 encoded
-            import base64
-            content = base64.b64decode(data.get("content", "")).decode('utf-8')
-            return content
+            return await self.fetch_repo_readme(repo_name)
             
         except Exception as e:
             logger.error(f"Failed to get README: {e}")
@@ -80,13 +264,7 @@ class GithubClient:
     async def get_repo_issues(self, repo_name: str, state: str = "open", limit: int = 30) -> List[Dict[str, Any]]:
         """Get repository issues"""
         try:
-            url = f"{self.base_url}/repos/{self.username}/{repo_name}/issues"
-            params = {"state": state, "per_page": limit}
-            
-            response = await self.client.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            return response.json()
+            return [issue async for issue in self.iter_repo_issues(repo_name, state, limit)]
             
         except Exception as e:
             logger.error(f"Failed to get issues: {e}")
@@ -95,13 +273,7 @@ class GithubClient:
     async def get_recent_commits(self, repo_name: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent commits"""
         try:
-            url = f"{self.base_url}/repos/{self.username}/{repo_name}/commits"
-            params = {"per_page": limit}
-            
-            response = await self.client.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            return response.json()
+            return [commit async for commit in self.iter_recent_commits(repo_name, limit)]
             
         except Exception as e:
             logger.error(f"Failed to get commits: {e}")
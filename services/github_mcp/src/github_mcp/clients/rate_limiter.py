@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Mapping
+
+logger = logging.getLogger(__name__)
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than the limiter allows"""
+
+    def __init__(self, resource: str, retry_after: float):
+        super().__init__(f"GitHub {resource} rate limit exhausted, retry in {retry_after:.0f}s")
+        self.resource = resource
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Token bucket refilled at capacity per window, corrected by the server's own counts"""
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = capacity
+        self.window = window
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        # Set when the server reports the quota as spent; nothing is sent before then
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.window
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.blocked_until and self.blocked_until <= now:
+            # The quota window has reset
+            self.blocked_until = 0.0
+            self.tokens = float(self.capacity)
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available"""
+        self._refill()
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def sync(self, limit: int, remaining: int, reset_at: float):
+        """Adopt the server's view of the quota; reset_at is a time.monotonic() deadline"""
+        self._refill()
+        self.capacity = limit
+        # Other clients share the quota, so never assume more than the server reports
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0:
+            self.blocked_until = max(self.blocked_until, reset_at)
+
+class GithubRateLimiter:
+    """Queues GitHub calls before the quota runs out instead of letting them fail.
+
+    One TokenBucket per GitHub rate-limit resource ("core", "search", ...),
+    kept in line with the X-RateLimit-* headers of every response. Calls wait
+    for a token in FIFO order; a call that would wait longer than max_wait
+    raises RateLimitExceeded.
+    """
+
+    # Buckets are named after the x-ratelimit-resource GitHub reports for each endpoint
+    WINDOWS = {"core": 3600.0, "search": 60.0, "code_search": 60.0}
+    DEFAULT_LIMITS = {"core": 5000, "search": 30, "code_search": 10}
+
+    def __init__(self, max_wait: float = 30.0):
+        self.max_wait = max_wait
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.counters = {"waits": 0, "wait_seconds": 0.0, "rejected": 0}
+
+    def bucket(self, resource: str) -> TokenBucket:
+        if resource not in self.buckets:
+            self.buckets[resource] = TokenBucket(
+                self.DEFAULT_LIMITS.get(resource, 5000), self.WINDOWS.get(resource, 3600.0)
+            )
+        return self.buckets[resource]
+
+    async def acquire(self, resource: str = "core"):
+        """Take one request token for resource, waiting for a refill if needed"""
+        bucket = self.bucket(resource)
+        async with bucket.lock:
+            wait = bucket.wait_time()
+            if wait > self.max_wait:
+                self.counters["rejected"] += 1
+                raise RateLimitExceeded(resource, wait)
+            if wait > 0:
+                logger.info(f"Waiting {wait:.1f}s for GitHub {resource} quota")
+                self.counters["waits"] += 1
+                self.counters["wait_seconds"] += wait
+                await asyncio.sleep(wait)
+                bucket._refill()
+            bucket.tokens -= 1
+
+    def update(self, headers: Mapping[str, str], status_code: int = 200):
+        """Sync the matching bucket from a response's rate-limit headers"""
+        bucket = self.bucket(headers.get("x-ratelimit-resource", "core"))
+        # Secondary limits come as 403/429 with Retry-After even while quota remains
+        if status_code in (403, 429) and headers.get("retry-after", "").isdigit():
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + int(headers["retry-after"]))
+        
+        try:
+            limit = int(headers["x-ratelimit-limit"])
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset_in = max(0.0, float(headers.get("x-ratelimit-reset", 0)) - time.time())
+        except (KeyError, ValueError):
+            return
+        bucket.sync(limit, remaining, time.monotonic() + reset_in)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": {
+                resource: {
+                    "capacity": bucket.capacity,
+                    "tokens": round(bucket.tokens, 2),
+                    "blocked_for": round(max(0.0, bucket.blocked_until - time.monotonic()), 1),
+                }
+                for resource, bucket in self.buckets.items()
+            },
+            **self.counters,
+        }
@@ -5,6 +5,19 @@ class Settings(BaseSettings):
     github_username: str
     host: str = "0.0.0.0"
     port: int = 8006
+    # Conditional-request cache size and how long a call may queue for rate-limit quota
+    github_cache_max_entries: int = 512
+    github_rate_limit_max_wait: float = 30.0
+    # Pages of a list endpoint fetched at once after the first page
+    github_page_concurrency: int = 4
+    # Local SQLite mirror that serves repo, issue and commit queries
+    github_index_path: str = "github_index.db"
+    github_sync_enabled: bool = True
+    github_sync_interval: float = 300.0
+    github_sync_concurrency: int = 4
+    # Per-call deadline and size cap for /tools/batch
+    github_tool_timeout: float = 10.0
+    github_batch_max_calls: int = 20
     
     class Config:
         env_file = ".env"
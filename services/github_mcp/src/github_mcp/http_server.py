@@ -1,28 +1,96 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any
+import asyncio
 import logging
 import json
+import time
 
 from clients.github_client import GithubClient
 from config import settings
+from index import GithubIndex, GithubMirror
+from tools import build_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Initialize GitHub client
+github_client = GithubClient(
+    settings.github_token,
+    settings.github_username,
+    cache_max_entries=settings.github_cache_max_entries,
+    rate_limit_max_wait=settings.github_rate_limit_max_wait,
+    page_concurrency=settings.github_page_concurrency,
+)
+github_mirror = GithubMirror(
+    github_client,
+    GithubIndex(settings.github_index_path),
+    interval=settings.github_sync_interval,
+    concurrency=settings.github_sync_concurrency,
+)
+tool_registry = build_registry(github_client, github_mirror)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.github_sync_enabled:
+        github_mirror.start()
+    yield
+    await github_mirror.stop()
+    await github_client.close()
+
 app = FastAPI(
     title="GitHub MCP Server (HTTP)",
     description="HTTP wrapper for GitHub MCP server - for testing",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
-# Initialize GitHub client
-github_client = GithubClient(settings.github_token, settings.github_username)
-
-class ToolCallRequest(BaseModel):
+class ToolCall(BaseModel):
     tool: str
     arguments: Dict[str, Any]
 
+class ToolCallRequest(ToolCall):
+    # Stream results as NDJSON, one item per line, as pages arrive from GitHub
+    stream: bool = False
+    # Return GitHub's JSON as is instead of the compact projection
+    raw: bool = False
+
+class BatchToolCallRequest(BaseModel):
+    calls: List[ToolCall] = Field(..., max_length=settings.github_batch_max_calls)
+    # Deadline in seconds for each call; a slow call fails alone
+    timeout: float = Field(default=settings.github_tool_timeout, gt=0)
+
+def _format_resource(repo: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "uri": f"github://repo/{repo['name']}",
+        "name": repo['name'],
+        "description": repo.get('description', 'No description'),
+        "metadata": {
+            "language": repo.get('language'),
+            "stars": repo.get('stargazers_count', 0),
+            "updated_at": repo.get('updated_at'),
+            "url": repo.get('html_url')
+        }
+    }
+
+def _ndjson(
+    items: AsyncIterator[Dict[str, Any]],
+    format_item: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> StreamingResponse:
+    """Stream (formatted) items as newline-delimited JSON while GitHub pages are still arriving"""
+    async def lines():
+        try:
+            async for item in items:
+                yield json.dumps(format_item(item) if format_item else item) + "\n"
+        except Exception as e:
+            # Headers are already sent, so the failure is reported in-band
+            logger.error(f"Streaming GitHub results failed: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health():
     return {
@@ -31,6 +99,17 @@ async def health():
         "github_user": settings.github_username
     }
 
+@app.get("/stats")
+async def stats():
+    """Conditional-request cache and rate limiter counters"""
+    return {**github_client.stats(), "mirror": github_mirror.stats()}
+
+@app.post("/sync")
+async def sync():
+    """Run an index sync now instead of waiting for the next interval"""
+    await github_mirror.sync()
+    return github_mirror.stats()
+
 @app.get("/")
 async def root():
     return {
@@ -40,31 +119,21 @@ async def root():
     }
 
 @app.get("/resources")
-async def list_resources():
+async def list_resources(stream: bool = False, limit: int = 50):
     """List available GitHub repositories"""
-    repos = await github_client.get_user_repos(limit=50)
+    if stream:
+        return _ndjson(github_mirror.iter_repos(limit), _format_resource)
     
-    resources = [
-        {
-            "uri": f"github://repo/{repo['name']}",
-            "name": repo['name'],
-            "description": repo.get('description', 'No description'),
-            "metadata": {
-                "language": repo.get('language'),
-                "stars": repo.get('stargazers_count', 0),
-                "updated_at": repo.get('updated_at'),
-                "url": repo.get('html_url')
-            }
-        }
-        for repo in repos
-    ]
+    repos = await github_mirror.list_repos(limit)
+    
+    resources = [_format_resource(repo) for repo in repos]
     
     return {"resources": resources, "total": len(resources)}
 
 @app.get("/resources/{repo_name}")
 async def read_resource(repo_name: str):
     """Read a specific repository's README"""
-    readme = await github_client.get_repo_readme(repo_name)
+    readme = await github_mirror.get_readme(repo_name)
     
     if not readme:
         return {"error": "README not found"}
@@ -76,94 +145,47 @@ async def read_resource(repo_name: str):
         "mimeType": "text/markdown"
     }
 
+async def _dispatch(name: str, arguments: Dict[str, Any], stream: bool = False, raw: bool = False):
+    """Run one tool call; with stream, list tools answer with an NDJSON response"""
+    tool = tool_registry.get(name)
+    if tool is None:
+        return {"error": f"Unknown tool: {name}"}
+    
+    if stream and tool.iterate is not None:
+        return _ndjson(tool.stream(arguments, project=not raw))
+    
+    return {"tool": name, "result": await tool.call(arguments, project=not raw)}
+
+async def _run_batched(call: ToolCall, timeout: float) -> Dict[str, Any]:
+    """One batch entry: the tool's result or its error, with the time it took"""
+    started = time.perf_counter()
+    try:
+        outcome = await asyncio.wait_for(_dispatch(call.tool, call.arguments), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tool {call.tool} timed out after {timeout}s")
+        outcome = {"error": f"Timed out after {timeout}s"}
+    except Exception as e:
+        logger.error(f"Tool {call.tool} failed: {e}")
+        outcome = {"error": str(e)}
+    return {"tool": call.tool, **outcome, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+@app.get("/tools")
+async def list_tools():
+    """Tool names, descriptions and input schemas"""
+    return {"tools": tool_registry.schemas()}
+
 @app.post("/tools/call")
 async def call_tool(request: ToolCallRequest):
     """Call a GitHub tool"""
     logger.info(f"🔧 Tool call: {request.tool}")
-    
-    if request.tool == "search_repos":
-        query = request.arguments.get("query", "")
-        limit = request.arguments.get("limit", 10)
-        
-        repos = await github_client.search_repositories(query, limit)
-        
-        return {
-            "tool": "search_repos",
-            "result": [
-                {
-                    "name": repo['name'],
-                    "description": repo.get('description', ''),
-                    "language": repo.get('language'),
-                    "stars": repo.get('stargazers_count', 0),
-                    "url": repo.get('html_url')
-                }
-                for repo in repos
-            ]
-        }
-    
-    elif request.tool == "search_code":
-        query = request.arguments.get("query", "")
-        limit = request.arguments.get("limit", 10)
-        
-        code_results = await github_client.search_code(query, limit)
-        
-        return {
-            "tool": "search_code",
-            "result": [
-                {
-                    "file": item['name'],
-                    "path": item['path'],
-                    "repository": item['repository']['name'],
-                    "url": item['html_url']
-                }
-                for item in code_results
-            ]
-        }
-    
-    elif request.tool == "get_issues":
-        repo = request.arguments.get("repo", "")
-        state = request.arguments.get("state", "open")
-        limit = request.arguments.get("limit", 30)
-        
-        issues = await github_client.get_repo_issues(repo, state, limit)
-        
-        return {
-            "tool": "get_issues",
-            "result": [
-                {
-                    "number": issue['number'],
-                    "title": issue['title'],
-                    "state": issue['state'],
-                    "created_at": issue['created_at'],
-                    "url": issue['html_url'],
-                    "body": issue.get('body', '')[:200] + "..." if issue.get('body') else ""
-                }
-                for issue in issues
-            ]
-        }
-    
-    elif request.tool == "get_commits":
-        repo = request.arguments.get("repo", "")
-        limit = request.arguments.get("limit", 10)
-        
-        commits = await github_client.get_recent_commits(repo, limit)
-        
-        return {
-            "tool": "get_commits",
-            "result": [
-                {
-                    "sha": commit['sha'][:7],
-                    "message": commit['commit']['message'].split('\n')[0],
-                    "author": commit['commit']['author']['name'],
-                    "date": commit['commit']['author']['date'],
-                    "url": commit['html_url']
-                }
-                for commit in commits
-            ]
-        }
-    
-    else:
-        return {"error": f"Unknown tool: {request.tool}"}
+    return await _dispatch(request.tool, request.arguments, request.stream, request.raw)
+
+@app.post("/tools/batch")
+async def call_tools(request: BatchToolCallRequest):
+    """Run several tool calls concurrently; results keep the order of the calls"""
+    logger.info(f"🔧 Batch of {len(request.calls)} tool calls: {[call.tool for call in request.calls]}")
+    results = await asyncio.gather(*(_run_batched(call, request.timeout) for call in request.calls))
+    return {"results": results}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,2 @@
+from index.store import GithubIndex
+from index.mirror import GithubMirror
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from clients.github_client import GithubClient
+from index.store import GithubIndex
+
+logger = logging.getLogger(__name__)
+
+class GithubMirror:
+    """Serves repos, READMEs, issues and commits from a local GithubIndex.
+
+    A background task re-syncs the index every interval seconds. Each sync
+    lists the repos, then per repo fetches only what changed: issues updated
+    since the newest stored one, and the README and commits since the newest
+    stored commit when the repo has been pushed to. Until a first sync has
+    completed, reads fall through to the GitHub API.
+    """
+
+    def __init__(
+        self,
+        client: GithubClient,
+        index: GithubIndex,
+        interval: float = 300.0,
+        concurrency: int = 4,
+        commit_limit: int = 200,
+        issue_limit: int = 500,
+    ):
+        self.client = client
+        self.index = index
+        self.interval = interval
+        self.concurrency = concurrency
+        # Caps for a repo's first sync; later syncs only fetch what is new
+        self.commit_limit = commit_limit
+        self.issue_limit = issue_limit
+        self._task: Optional[asyncio.Task] = None
+        self._syncing = False
+        self.status: Dict[str, Any] = {
+            "last_sync": index.get_state("last_sync"),
+            "last_duration_s": None,
+            "repo_errors": 0,
+            "last_error": None,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.status["last_sync"] is not None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    async def sync(self):
+        """Bring the index up to date with GitHub"""
+        if self._syncing:
+            return
+        self._syncing = True
+        started = time.perf_counter()
+        try:
+            repos = [repo async for repo in self.client.iter_user_repos()]
+            removed = self.index.remove_repos_except(repo["name"] for repo in repos)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def sync_repo(repo: Dict[str, Any]) -> bool:
+                async with semaphore:
+                    return await self._sync_repo(repo)
+
+            results = await asyncio.gather(*(sync_repo(repo) for repo in repos))
+            synced_at = datetime.now(timezone.utc).isoformat()
+            self.index.set_state("last_sync", synced_at)
+            self.status.update({
+                "last_sync": synced_at,
+                "last_duration_s": round(time.perf_counter() - started, 2),
+                "repo_errors": results.count(False),
+            })
+            logger.info(
+                f"Synced {len(repos)} repos ({results.count(False)} failed, {removed} removed) "
+                f"in {self.status['last_duration_s']}s"
+            )
+        except Exception as e:
+            logger.error(f"GitHub sync failed: {e}")
+            self.status["last_error"] = str(e)
+        finally:
+            self._syncing = False
+
+    async def _sync_repo(self, repo: Dict[str, Any]) -> bool:
+        name = repo["name"]
+        try:
+            self.index.upsert_repo(repo)
+            # Commits and README only change when the repo is pushed to
+            if repo.get("pushed_at") != self.index.get_state(f"repo:{name}"):
+                # Raises on failure, leaving the cursor where it was so the next sync retries
+                self.index.set_readme(name, await self.client.fetch_repo_readme(name))
+                since = self.index.latest_commit_date(name)
+                commits = [
+                    commit async for commit in self.client.iter_recent_commits(name, self.commit_limit, since=since)
+                ]
+                self.index.upsert_commits(name, commits)
+
+            since = self.index.latest_issue_update(name)
+            issues = [
+                issue async for issue in self.client.iter_repo_issues(
+                    name, "all", None if since else self.issue_limit, since=since
+                )
+            ]
+            self.index.upsert_issues(name, issues)
+            self.index.set_state(f"repo:{name}", repo.get("pushed_at") or "")
+            return True
+        except Exception as e:
+            # Retried on the next sync since the repo cursor was not advanced
+            logger.error(f"Failed to sync {name}: {e}")
+            self.status["last_error"] = f"{name}: {e}"
+            return False
+
+    async def list_repos(self, limit: int = 50) -> List[Dict[str, Any]]:
+        try:
+            return [repo async for repo in self.iter_repos(limit)]
+        except Exception as e:
+            logger.error(f"Failed to get repos: {e}")
+            return []
+
+    async def iter_repos(self, limit: int = 50) -> AsyncIterator[Dict[str, Any]]:
+        if self.ready:
+            for repo in self.index.search_repos("", limit):
+                yield repo
+            return
+        async for repo in self.client.iter_user_repos(limit):
+            yield repo
+
+    async def search_repos(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        if self.ready:
+            return self.index.search_repos(query, limit)
+        return await self.client.search_repositories(query, limit)
+
+    async def get_readme(self, repo_name: str) -> str:
+        readme = self.index.get_readme(repo_name) if self.ready else None
+        if readme is None:
+            return await self.client.get_repo_readme(repo_name)
+        return readme
+
+    async def get_issues(
+        self,
+        repo_name: Optional[str] = None,
+        state: str = "open",
+        limit: int = 30,
+        query: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        try:
+            return [issue async for issue in self.iter_issues(repo_name, state, limit, query)]
+        except Exception as e:
+            logger.error(f"Failed to get issues: {e}")
+            return []
+
+    async def iter_issues(
+        self,
+        repo_name: Optional[str] = None,
+        state: str = "open",
+        limit: int = 30,
+        query: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Issues of one repo, or across all repos when repo_name is empty"""
+        if self.ready:
+            for issue in self.index.get_issues(repo_name, state, limit, query):
+                yield issue
+            return
+        repo_name = repo_name or await self._latest_repo()
+        if repo_name:
+            async for issue in self.client.iter_repo_issues(repo_name, state, limit):
+                yield {**issue, "repository": repo_name}
+
+    async def get_commits(
+        self,
+        repo_name: Optional[str] = None,
+        limit: int = 10,
+        query: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        try:
+            return [commit async for commit in self.iter_commits(repo_name, limit, query)]
+        except Exception as e:
+            logger.error(f"Failed to get commits: {e}")
+            return []
+
+    async def iter_commits(
+        self,
+        repo_name: Optional[str] = None,
+        limit: int = 10,
+        query: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Newest commits of one repo, or across all repos when repo_name is empty"""
+        if self.ready:
+            for commit in self.index.get_commits(repo_name, limit, query):
+                yield commit
+            return
+        repo_name = repo_name or await self._latest_repo()
+        if repo_name:
+            async for commit in self.client.iter_recent_commits(repo_name, limit):
+                yield {**commit, "repository": repo_name}
+
+    async def _latest_repo(self) -> Optional[str]:
+        # Without the index, cross-repo queries fall back to the most recently updated repo
+        repos = await self.client.get_user_repos(1)
+        return repos[0]["name"] if repos else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.status, "ready": self.ready, "syncing": self._syncing, "index": self.index.stats()}
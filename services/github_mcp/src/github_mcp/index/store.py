@@ -0,0 +1,290 @@
+import logging
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    name TEXT PRIMARY KEY,
+    description TEXT,
+    language TEXT,
+    stars INTEGER,
+    url TEXT,
+    updated_at TEXT,
+    pushed_at TEXT,
+    readme TEXT
+);
+CREATE TABLE IF NOT EXISTS issues (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    title TEXT,
+    state TEXT,
+    body TEXT,
+    url TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (repo, number)
+);
+CREATE INDEX IF NOT EXISTS issues_by_update ON issues (state, updated_at);
+CREATE TABLE IF NOT EXISTS commits (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    message TEXT,
+    author TEXT,
+    date TEXT,
+    url TEXT,
+    PRIMARY KEY (repo, sha)
+);
+CREATE INDEX IF NOT EXISTS commits_by_date ON commits (date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# External-content FTS5 tables kept in step with their base tables by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({columns}, content='{table}', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, {columns}) VALUES (new.rowid, {new});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old});
+    INSERT INTO {table}_fts (rowid, {columns}) VALUES (new.rowid, {new});
+END;
+"""
+
+FTS_COLUMNS = {
+    "repos": ["name", "description", "readme"],
+    "issues": ["title", "body"],
+    "commits": ["message"],
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def _match_query(query: str) -> Optional[str]:
+    """FTS5 query matching any of the words in free text, safe from FTS syntax"""
+    words = WORD_PATTERN.findall(query)
+    return " OR ".join(f'"{word}"' for word in words) if words else None
+
+class GithubIndex:
+    """SQLite mirror of the user's repos, READMEs, issues and commits.
+
+    Rows are returned in the same shape as the GitHub REST API so callers can
+    format them exactly like live results. Text search uses FTS5 ranked by
+    bm25, or LIKE when SQLite was built without FTS5.
+    """
+
+    def __init__(self, path: str = "github_index.db"):
+        self.path = path
+        # Built at import time but used from the event loop's thread; all access is serial
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.fts = True
+        try:
+            for table, columns in FTS_COLUMNS.items():
+                self.db.executescript(FTS_SCHEMA.format(
+                    table=table,
+                    columns=", ".join(columns),
+                    new=", ".join(f"new.{c}" for c in columns),
+                    old=", ".join(f"old.{c}" for c in columns),
+                ))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, falling back to LIKE search: {e}")
+            self.fts = False
+        self.db.commit()
+
+    # Sync cursors
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    # Writes
+
+    def upsert_repo(self, repo: Dict[str, Any]):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO repos (name, description, language, stars, url, updated_at, pushed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET description = excluded.description, "
+                "language = excluded.language, stars = excluded.stars, url = excluded.url, "
+                "updated_at = excluded.updated_at, pushed_at = excluded.pushed_at",
+                (
+                    repo["name"], repo.get("description"), repo.get("language"),
+                    repo.get("stargazers_count", 0), repo.get("html_url"),
+                    repo.get("updated_at"), repo.get("pushed_at"),
+                ),
+            )
+
+    def set_readme(self, repo_name: str, readme: str):
+        with self.db:
+            self.db.execute("UPDATE repos SET readme = ? WHERE name = ?", (readme, repo_name))
+
+    def remove_repos_except(self, names: Iterable[str]) -> int:
+        """Drop repos (and their issues and commits) that no longer exist upstream"""
+        keep = set(names)
+        stale = [row["name"] for row in self.db.execute("SELECT name FROM repos") if row["name"] not in keep]
+        with self.db:
+            for name in stale:
+                self.db.execute("DELETE FROM repos WHERE name = ?", (name,))
+                self.db.execute("DELETE FROM issues WHERE repo = ?", (name,))
+                self.db.execute("DELETE FROM commits WHERE repo = ?", (name,))
+                self.db.execute(
+                    "DELETE FROM sync_state WHERE key IN (?, ?, ?)",
+                    (f"repo:{name}", f"issues:{name}", f"commits:{name}"),
+                )
+        return len(stale)
+
+    def upsert_issues(self, repo_name: str, issues: List[Dict[str, Any]]):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO issues (repo, number, title, state, body, url, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (repo, number) DO UPDATE SET title = excluded.title, state = excluded.state, "
+                "body = excluded.body, url = excluded.url, updated_at = excluded.updated_at",
+                [
+                    (
+                        repo_name, issue["number"], issue["title"], issue["state"], issue.get("body") or "",
+                        issue["html_url"], issue["created_at"], issue["updated_at"],
+                    )
+                    for issue in issues
+                ],
+            )
+
+    def upsert_commits(self, repo_name: str, commits: List[Dict[str, Any]]):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO commits (repo, sha, message, author, date, url) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        repo_name, commit["sha"], commit["commit"]["message"],
+                        commit["commit"]["author"]["name"], commit["commit"]["author"]["date"],
+                        commit["html_url"],
+                    )
+                    for commit in commits
+                ],
+            )
+
+    # Reads
+
+    def _search(self, table: str, query: Optional[str], where: List[str], params: List[Any], order: str, limit: int):
+        """Rows of table filtered by where, ranked by text relevance when there is a query"""
+        match = _match_query(query) if query else None
+        if match and self.fts:
+            sql = (
+                f"SELECT {table}.* FROM {table}_fts JOIN {table} ON {table}.rowid = {table}_fts.rowid "
+                f"WHERE {table}_fts MATCH ? {''.join(' AND ' + w for w in where)} "
+                f"ORDER BY bm25({table}_fts) LIMIT ?"
+            )
+            return self.db.execute(sql, [match, *params, limit]).fetchall()
+        if match:
+            like = " OR ".join(f"{column} LIKE ?" for column in FTS_COLUMNS[table])
+            words = WORD_PATTERN.findall(query)
+            where = [*where, "(" + " OR ".join(f"({like})" for _ in words) + ")"]
+            params = [*params, *(f"%{word}%" for word in words for _ in FTS_COLUMNS[table])]
+        sql = f"SELECT * FROM {table} {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?"
+        return self.db.execute(sql, [*params, limit]).fetchall()
+
+    def search_repos(self, query: str = "", limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self._search("repos", query, [], [], "updated_at DESC", limit)
+        return [
+            {
+                "name": row["name"],
+                "description": row["description"],
+                "language": row["language"],
+                "stargazers_count": row["stars"],
+                "html_url": row["url"],
+                "updated_at": row["updated_at"],
+            }
+            for row in rows
+        ]
+
+    def get_readme(self, repo_name: str) -> Optional[str]:
+        row = self.db.execute("SELECT readme FROM repos WHERE name = ?", (repo_name,)).fetchone()
+        return row["readme"] if row else None
+
+    def get_issues(
+        self,
+        repo_name: Optional[str] = None,
+        state: str = "open",
+        limit: int = 30,
+        query: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Issues of one repo, or of every repo when repo_name is empty"""
+        where, params = [], []
+        if repo_name:
+            where.append("issues.repo = ?")
+            params.append(repo_name)
+        if state != "all":
+            where.append("issues.state = ?")
+            params.append(state)
+        rows = self._search("issues", query, where, params, "updated_at DESC", limit)
+        return [
+            {
+                "repository": row["repo"],
+                "number": row["number"],
+                "title": row["title"],
+                "state": row["state"],
+                "body": row["body"],
+                "html_url": row["url"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"],
+            }
+            for row in rows
+        ]
+
+    def get_commits(
+        self,
+        repo_name: Optional[str] = None,
+        limit: int = 10,
+        query: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Newest commits of one repo, or of every repo when repo_name is empty"""
+        where, params = [], []
+        if repo_name:
+            where.append("commits.repo = ?")
+            params.append(repo_name)
+        rows = self._search("commits", query, where, params, "date DESC", limit)
+        return [
+            {
+                "repository": row["repo"],
+                "sha": row["sha"],
+                "html_url": row["url"],
+                "commit": {"message": row["message"], "author": {"name": row["author"], "date": row["date"]}},
+            }
+            for row in rows
+        ]
+
+    def latest_issue_update(self, repo_name: str) -> Optional[str]:
+        row = self.db.execute("SELECT MAX(updated_at) AS latest FROM issues WHERE repo = ?", (repo_name,)).fetchone()
+        return row["latest"]
+
+    def latest_commit_date(self, repo_name: str) -> Optional[str]:
+        row = self.db.execute("SELECT MAX(date) AS latest FROM commits WHERE repo = ?", (repo_name,)).fetchone()
+        return row["latest"]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {
+            table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("repos", "issues", "commits")
+        }
+        return {"path": self.path, "fts": self.fts, **counts}
+
+    def close(self):
+        self.db.close()
@@ -8,11 +8,26 @@ import mcp.types as types
 
 from clients.github_client import GithubClient
 from config import settings
+from index import GithubIndex, GithubMirror
+from tools import build_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-github_client = GithubClient(settings.github_token, settings.github_username)
+github_client = GithubClient(
+    settings.github_token,
+    settings.github_username,
+    cache_max_entries=settings.github_cache_max_entries,
+    rate_limit_max_wait=settings.github_rate_limit_max_wait,
+    page_concurrency=settings.github_page_concurrency,
+)
+github_mirror = GithubMirror(
+    github_client,
+    GithubIndex(settings.github_index_path),
+    interval=settings.github_sync_interval,
+    concurrency=settings.github_sync_concurrency,
+)
+tool_registry = build_registry(github_client, github_mirror)
 
 mcp_server = Server("github-mcp")
 
@@ -21,7 +36,7 @@ async def list_resources() -> list[Resource]:
     """List available GitHub repositories as MCP resources"""
     logger.info("Listing GitHub repositories")
     
-    repos = await github_client.get_user_repos(limit=50)
+    repos = await github_mirror.list_repos(limit=50)
     
     resources = [
         Resource(
@@ -45,7 +60,7 @@ async def read_resource(uri: str) -> str:
         repo_name = uri.replace("github://repo/", "")
         
         # Get README content
-        readme = await github_client.get_repo_readme(repo_name)
+        readme = await github_mirror.get_readme(repo_name)
         
         if readme:
             return readme
@@ -57,168 +72,35 @@ async def read_resource(uri: str) -> str:
 @mcp_server.list_tools()
 async def list_tools() -> list[Tool]:
     """List available GitHub tools"""
-    return [
-        Tool(
-            name="search_repos",
-            description="Search GitHub repositories by query",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query for repositories"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Maximum number of results",
-                        "default": 10
-                    }
-                },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="search_code",
-            description="Search code across all repositories",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query for code"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Maximum number of results",
-                        "default": 10
-                    }
-                },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="get_issues",
-            description="Get issues from a specific repository",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "repo": {
-                        "type": "string",
-                        "description": "Repository name"
-                    },
-                    "state": {
-                        "type": "string",
-                        "description": "Issue state: open, closed, or all",
-                        "default": "open"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Maximum number of results",
-                        "default": 30
-                    }
-                },
-                "required": ["repo"]
-            }
-        ),
-        Tool(
-            name="get_commits",
-            description="Get recent commits from a repository",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "repo": {
-                        "type": "string",
-                        "description": "Repository name"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Maximum number of commits",
-                        "default": 10
-                    }
-                },
-                "required": ["repo"]
-            }
-        )
-    ]
+    return [Tool(**schema) for schema in tool_registry.schemas()]
 
 @mcp_server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Execute GitHub tools"""
     logger.info(f"Calling tool: {name} with args: {arguments}")
     
-    if name == "search_repos":
-        query = arguments.get("query", "")
-        limit = arguments.get("limit", 10)
-        
-        repos = await github_client.search_repositories(query, limit)
-        
-        result = "Found repositories:\n\n"
-        for repo in repos:
-            result += f"- {repo['name']}: {repo.get('description', 'No description')}\n"
-            result += f"  Language: {repo.get('language', 'Unknown')}\n"
-            result += f"  Stars: {repo.get('stargazers_count', 0)}\n"
-            result += f"  URL: {repo.get('html_url')}\n\n"
-        
-        return [TextContent(type="text", text=result)]
-    
-    elif name == "search_code":
-        query = arguments.get("query", "")
-        limit = arguments.get("limit", 10)
-        
-        code_results = await github_client.search_code(query, limit)
-        
-        result = "Found code:\n\n"
-        for item in code_results:
-            result += f"- {item['name']} in {item['repository']['name']}\n"
-            result += f"  Path: {item['path']}\n"
-            result += f"  URL: {item['html_url']}\n\n"
-        
-        return [TextContent(type="text", text=result)]
-    
-    elif name == "get_issues":
-        repo = arguments.get("repo", "")
-        state = arguments.get("state", "open")
-        limit = arguments.get("limit", 30)
-        
-        issues = await github_client.get_repo_issues(repo, state, limit)
-        
-        result = f"Issues in {repo} ({state}):\n\n"
-        for issue in issues:
-            result += f"- #{issue['number']}: {issue['title']}\n"
-            result += f"  State: {issue['state']}\n"
-            result += f"  Created: {issue['created_at']}\n"
-            result += f"  URL: {issue['html_url']}\n\n"
-        
-        return [TextContent(type="text", text=result)]
-    
-    elif name == "get_commits":
-        repo = arguments.get("repo", "")
-        limit = arguments.get("limit", 10)
-        
-        commits = await github_client.get_recent_commits(repo, limit)
-        
-        result = f"Recent commits in {repo}:\n\n"
-        for commit in commits:
-            msg = commit['commit']['message'].split('\n')[0]  # First line
-            result += f"- {commit['sha'][:7]}: {msg}\n"
-            result += f"  Author: {commit['commit']['author']['name']}\n"
-            result += f"  Date: {commit['commit']['author']['date']}\n\n"
-        
-        return [TextContent(type="text", text=result)]
-    
-    else:
+    tool = tool_registry.get(name)
+    if tool is None:
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    
+    return [TextContent(type="text", text=await tool.call_text(arguments))]
 
 # Run the MCP server
 async def main():
     from mcp.server.stdio import stdio_server
     
-    async with stdio_server() as (read_stream, write_stream):
-        await mcp_server.run(
-            read_stream,
-            write_stream,
-            mcp_server.create_initialization_options()
-        )
+    if settings.github_sync_enabled:
+        github_mirror.start()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await mcp_server.run(
+                read_stream,
+                write_stream,
+                mcp_server.create_initialization_options()
+            )
+    finally:
+        await github_mirror.stop()
+        await github_client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,2 @@
+from tools.registry import ToolDefinition, ToolRegistry
+from tools.github import build_registry
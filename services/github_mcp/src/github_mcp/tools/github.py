@@ -0,0 +1,143 @@
+from typing import Any, Dict
+
+from clients.github_client import GithubClient
+from index.mirror import GithubMirror
+from tools.registry import ToolDefinition, ToolRegistry
+
+def _limit(default: int, description: str = "Maximum number of results") -> Dict[str, Any]:
+    return {"type": "integer", "description": description, "default": default}
+
+REPO_PROPERTY = {
+    "type": "string",
+    "description": "Repository name; omit to search all repositories",
+    "default": "",
+}
+
+# Compact projections: the fields of GitHub's JSON that callers actually use
+
+def project_repo(repo: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": repo['name'],
+        "description": repo.get('description', ''),
+        "language": repo.get('language'),
+        "stars": repo.get('stargazers_count', 0),
+        "url": repo.get('html_url')
+    }
+
+def project_code(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "file": item['name'],
+        "path": item['path'],
+        "repository": item['repository']['name'],
+        "url": item['html_url']
+    }
+
+def project_issue(issue: Dict[str, Any]) -> Dict[str, Any]:
+    body = issue.get('body')
+    return {
+        "repository": issue.get('repository'),
+        "number": issue['number'],
+        "title": issue['title'],
+        "state": issue['state'],
+        "created_at": issue['created_at'],
+        "url": issue['html_url'],
+        "body": body[:200] + "..." if body else ""
+    }
+
+def project_commit(commit: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "repository": commit.get('repository'),
+        "sha": commit['sha'][:7],
+        "message": commit['commit']['message'].split('\n', 1)[0],
+        "author": commit['commit']['author']['name'],
+        "date": commit['commit']['author']['date'],
+        "url": commit['html_url']
+    }
+
+# Text rendering of projected items for the stdio transport
+
+def render_repo(repo: Dict[str, Any]) -> str:
+    return (
+        f"- {repo['name']}: {repo['description'] or 'No description'}\n"
+        f"  Language: {repo['language'] or 'Unknown'}\n"
+        f"  Stars: {repo['stars']}\n"
+        f"  URL: {repo['url']}\n\n"
+    )
+
+def render_code(item: Dict[str, Any]) -> str:
+    return f"- {item['file']} in {item['repository']}\n  Path: {item['path']}\n  URL: {item['url']}\n\n"
+
+def render_issue(issue: Dict[str, Any]) -> str:
+    return (
+        f"- {issue['repository'] or ''}#{issue['number']}: {issue['title']}\n"
+        f"  State: {issue['state']}\n"
+        f"  Created: {issue['created_at']}\n"
+        f"  URL: {issue['url']}\n\n"
+    )
+
+def render_commit(commit: Dict[str, Any]) -> str:
+    return (
+        f"- {commit['repository'] or ''}@{commit['sha']}: {commit['message']}\n"
+        f"  Author: {commit['author']}\n"
+        f"  Date: {commit['date']}\n\n"
+    )
+
+def build_registry(client: GithubClient, mirror: GithubMirror) -> ToolRegistry:
+    """The GitHub tools, served from the mirror where it has the data"""
+    return ToolRegistry([
+        ToolDefinition(
+            name="search_repos",
+            description="Search GitHub repositories by query",
+            properties={
+                "query": {"type": "string", "description": "Search query for repositories", "default": ""},
+                "limit": _limit(10),
+            },
+            required=["query"],
+            fetch=lambda args: mirror.search_repos(args["query"], args["limit"]),
+            project=project_repo,
+            heading=lambda args: "Found repositories:\n\n",
+            render=render_repo,
+        ),
+        ToolDefinition(
+            name="search_code",
+            description="Search code across all repositories",
+            properties={
+                "query": {"type": "string", "description": "Search query for code", "default": ""},
+                "limit": _limit(10),
+            },
+            required=["query"],
+            fetch=lambda args: client.search_code(args["query"], args["limit"]),
+            project=project_code,
+            heading=lambda args: "Found code:\n\n",
+            render=render_code,
+        ),
+        ToolDefinition(
+            name="get_issues",
+            description="Get issues from a repository, or across all repositories",
+            properties={
+                "repo": REPO_PROPERTY,
+                "query": {"type": "string", "description": "Full-text filter on issue title and body"},
+                "state": {"type": "string", "description": "Issue state: open, closed, or all", "default": "open"},
+                "limit": _limit(30),
+            },
+            fetch=lambda args: mirror.get_issues(args["repo"], args["state"], args["limit"], args["query"]),
+            iterate=lambda args: mirror.iter_issues(args["repo"], args["state"], args["limit"], args["query"]),
+            project=project_issue,
+            heading=lambda args: f"Issues in {args['repo'] or 'all repositories'} ({args['state']}):\n\n",
+            render=render_issue,
+        ),
+        ToolDefinition(
+            name="get_commits",
+            description="Get recent commits from a repository, or across all repositories",
+            properties={
+                "repo": REPO_PROPERTY,
+                "query": {"type": "string", "description": "Full-text filter on commit messages"},
+                "limit": _limit(10, "Maximum number of commits"),
+            },
+            fetch=lambda args: mirror.get_commits(args["repo"], args["limit"], args["query"]),
+            iterate=lambda args: mirror.iter_commits(args["repo"], args["limit"], args["query"]),
+            project=project_commit,
+            heading=lambda args: f"Recent commits in {args['repo'] or 'all repositories'}:\n\n",
+            render=render_commit,
+        ),
+    ])
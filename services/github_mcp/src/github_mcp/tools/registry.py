@@ -0,0 +1,86 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+Item = Dict[str, Any]
+
+class ToolDefinition:
+    """A tool's input schema plus the functions that fetch, project and render its results.
+
+    fetch returns GitHub-shaped JSON; project trims each item to the compact
+    fields both transports show, and render turns a projected item into the
+    text the stdio server returns. Arguments missing from a call get the
+    schema's defaults.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        properties: Dict[str, Dict[str, Any]],
+        fetch: Callable[[Dict[str, Any]], Awaitable[List[Item]]],
+        heading: Callable[[Dict[str, Any]], str],
+        render: Callable[[Item], str],
+        project: Optional[Callable[[Item], Item]] = None,
+        iterate: Optional[Callable[[Dict[str, Any]], AsyncIterator[Item]]] = None,
+        required: Sequence[str] = (),
+    ):
+        self.name = name
+        self.description = description
+        self.properties = properties
+        self.required = list(required)
+        self.fetch = fetch
+        self.heading = heading
+        self.render = render
+        self.project = project
+        # Set for tools whose results can be streamed item by item
+        self.iterate = iterate
+        self.defaults = {key: spec.get("default") for key, spec in properties.items()}
+
+    @property
+    def input_schema(self) -> Dict[str, Any]:
+        schema = {"type": "object", "properties": self.properties}
+        if self.required:
+            schema["required"] = self.required
+        return schema
+
+    def _arguments(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        return {**self.defaults, **arguments}
+
+    async def call(self, arguments: Dict[str, Any], project: bool = True) -> List[Item]:
+        """Fetch the results, projected unless project is False"""
+        items = await self.fetch(self._arguments(arguments))
+        if project and self.project is not None:
+            return [self.project(item) for item in items]
+        return items
+
+    async def stream(self, arguments: Dict[str, Any], project: bool = True) -> AsyncIterator[Item]:
+        """Yield the results one by one; only for tools with iterate"""
+        async for item in self.iterate(self._arguments(arguments)):
+            yield self.project(item) if project and self.project is not None else item
+
+    async def call_text(self, arguments: Dict[str, Any]) -> str:
+        """The results rendered as text, built in one join"""
+        arguments = self._arguments(arguments)
+        items = await self.fetch(arguments)
+        project = self.project or (lambda item: item)
+        return "".join([self.heading(arguments), *(self.render(project(item)) for item in items)])
+
+class ToolRegistry:
+    """Tools by name, shared by the stdio and HTTP transports"""
+
+    def __init__(self, tools: Sequence[ToolDefinition] = ()):
+        self.tools: Dict[str, ToolDefinition] = {}
+        for tool in tools:
+            self.add(tool)
+
+    def add(self, tool: ToolDefinition) -> ToolDefinition:
+        self.tools[tool.name] = tool
+        return tool
+
+    def get(self, name: str) -> Optional[ToolDefinition]:
+        return self.tools.get(name)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": tool.name, "description": tool.description, "inputSchema": tool.input_schema}
+            for tool in self.tools.values()
+        ]
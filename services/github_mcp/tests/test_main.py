@@ -0,0 +1,363 @@
+import asyncio
+import base64
+import json
+import math
+import os
+import time
+
+# Settings are read at import time: keep the index in memory and the background sync off
+os.environ.setdefault("GITHUB_TOKEN", "test-token")
+os.environ.setdefault("GITHUB_USERNAME", "octocat")
+os.environ.setdefault("GITHUB_INDEX_PATH", ":memory:")
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from clients.github_client import GithubClient
+from clients.rate_limiter import RateLimitExceeded
+from index import GithubIndex, GithubMirror
+
+def _client(handler, **kwargs) -> GithubClient:
+    client = GithubClient("test-token", "octocat", **kwargs)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+@pytest.mark.asyncio
+async def test_conditional_get_reuses_cached_body_on_304():
+    """Test a cached response is revalidated with its ETag and reused when GitHub answers 304"""
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, headers={"etag": '"v1"'}, json={"name": "kb"})
+
+    client = _client(handler)
+    url = f"{client.base_url}/repos/octocat/kb"
+
+    assert await client._get(url) == {"name": "kb"}
+    assert await client._get(url) == {"name": "kb"}
+    assert seen == [None, '"v1"']
+    assert client.stats()["cache"]["revalidated"] == 1
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_fresh_cache_entries_skip_the_request():
+    """Test entries within GitHub's max-age are served without a request"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, headers={"etag": '"v1"', "cache-control": "private, max-age=60"}, json=[])
+
+    client = _client(handler)
+    url = f"{client.base_url}/users/octocat/repos"
+    await client._get(url)
+    await client._get(url)
+
+    assert len(calls) == 1
+    assert client.stats()["cache"]["fresh_hits"] == 1
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_exhausted_code_search_quota_blocks_only_code_search():
+    """Test the bucket GitHub reports is the one enforced, and other quotas stay usable"""
+    calls = []
+    reset_at = str(int(time.time()) + 600)
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(
+            200,
+            headers={
+                "x-ratelimit-resource": "code_search",
+                "x-ratelimit-limit": "10",
+                "x-ratelimit-remaining": "0",
+                "x-ratelimit-reset": reset_at,
+            },
+            json={"items": [{"name": "cache.py"}]},
+        )
+
+    client = _client(handler, rate_limit_max_wait=1.0)
+
+    assert await client.search_code("cache") == [{"name": "cache.py"}]
+    # The second search is rejected before it reaches GitHub
+    assert await client.search_code("cache") == []
+    with pytest.raises(RateLimitExceeded):
+        await client.rate_limiter.acquire("code_search")
+    await client.rate_limiter.acquire("search")
+
+    assert calls == ["/search/code"]
+    assert client.stats()["rate_limit"]["rejected"] == 2
+    await client.close()
+
+def _paged_handler(items, pages_seen, with_last=True):
+    """Serve items page by page with GitHub-style Link headers"""
+    def handler(request):
+        page = int(request.url.params.get("page", 1))
+        per_page = int(request.url.params["per_page"])
+        last = max(1, math.ceil(len(items) / per_page))
+        pages_seen.append(page)
+        links = []
+        if page < last:
+            links.append(f'<{request.url.copy_set_param("page", page + 1)}>; rel="next"')
+            if with_last:
+                links.append(f'<{request.url.copy_set_param("page", last)}>; rel="last"')
+        headers = {"link": ", ".join(links)} if links else {}
+        return httpx.Response(200, headers=headers, json=items[(page - 1) * per_page:page * per_page])
+    return handler
+
+@pytest.mark.asyncio
+async def test_pagination_follows_next_links():
+    """Test pages without a "last" link are followed one by one and yielded in order"""
+    repos = [{"name": f"repo-{i}"} for i in range(250)]
+    pages_seen = []
+    client = _client(_paged_handler(repos, pages_seen, with_last=False))
+
+    assert [repo async for repo in client.iter_user_repos()] == repos
+    assert pages_seen == [1, 2, 3]
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_pagination_fetches_only_the_pages_a_limit_needs():
+    """Test the remaining pages are fetched from the "last" link, in order and only up to the limit"""
+    repos = [{"name": f"repo-{i}"} for i in range(450)]
+    pages_seen = []
+    client = _client(_paged_handler(repos, pages_seen), page_concurrency=2)
+
+    assert [repo async for repo in client.iter_user_repos()] == repos
+    assert sorted(pages_seen) == [1, 2, 3, 4, 5]
+
+    pages_seen.clear()
+    assert await client.get_user_repos(150) == repos[:150]
+    assert sorted(pages_seen) == [1, 2]
+    await client.close()
+
+def _issue(number, title, updated_at):
+    return {
+        "number": number,
+        "title": title,
+        "state": "open",
+        "body": f"Details of {title}",
+        "html_url": f"https://github.com/octocat/kb/issues/{number}",
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": updated_at,
+    }
+
+def _commit(sha, message, date):
+    return {
+        "sha": sha,
+        "html_url": f"https://github.com/octocat/kb/commit/{sha}",
+        "commit": {"message": message, "author": {"name": "octocat", "date": date}},
+    }
+
+class FakeGithub:
+    """A user's repos, READMEs, issues and commits behind the GitHub REST routes, honouring since"""
+
+    def __init__(self):
+        self.pushed_at = {"kb": "2024-01-01T00:00:00Z", "api": "2024-01-01T00:00:00Z"}
+        self.issues = {
+            "kb": [_issue(1, "Fix login redirect", "2024-02-01T00:00:00Z")],
+            "api": [_issue(2, "Rate limit search", "2024-02-02T00:00:00Z")],
+        }
+        self.commits = {
+            "kb": [_commit("a" * 40, "Add response cache", "2024-03-01T00:00:00Z")],
+            "api": [_commit("b" * 40, "Initial commit", "2024-03-02T00:00:00Z")],
+        }
+        self.readme_status = 200
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        parts = request.url.path.strip("/").split("/")
+        if parts[0] == "users":
+            return httpx.Response(200, json=[
+                {"name": name, "description": f"{name} service", "pushed_at": pushed, "updated_at": pushed}
+                for name, pushed in self.pushed_at.items()
+            ])
+        repo, kind = parts[2], parts[3]
+        if kind == "readme":
+            if self.readme_status != 200:
+                return httpx.Response(self.readme_status)
+            return httpx.Response(200, json={"content": base64.b64encode(f"# {repo}".encode()).decode()})
+        since = request.url.params.get("since", "")
+        if kind == "issues":
+            return httpx.Response(200, json=[i for i in self.issues[repo] if i["updated_at"] >= since])
+        return httpx.Response(200, json=[c for c in self.commits[repo] if c["commit"]["author"]["date"] >= since])
+
+    def since_params(self, kind):
+        return {
+            request.url.path.split("/")[3]: request.url.params.get("since")
+            for request in self.requests
+            if request.url.path.endswith(f"/{kind}")
+        }
+
+@pytest.mark.asyncio
+async def test_mirror_sync_fetches_only_what_changed_since_its_cursors():
+    """Test repeat syncs ask GitHub only for issues and commits newer than the stored ones"""
+    github = FakeGithub()
+    mirror = GithubMirror(_client(github), GithubIndex(":memory:"))
+    assert not mirror.ready
+
+    await mirror.sync()
+    assert mirror.ready
+    assert {(i["repository"], i["title"]) for i in await mirror.get_issues()} == {
+        ("kb", "Fix login redirect"), ("api", "Rate limit search"),
+    }
+    assert await mirror.get_readme("kb") == "# kb"
+
+    # No pushes: issues are fetched since the newest stored update, README and commits are skipped
+    github.requests.clear()
+    github.issues["kb"].append(_issue(3, "Add dark mode", "2024-02-10T00:00:00Z"))
+    await mirror.sync()
+    assert github.since_params("issues") == {"kb": "2024-02-01T00:00:00Z", "api": "2024-02-02T00:00:00Z"}
+    assert github.since_params("readme") == github.since_params("commits") == {}
+    assert [i["title"] for i in await mirror.get_issues(query="dark mode")] == ["Add dark mode"]
+
+    # A push to kb fetches its README and the commits since the newest stored one
+    github.requests.clear()
+    github.pushed_at["kb"] = "2024-03-05T00:00:00Z"
+    github.commits["kb"].insert(0, _commit("c" * 40, "Fix cache eviction", "2024-03-05T00:00:00Z"))
+    await mirror.sync()
+    assert github.since_params("commits") == {"kb": "2024-03-01T00:00:00Z"}
+    assert list(github.since_params("readme")) == ["kb"]
+    assert {c["commit"]["message"] for c in await mirror.get_commits(query="cache")} == {
+        "Add response cache", "Fix cache eviction",
+    }
+    assert mirror.index.stats()["commits"] == 3
+
+@pytest.mark.asyncio
+async def test_mirror_retries_a_repo_whose_readme_fetch_failed():
+    """Test a failed README fetch keeps the repo cursor so the next sync fetches it again"""
+    github = FakeGithub()
+    github.readme_status = 502
+    mirror = GithubMirror(_client(github), GithubIndex(":memory:"))
+
+    await mirror.sync()
+    assert mirror.stats()["repo_errors"] == 2
+    assert mirror.index.get_state("repo:kb") is None
+
+    github.readme_status = 200
+    await mirror.sync()
+    assert mirror.stats()["repo_errors"] == 0
+    assert await mirror.get_readme("kb") == "# kb"
+
+    # A repo without a README is a successful sync, not an error
+    github.readme_status = 404
+    github.pushed_at["kb"] = "2024-04-01T00:00:00Z"
+    await mirror.sync()
+    assert mirror.index.get_state("repo:kb") == "2024-04-01T00:00:00Z"
+    assert await mirror.get_readme("kb") == ""
+
+def test_batch_isolates_slow_and_failing_calls(monkeypatch):
+    """Test each batched call gets its own deadline and error, in the order the calls were sent"""
+    import http_server
+
+    async def issues(*args):
+        return [{**_issue(1, "Fix login redirect", "2024-02-01T00:00:00Z"), "repository": "kb"}]
+
+    async def slow(*args):
+        await asyncio.sleep(5)
+        return []
+
+    async def broken(*args):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(http_server.github_mirror, "get_issues", issues)
+    monkeypatch.setattr(http_server.github_mirror, "get_commits", slow)
+    monkeypatch.setattr(http_server.github_mirror, "search_repos", broken)
+
+    started = time.perf_counter()
+    response = TestClient(http_server.app).post("/tools/batch", json={
+        "timeout": 0.2,
+        "calls": [
+            {"tool": "get_issues", "arguments": {}},
+            {"tool": "get_commits", "arguments": {}},
+            {"tool": "search_repos", "arguments": {"query": ""}},
+            {"tool": "unknown", "arguments": {}},
+        ],
+    })
+
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2
+    results = response.json()["results"]
+    assert [result["tool"] for result in results] == ["get_issues", "get_commits", "search_repos", "unknown"]
+    assert results[0]["result"][0]["title"] == "Fix login redirect"
+    assert results[1]["error"] == "Timed out after 0.2s"
+    assert results[2]["error"] == "index unavailable"
+    assert results[3]["error"] == "Unknown tool: unknown"
+    assert all("elapsed_ms" in result for result in results)
+
+def test_batch_rejects_oversized_batches():
+    """Test a batch above github_batch_max_calls is refused"""
+    import http_server
+
+    calls = [{"tool": "get_issues", "arguments": {}}] * (http_server.settings.github_batch_max_calls + 1)
+    assert TestClient(http_server.app).post("/tools/batch", json={"calls": calls}).status_code == 422
+
+def _seed_index(mirror, monkeypatch):
+    """Give a transport's mirror a fresh, already-synced index"""
+    index = GithubIndex(":memory:")
+    index.upsert_repo({"name": "kb", "description": None, "stargazers_count": 3, "html_url": "https://github.com/octocat/kb"})
+    index.upsert_issues("kb", [_issue(1, "Fix login redirect", "2024-02-01T00:00:00Z")])
+    index.upsert_commits("kb", [_commit("a" * 40, "Add response cache\n\nKeyed by URL", "2024-03-01T00:00:00Z")])
+    monkeypatch.setattr(mirror, "index", index)
+    monkeypatch.setitem(mirror.status, "last_sync", "2024-03-02T00:00:00+00:00")
+
+TOOL_NAMES = ["search_repos", "search_code", "get_issues", "get_commits"]
+
+@pytest.mark.asyncio
+async def test_stdio_server_dispatches_through_the_registry(monkeypatch):
+    """Test the stdio server lists the registry's schemas and renders its projected results"""
+    import main
+
+    _seed_index(main.github_mirror, monkeypatch)
+
+    tools = await main.list_tools()
+    assert [tool.name for tool in tools] == TOOL_NAMES
+    assert "required" not in tools[2].inputSchema
+
+    [issues] = await main.call_tool("get_issues", {})
+    assert issues.text == (
+        "Issues in all repositories (open):\n\n"
+        "- kb#1: Fix login redirect\n"
+        "  State: open\n"
+        "  Created: 2024-01-01T00:00:00Z\n"
+        "  URL: https://github.com/octocat/kb/issues/1\n\n"
+    )
+    [repos] = await main.call_tool("search_repos", {"query": ""})
+    assert repos.text.startswith("Found repositories:\n\n- kb: No description\n  Language: Unknown\n  Stars: 3\n")
+    [unknown] = await main.call_tool("unknown", {})
+    assert unknown.text == "Unknown tool: unknown"
+
+def test_http_server_dispatches_through_the_registry(monkeypatch):
+    """Test the HTTP server lists the same tools and returns projected, raw or streamed results"""
+    import http_server
+
+    _seed_index(http_server.github_mirror, monkeypatch)
+    client = TestClient(http_server.app)
+
+    assert [tool["name"] for tool in client.get("/tools").json()["tools"]] == TOOL_NAMES
+
+    projected = client.post("/tools/call", json={"tool": "get_commits", "arguments": {"query": "cache"}}).json()
+    assert projected == {
+        "tool": "get_commits",
+        "result": [{
+            "repository": "kb",
+            "sha": "aaaaaaa",
+            "message": "Add response cache",
+            "author": "octocat",
+            "date": "2024-03-01T00:00:00Z",
+            "url": f"https://github.com/octocat/kb/commit/{'a' * 40}",
+        }],
+    }
+
+    raw = client.post("/tools/call", json={"tool": "get_commits", "arguments": {}, "raw": True}).json()
+    assert raw["result"][0]["commit"]["message"] == "Add response cache\n\nKeyed by URL"
+
+    streamed = client.post("/tools/call", json={"tool": "get_commits", "arguments": {}, "stream": True})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in streamed.text.splitlines()] == projected["result"]
@@ -1,13 +1,12 @@
-import httpx
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Any, List, Optional, Dict
 from enum import Enum
-from llm_service.core import ChatService
+from llm_service.core import ChatService, ContextService, ToolRouter
+from llm_service.clients import OllamaOverloaded
 from clients.mcp_client import MCPClient
-from llm_service.core.tool_prompts import build_tool_selection_prompt
 import json
-import re
 import os
 import logging
 
@@ -16,16 +15,63 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _parse_limits(value: str) -> Dict[str, int]:
+    """Parse "name=limit,name=limit" settings such as OLLAMA_QUEUE_DEPTHS=batch=16,interactive=64"""
+    limits = {}
+    for item in value.split(","):
+        name, _, limit = item.strip().rpartition("=")
+        if name:
+            limits[name] = int(limit)
+    return limits
+
+def _overloaded(e: OllamaOverloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 chat_service = ChatService(
     ollama_url=os.getenv("OLLAMA_URL", "http://localhost:11434"),
-    model=os.getenv("OLLAMA_MODEL", "phi3:mini")
+    model=os.getenv("OLLAMA_MODEL", "phi3:mini"),
+    distributed_singleflight=os.getenv("SINGLEFLIGHT_DISTRIBUTED", "false").lower() == "true",
+    cache_l1_max_bytes=int(os.getenv("CACHE_L1_MAX_BYTES", str(32 * 1024 * 1024))),
+    embedding_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+    embedding_max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+    embedding_queue_size=int(os.getenv("EMBEDDING_QUEUE_SIZE", "1024")),
+    embedding_cache_dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+    vector_index_enabled=os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true",
+    vector_index_path=os.getenv("VECTOR_INDEX_PATH") or None,
+    vector_index_mode=os.getenv("VECTOR_INDEX_MODE", "exact"),
+    vector_index_save_every=int(os.getenv("VECTOR_INDEX_SAVE_EVERY", "256")),
+    vector_index_save_interval=float(os.getenv("VECTOR_INDEX_SAVE_INTERVAL", "60")),
+    ollama_max_in_flight=int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "4")),
+    ollama_model_max_in_flight=_parse_limits(os.getenv("OLLAMA_MODEL_MAX_IN_FLIGHT", "")),
+    ollama_queue_depths=_parse_limits(os.getenv("OLLAMA_QUEUE_DEPTHS", "")),
+    ollama_urls=[url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()] or None,
+    chunk_max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "1500")),
+    chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "100")),
+    map_concurrency=int(os.getenv("MAP_CONCURRENCY", "4")),
+    cdc_target_tokens=int(os.getenv("CDC_TARGET_TOKENS", "1000")),
+    cdc_min_tokens=int(os.getenv("CDC_MIN_TOKENS", "250")),
+    summary_cache_ttl=int(os.getenv("SUMMARY_CACHE_TTL", "86400")),
+    analysis_cache_ttl=int(os.getenv("ANALYSIS_CACHE_TTL", "86400")),
+    semantic_cache_enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+    semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    semantic_cache_max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
 )
 
 # Initialize MCP client
 github_mcp_url = os.getenv("GITHUB_MCP_URL", "http://localhost:8006")
 mcp_client = MCPClient(github_mcp_url)
 
+tool_router = ToolRouter(chat_service.ollama, chat_service.model, chat_service.cache)
+
+context_service = ContextService(
+    mcp_client,
+    tool_router,
+    search_service_url=os.getenv("SEARCH_SERVICE_URL", "http://localhost:8004"),
+    tool_timeout=float(os.getenv("MCP_TOOL_TIMEOUT", "10")),
+    local_search=chat_service.search_local,
+    rag_mode=os.getenv("RAG_MODE", "fallback"),
+)
+
 class ChatRequest(BaseModel):
     message: str
     context: Optional[List[str]] = None
@@ -37,6 +83,7 @@ class ChatResponse(BaseModel):
     doc_sources: List[dict]
     github_data: Optional[Dict[str, Any]] = None
     tools_used: List[str] = []
+    timings: Dict[str, float] = {}
 
 class ExtractRequest(BaseModel):
     text: str
@@ -47,12 +94,25 @@ class ExtractResponse(BaseModel):
 
 class EmbeddingRequest(BaseModel):
     text: str
+    # When set, the vector is also added to the local RAG index
+    document_id: Optional[str] = None
 
 class EmbeddingResponse(BaseModel):
     embeddings: List[float]
     dimensions: int
     model: str
 
+class EmbeddingBatchRequest(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = Field(default=None, ge=1)
+    document_ids: Optional[List[str]] = None
+
+class EmbeddingBatchResponse(BaseModel):
+    embeddings: List[List[float]]
+    dimensions: int
+    count: int
+    model: str
+
 class TaskExtractionRequest(BaseModel):
     text: str
 
@@ -78,6 +138,10 @@ class AnalysisType(str, Enum):
     meeting_notes = "meeting_notes"
     technical_doc = "technical_doc"
     
+class CacheInvalidateRequest(BaseModel):
+    # Defaults to every operation: chat, extract, tasks, summary, analysis, embeddings
+    operations: Optional[List[str]] = None
+
 class DocAnalysisRequest(BaseModel):
     text: str
     analysis_type: AnalysisType = AnalysisType.general
@@ -95,151 +159,63 @@ class DocAnalysisResponse(BaseModel):
 @router.post("/", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Chat with optional context"""
-    context = request.context or []
-    doc_sources = []
-    github_data = None
-    tools_used = []
-    search_service_url = os.getenv("SEARCH_SERVICE_URL", "http://localhost:8004")
+    gathered = await context_service.gather(
+        request.message,
+        context=request.context,
+        search_limit=request.search_limit
+    )
 
-    try:
-        async with httpx.AsyncClient() as client:
-            search_response = await client.get(
-                f"{search_service_url}/api/v1/search",
-                params={"q": request.message, "limit": request.search_limit},
-                timeout=5.0,
-            )
-
-            if search_response.status_code == 200:
-                search_data = search_response.json()
-                results = search_data.get("results", [])
-                # Add retrieved documents to context
-                rag_context = [result["content"] for result in results]
-                context.extend(rag_context)
-                # Prepare doc_sources
-                doc_sources = [
-                    {
-                        "document_id": result["document_id"],
-                        "score": result["score"],
-                        "preview": result["content"][:150] + "..." if len(result["content"]) > 150 else result["content"]
-                    }
-                    for result in results
-                ]
-    except Exception as e:
-        logger.warning("RAG search failed, using general knowledge: {e}")
-    
-    try:
-        # Ask LLM which tools to use
-        tool_prompt = build_tool_selection_prompt(request.message)
-        tool_decision = await chat_service.ollama.generate(chat_service.model, tool_prompt)
-        
-        # Parse LLM's decision
-        json_match = re.search(r'\[.*?\]', tool_decision)
-        if json_match:
-            needed_tools = json.loads(json_match.group())
-            logger.info(f"🤖 LLM selected tools: {needed_tools}")
-        else:
-            needed_tools = []
-        
-        # Call GitHub MCP tools based on LLM's decision
-        
-        if "github_repos" in needed_tools:
-            github_result = await mcp_client.call_github_tool(
-                "search_repos",
-                {"query": "", "limit": 10}
-            )
-            
-            if "result" in github_result and github_result["result"]:
-                repos_text = "Your GitHub repositories:\n"
-                for repo in github_result["result"]:
-                    repos_text += f"- {repo['name']}: {repo.get('description', 'No description')}\n"
-                    repos_text += f"  Language: {repo.get('language')}, Stars: {repo.get('stars', 0)}\n"
-                
-                context.append(repos_text)
-                tools_used.append("github_repos")
-                
-                if github_data is None:
-                    github_data = {}
-                github_data["repos"] = github_result["result"]
-        
-        if "github_code" in needed_tools:
-            github_result = await mcp_client.call_github_tool(
-                "search_code",
-                {"query": request.message, "limit": 5}
-            )
-            
-            if "result" in github_result and github_result["result"]:
-                code_text = "Code from your repositories:\n"
-                for item in github_result["result"]:
-                    code_text += f"- {item['file']} in {item['repository']}\n"
-                
-                context.append(code_text)
-                tools_used.append("github_code")
-                
-                if github_data is None:
-                    github_data = {}
-                github_data["code"] = github_result["result"]
-        
-        if "github_issues" in needed_tools:
-            resources = await mcp_client.list_github_resources()
-            if resources:
-                repo_name = resources[0]["name"]
-                
-                github_result = await mcp_client.call_github_tool(
-                    "get_issues",
-                    {"repo": repo_name, "state": "open", "limit": 10}
-                )
-                
-                if "result" in github_result and github_result["result"]:
-                    issues_text = f"Open issues:\n"
-                    for issue in github_result["result"]:
-                        issues_text += f"- #{issue['number']}: {issue['title']}\n"
-                    
-                    context.append(issues_text)
-                    tools_used.append("github_issues")
-                    
-                    if github_data is None:
-                        github_data = {}
-                    github_data["issues"] = github_result["result"]
-        
-        if "github_commits" in needed_tools:
-            resources = await mcp_client.list_github_resources()
-            if resources:
-                repo_name = resources[0]["name"]
-                
-                github_result = await mcp_client.call_github_tool(
-                    "get_commits",
-                    {"repo": repo_name, "limit": 10}
-                )
-                
-                if "result" in github_result and github_result["result"]:
-                    commits_text = "Recent commits:\n"
-                    for commit in github_result["result"]:
-                        commits_text += f"- {commit['sha']}: {commit['message']}\n"
-                    
-                    context.append(commits_text)
-                    tools_used.append("github_commits")
-                    
-                    if github_data is None:
-                        github_data = {}
-                    github_data["commits"] = github_result["result"]
-    except Exception as e:
-        logger.error(f"Tool selection/execution failed: {e}")
-    
     try:
         response = await chat_service.chat(
             message=request.message, 
-            context= context if context else None
+            context=gathered["context"] if gathered["context"] else None
         )
         return ChatResponse(
             response=response,
             model=chat_service.model,
-            doc_sources=doc_sources,
-            github_data=github_data, 
-            tools_used=tools_used
+            doc_sources=gathered["doc_sources"],
+            github_data=gathered["github_data"], 
+            tools_used=gathered["tools_used"],
+            timings=gathered["timings"]
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """Chat with optional context, streaming tokens as NDJSON events"""
+    # Once streaming starts the status is 200, so reject up front when overloaded
+    try:
+        chat_service.ollama.check_admission("interactive")
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
+
+    gathered = await context_service.gather(
+        request.message,
+        context=request.context,
+        search_limit=request.search_limit
+    )
+
+    async def events():
+        yield json.dumps({
+            "type": "metadata",
+            "model": chat_service.model,
+            "doc_sources": gathered["doc_sources"],
+            "github_data": gathered["github_data"],
+            "tools_used": gathered["tools_used"],
+            "timings": gathered["timings"],
+        }) + "\n"
+        async for token in chat_service.chat_stream(
+            message=request.message,
+            context=gathered["context"] if gathered["context"] else None
+        ):
+            yield json.dumps({"type": "token", "content": token}) + "\n"
+        yield json.dumps({"type": "done"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @router.post("/extract", response_model=ExtractResponse) 
 async def extract_entities(request: ExtractRequest):
     """Extract entities from text"""
@@ -250,22 +226,58 @@ async def extract_entities(request: ExtractRequest):
             entities=entities,
             model=chat_service.model
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/embeddings", response_model=EmbeddingResponse)
 async def create_embeddings(request: EmbeddingRequest):
     try:
-        embeddings = await chat_service.create_embeddings(request.text)
+        embeddings = await chat_service.create_embeddings(
+            request.text,
+            document_id=request.document_id
+        )
 
         return EmbeddingResponse(
             embeddings=embeddings,
             dimensions=len(embeddings),
             model=chat_service.model
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/embeddings/batch", response_model=EmbeddingBatchResponse)
+async def create_embeddings_batch(request: EmbeddingBatchRequest):
+    """Create embeddings for many texts in as few model calls as possible"""
+    if request.document_ids is not None and len(request.document_ids) != len(request.texts):
+        raise HTTPException(status_code=422, detail="document_ids must match texts one to one")
+
+    try:
+        embeddings = await chat_service.create_embeddings_batch(
+            request.texts,
+            batch_size=request.batch_size,
+            document_ids=request.document_ids
+        )
+
+        return EmbeddingBatchResponse(
+            embeddings=embeddings,
+            dimensions=len(embeddings[0]) if embeddings else 0,
+            count=len(embeddings),
+            model=chat_service.model
+        )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/index/{document_id}")
+async def remove_indexed_document(document_id: str):
+    """Remove a document from the local vector index"""
+    return {"document_id": document_id, "deleted": chat_service.remove_document(document_id)}
+
 @router.post("/tasks", response_model=TaskExtractionResponse)
 async def extract_tasks(request: TaskExtractionRequest):
     try: 
@@ -276,6 +288,8 @@ async def extract_tasks(request: TaskExtractionRequest):
             estimated_time=task_data.get("estimated_time"),
             model=chat_service.model
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -295,6 +309,8 @@ async def summarize_text(request: SummarizeRequest):
             compression_ratio=len(summary_data["summary"]) / len(request.text),
             model=chat_service.model
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -316,10 +332,38 @@ async def analyze_document(request: DocAnalysisRequest):
             difficulty_level=analysis["difficulty_level"],
             model=chat_service.model
         )
+    except OllamaOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest):
+    """Move cache namespaces to a new generation, dropping their entries without flushing Redis"""
+    try:
+        return {"invalidated": await chat_service.invalidate_cache(request.operations)}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/health")
 async def health():
     """Health check with Ollama status"""
-    return await chat_service.health_check()
\ No newline at end of file
+    return await chat_service.health_check()
+
+@router.get("/stats")
+async def stats():
+    """Runtime counters for routing and caching"""
+    return {
+        "tool_routing": tool_router.stats(),
+        "singleflight": chat_service.singleflight.stats(),
+        "cache": chat_service.cache.stats(),
+        "embedding_batcher": chat_service.embedding_batcher.stats() if chat_service.embedding_batcher else None,
+        "vector_index": chat_service.vector_index.stats() if chat_service.vector_index else None,
+        "ollama_scheduler": chat_service.scheduler.stats(),
+        "ollama_backends": chat_service.ollama.pool.stats(),
+        "chunk_cache": chat_service.chunk_counters,
+        "cache_namespaces": chat_service.namespaces,
+        "semantic_cache": chat_service.semantic_cache.stats() if chat_service.semantic_cache else None,
+    }
\ No newline at end of file
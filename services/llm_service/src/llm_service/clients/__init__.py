@@ -1 +1,2 @@
-from .ollama_client import OllamaClient
\ No newline at end of file
+from .ollama_client import OllamaClient
+from .ollama_scheduler import OllamaOverloaded, OllamaScheduler
@@ -1,5 +1,5 @@
 import httpx
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +26,30 @@ class MCPClient:
             logger.error(f"GitHub MCP tool call failed: {e}")
             return {"error": str(e)}
     
+    async def call_many(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Call several GitHub MCP tools in one round-trip.
+
+        calls are {"tool": ..., "arguments": ...} dicts. Results come back in
+        the same order, each shaped like call_github_tool's, plus the
+        server-side elapsed_ms; timeout is the server's per-call deadline.
+        """
+        if not calls:
+            return []
+        try:
+            logger.info(f"🔧 Calling GitHub MCP tools: {[call['tool'] for call in calls]}")
+            
+            payload: Dict[str, Any] = {"calls": calls}
+            if timeout is not None:
+                payload["timeout"] = timeout
+            response = await self.client.post(f"{self.github_mcp_url}/tools/batch", json=payload)
+            response.raise_for_status()
+            
+            return response.json()["results"]
+            
+        except Exception as e:
+            logger.error(f"GitHub MCP batch call failed: {e}")
+            return [{"tool": call["tool"], "error": str(e)} for call in calls]
+    
     async def list_github_resources(self) -> List[Dict[str, Any]]:
         """List available GitHub resources"""
         try:
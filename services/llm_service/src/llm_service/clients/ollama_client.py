@@ -1,19 +1,60 @@
 import httpx
 import json
-from typing import List, Dict, Optional, Type
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional, Type
 from pydantic import BaseModel
 import logging
 
+from .ollama_pool import OllamaBackendPool
+from .ollama_scheduler import OllamaOverloaded, OllamaScheduler
+
 logger = logging.getLogger(__name__)
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434"):
-        self.base_url = base_url
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        scheduler: Optional[OllamaScheduler] = None,
+        base_urls: Optional[List[str]] = None,
+        health_check_interval: float = 15.0,
+    ):
+        urls = base_urls or [base_url]
+        self.base_url = urls[0]
         self.client = httpx.AsyncClient()
+        self.pool = OllamaBackendPool(urls, self.client, health_check_interval=health_check_interval)
+        self.scheduler = scheduler
+        if scheduler is not None:
+            # Scheduler limits are per backend, so capacity grows with the pool
+            scheduler.backend_count = len(self.pool)
+
+    @asynccontextmanager
+    async def _call(self, model: str, priority: str) -> AsyncIterator[str]:
+        """Wait for a scheduler slot, then yield the base URL of the backend to call"""
+        async with self._slot(model, priority):
+            backend = self.pool.acquire(model)
+            try:
+                yield backend.url
+            except BaseException as e:
+                self.pool.release(backend, model, e)
+                raise
+            self.pool.release(backend, model)
+
+    @asynccontextmanager
+    async def _slot(self, model: str, priority: str):
+        if self.scheduler is None:
+            yield
+            return
+        async with self.scheduler.slot(model, priority):
+            yield
+
+    def check_admission(self, priority: str):
+        """Raise OllamaOverloaded now rather than after a response has started streaming"""
+        if self.scheduler is not None:
+            self.scheduler.check_admission(priority)
 
-    async def chat(self, model: str, messages: List[dict]) -> str:
+    async def chat(self, model: str, messages: List[dict], priority: str = "interactive") -> str:
         """Chat with the ollama model"""
-        url = f"{self.base_url}/api/chat"
+        path = "/api/chat"
 
         payload = {
             "model": model,
@@ -23,18 +64,37 @@ class OllamaClient:
 
         try:
             logger.info(f"Calling Ollama chat using {model}")
-            response = await self.client.post(url, json=payload)
-            response.raise_for_status()
+            async with self._call(payload["model"], priority) as base_url:
+                response = await self.client.post(base_url + path, json=payload)
+                response.raise_for_status()
 
             result = response.json()
             return result["message"]["content"]
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ollama chat error: {e}")
             raise Exception(f"Ollama chat failed: {e}")
 
-    async def generate(self, model: str, prompt: str) -> str:
+    async def chat_stream(self, model: str, messages: List[dict], priority: str = "interactive") -> AsyncIterator[str]:
+        """Stream chat tokens from the ollama model as they are generated"""
+        path = "/api/chat"
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+        }
+
+        logger.info(f"Streaming Ollama chat using {model}")
+        async for chunk in self._stream(path, payload, priority):
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                yield content
+
+    async def generate(self, model: str, prompt: str, priority: str = "interactive") -> str:
         """Generate text using the ollama model"""
-        url = f"{self.base_url}/api/generate"
+        path = "/api/generate"
 
         payload = {
             "model": model,
@@ -44,18 +104,65 @@ class OllamaClient:
 
         try:
             logger.info(f"Calling Ollama generate using {model}")
-            response = await self.client.post(url, json=payload)
-            response.raise_for_status()
+            async with self._call(payload["model"], priority) as base_url:
+                response = await self.client.post(base_url + path, json=payload)
+                response.raise_for_status()
 
             result = response.json()
             return result["response"]
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ollama generate error: {e}")
             raise Exception(f"Ollama generate failed: {e}")
         
-    async def generate_structured(self, model: str, prompt: str, response_format: Type[BaseModel]) -> dict:
+    async def generate_stream(self, model: str, prompt: str, priority: str = "interactive") -> AsyncIterator[str]:
+        """Stream generated text from the ollama model as it is produced"""
+        path = "/api/generate"
+
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True
+        }
+
+        logger.info(f"Streaming Ollama generate using {model}")
+        async for chunk in self._stream(path, payload, priority):
+            content = chunk.get("response", "")
+            if content:
+                yield content
+
+    async def _stream(self, path: str, payload: dict, priority: str) -> AsyncIterator[dict]:
+        """Yield decoded NDJSON chunks from a streaming Ollama endpoint"""
+        try:
+            # The slot is held until the stream finishes, since the model is busy until then
+            async with self._call(payload["model"], priority) as base_url:
+                async with self.client.stream("POST", base_url + path, json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise Exception(chunk["error"])
+                        yield chunk
+                        if chunk.get("done"):
+                            break
+        except OllamaOverloaded:
+            raise
+        except Exception as e:
+            logger.error(f"Ollama stream error: {e}")
+            raise Exception(f"Ollama stream failed: {e}")
+
+    async def generate_structured(
+        self,
+        model: str,
+        prompt: str,
+        response_format: Type[BaseModel],
+        priority: str = "batch",
+    ) -> dict:
         """Generate structured output using Pydantic schema"""
-        url = f"{self.base_url}/api/generate"
+        path = "/api/generate"
 
         payload = {
             "model": model,
@@ -66,20 +173,23 @@ class OllamaClient:
 
         try:
             logger.info(f"Calling Ollama structured generation with {model}")
-            response = await self.client.post(url, json=payload)
-            response.raise_for_status()
+            async with self._call(payload["model"], priority) as base_url:
+                response = await self.client.post(base_url + path, json=payload)
+                response.raise_for_status()
             
             result = response.json()
             # parse response with Pydantic model
             return response_format.model_validate_json(result["response"])
             
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ollama structured generation error: {e}")
             raise Exception(f"Structured generation failed: {e}")
 
-    async def generate_embeddings(self, embedding_model: str, input: str) -> List[float]:
+    async def generate_embeddings(self, embedding_model: str, input: str, priority: str = "embedding") -> List[float]:
         """Generate embeddings using the ollama model"""
-        url = f"{self.base_url}/api/embed"
+        path = "/api/embed"
         
         payload = {
             "model": embedding_model,
@@ -89,21 +199,52 @@ class OllamaClient:
 
         try:
             logger.info(f"Calling Ollama embed endpoint using {embedding_model}")
-            response = await self.client.post(url, json=payload)
-            response.raise_for_status()
+            async with self._call(payload["model"], priority) as base_url:
+                response = await self.client.post(base_url + path, json=payload)
+                response.raise_for_status()
 
             result = response.json()
             return result["embeddings"][0]
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             raise Exception(f"Ollama embeddings failed: {e}")
         
+    async def generate_embeddings_batch(
+        self,
+        embedding_model: str,
+        inputs: List[str],
+        priority: str = "embedding",
+    ) -> List[List[float]]:
+        """Generate embeddings for many inputs in one Ollama call"""
+        path = "/api/embed"
+        
+        payload = {
+            "model": embedding_model,
+            "input": inputs,
+            "stream": False
+        }
+
+        try:
+            logger.info(f"Calling Ollama embed endpoint using {embedding_model} for {len(inputs)} inputs")
+            async with self._call(payload["model"], priority) as base_url:
+                response = await self.client.post(base_url + path, json=payload)
+                response.raise_for_status()
+
+            result = response.json()
+            return result["embeddings"]
+        except OllamaOverloaded:
+            raise
+        except Exception as e:
+            raise Exception(f"Ollama batch embeddings failed: {e}")
+        
     async def is_available(self) -> bool:
-        """Check if Ollama is running"""
+        """Check if at least one Ollama backend is running"""
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
-            return response.status_code == 200
+            return any(await self.pool.check_all())
         except Exception as e:
             return False
         
     async def close(self):
+       await self.pool.close()
        await self.client.aclose()
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+def _model_name(model: str) -> str:
+    # /api/ps reports fully tagged names
+    return model if ":" in model else f"{model}:latest"
+
+class OllamaBackend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding: Dict[str, int] = {}
+        self.loaded_models: Set[str] = set()
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.counters = {"requests": 0, "errors": 0, "ejections": 0}
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    def load(self) -> int:
+        return sum(self.outstanding.values())
+
+class OllamaBackendPool:
+    """Routes Ollama calls across several hosts.
+
+    Each call goes to the backend with the fewest outstanding requests for
+    the model, where a backend that does not have the model loaded (per
+    /api/ps) is charged load_penalty extra requests for the cold load.
+    Backends are ejected for eject_seconds after max_failures consecutive
+    failures, and a background health check refreshes reachability and
+    loaded models every health_check_interval seconds.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        client: httpx.AsyncClient,
+        load_penalty: int = 4,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        health_check_interval: float = 15.0,
+    ):
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.client = client
+        self.load_penalty = load_penalty
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_check_interval = health_check_interval
+        self._health_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def acquire(self, model: str) -> OllamaBackend:
+        """Pick a backend for model and count the call as outstanding on it"""
+        self._ensure_health_checks()
+        if len(self.backends) == 1:
+            backend = self.backends[0]
+        else:
+            # With every backend ejected, still try rather than fail outright
+            candidates = [b for b in self.backends if not b.ejected] or self.backends
+            name = _model_name(model)
+            backend = min(
+                candidates,
+                key=lambda b: (
+                    b.outstanding.get(model, 0) + (0 if name in b.loaded_models else self.load_penalty),
+                    b.load(),
+                ),
+            )
+        backend.outstanding[model] = backend.outstanding.get(model, 0) + 1
+        backend.counters["requests"] += 1
+        return backend
+
+    def release(self, backend: OllamaBackend, model: str, error: Optional[BaseException] = None):
+        """Finish a call, ejecting the backend after too many consecutive failures"""
+        backend.outstanding[model] -= 1
+        if error is None:
+            backend.failures = 0
+            # Ollama keeps the model loaded after serving it
+            backend.loaded_models.add(_model_name(model))
+            return
+        if not self._is_backend_failure(error):
+            return
+        backend.counters["errors"] += 1
+        backend.failures += 1
+        if backend.failures >= self.max_failures and not backend.ejected:
+            self._eject(backend, f"{backend.failures} consecutive failures")
+
+    @staticmethod
+    def _is_backend_failure(error: BaseException) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    def _eject(self, backend: OllamaBackend, reason: str):
+        backend.ejected_until = time.monotonic() + self.eject_seconds
+        backend.counters["ejections"] += 1
+        logger.warning(f"Ejecting Ollama backend {backend.url} for {self.eject_seconds}s: {reason}")
+
+    async def check(self, backend: OllamaBackend) -> bool:
+        """Probe one backend and refresh the models it has loaded"""
+        try:
+            response = await self.client.get(f"{backend.url}/api/ps", timeout=5.0)
+            response.raise_for_status()
+            # A 200 with a body that is not /api/ps JSON (a proxy error page) is a failure too
+            loaded_models = {
+                entry.get("model") or entry.get("name") for entry in response.json().get("models", [])
+            }
+        except Exception as e:
+            if not backend.ejected:
+                self._eject(backend, f"health check failed: {e}")
+            return False
+
+        backend.loaded_models = loaded_models
+        if backend.ejected:
+            logger.info(f"Ollama backend {backend.url} is healthy again")
+        backend.failures = 0
+        backend.ejected_until = 0.0
+        return True
+
+    async def check_all(self) -> List[bool]:
+        return await asyncio.gather(*(self.check(backend) for backend in self.backends))
+
+    def _ensure_health_checks(self):
+        if len(self.backends) == 1 or self.health_check_interval <= 0:
+            return
+        if self._health_task is not None and not self._health_task.done():
+            return
+        self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                # One bad probe must not end health checking for good
+                logger.error(f"Ollama health check round failed: {e}")
+            await asyncio.sleep(self.health_check_interval)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "url": backend.url,
+                **backend.counters,
+                "outstanding": backend.load(),
+                "ejected": backend.ejected,
+                "loaded_models": sorted(backend.loaded_models),
+            }
+            for backend in self.backends
+        ]
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request classes, served in ascending order
+PRIORITIES = {"interactive": 0, "embedding": 1, "batch": 2}
+
+class OllamaOverloaded(Exception):
+    """Raised when the queue for a request class is full"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Ollama is overloaded with {priority} requests, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+class OllamaScheduler:
+    """Admission control and priority queueing for Ollama calls.
+
+    At most max_in_flight calls per backend run for each model (overridable
+    per model). Calls beyond that wait in a per-model priority queue and are
+    started interactive first, then embedding, then batch. Once a class has
+    max_queue_depth[class] calls waiting, new ones are rejected with
+    OllamaOverloaded instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        model_max_in_flight: Optional[Dict[str, int]] = None,
+        max_queue_depth: Optional[Dict[str, int]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        # Limits apply per Ollama backend; OllamaClient sets this to its pool size
+        self.backend_count = 1
+        self.model_max_in_flight = model_max_in_flight or {}
+        self.max_queue_depth = {"interactive": 64, "embedding": 256, "batch": 32, **(max_queue_depth or {})}
+        self._in_flight: Dict[str, int] = {}
+        # model -> heap of (rank, seq, priority, waiter)
+        self._queues: Dict[str, List[Tuple[int, int, str, asyncio.Future]]] = {}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._seq = itertools.count()
+        # Moving average of call duration, used to estimate Retry-After
+        self._service_time = 1.0
+        self.counters = {
+            priority: {"admitted": 0, "rejected": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for priority in PRIORITIES
+        }
+
+    def limit_for(self, model: str) -> int:
+        return self.model_max_in_flight.get(model, self.max_in_flight) * self.backend_count
+
+    def check_admission(self, priority: str):
+        """Raise OllamaOverloaded if a new call of this class would be turned away"""
+        if self._queued[priority] >= self.max_queue_depth[priority]:
+            self.counters[priority]["rejected"] += 1
+            raise OllamaOverloaded(priority, self.retry_after(priority))
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds until the work queued at or above this priority should have drained"""
+        ahead = sum(
+            count for name, count in self._queued.items()
+            if PRIORITIES[name] <= PRIORITIES[priority]
+        )
+        return max(1, math.ceil(self._service_time * ahead / max(1, self.max_in_flight * self.backend_count)))
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: str = "interactive") -> AsyncIterator[None]:
+        """Hold one of the model's in-flight slots for the duration of a call"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown Ollama priority: {priority}")
+
+        queued_at = time.perf_counter()
+        await self._acquire(model, priority)
+        started = time.perf_counter()
+        waited_ms = (started - queued_at) * 1000
+        counters = self.counters[priority]
+        counters["admitted"] += 1
+        counters["wait_ms_total"] += waited_ms
+        counters["wait_ms_max"] = max(counters["wait_ms_max"], waited_ms)
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.perf_counter() - started)
+            self._release(model)
+
+    async def _acquire(self, model: str, priority: str):
+        queue = self._queues.setdefault(model, [])
+        if self._in_flight.get(model, 0) < self.limit_for(model) and not queue:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            return
+
+        self.check_admission(priority)
+        # A plain future per waiter keeps the scheduler usable from any event loop
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (PRIORITIES[priority], next(self._seq), priority, waiter)
+        heapq.heappush(queue, entry)
+        self._queued[priority] += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller went away; hand the slot on
+                self._release(model)
+            elif entry in queue:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._queued[priority] -= 1
+            raise
+
+    def _release(self, model: str):
+        self._in_flight[model] -= 1
+        queue = self._queues.get(model)
+        while queue and self._in_flight[model] < self.limit_for(model):
+            _, _, priority, waiter = heapq.heappop(queue)
+            self._queued[priority] -= 1
+            if waiter.done():
+                continue
+            self._in_flight[model] += 1
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "classes": {
+                priority: {
+                    "queued": self._queued[priority],
+                    "max_queue_depth": self.max_queue_depth[priority],
+                    "admitted": counters["admitted"],
+                    "rejected": counters["rejected"],
+                    "avg_wait_ms": round(counters["wait_ms_total"] / counters["admitted"], 2) if counters["admitted"] else 0.0,
+                    "max_wait_ms": round(counters["wait_ms_max"], 2),
+                }
+                for priority, counters in self.counters.items()
+            },
+            "in_flight": dict(self._in_flight),
+            "max_in_flight": {model: self.limit_for(model) for model in self._in_flight},
+        }
@@ -3,6 +3,9 @@ from .prompts import (
     build_extraction_prompt, 
     build_task_extraction_prompt, 
     build_summarization_prompt, 
+    build_combine_summaries_prompt,
     build_analysis_prompt
 )
-from .services.chat_service import ChatService
\ No newline at end of file
+from .services.chat_service import ChatService
+from .services.context_service import ContextService
+from .tool_router import ToolRouter
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""Token-aware splitting of long documents for map-reduce prompts"""
+import math
+import re
+import zlib
+from typing import List
+
+PARAGRAPH_PATTERN = re.compile(r".+?(?:\n\s*\n|$)", re.S)
+SENTENCE_PATTERN = re.compile(r".+?(?:[.!?](?=\s)\s*|$)", re.S)
+WORD_PATTERN = re.compile(r"\S+\s*")
+# Candidate cut points for content-defined chunking: just after a sentence end or line break
+BOUNDARY_PATTERN = re.compile(r"(?:[.!?]\s+|\n\s*)")
+# Characters before a candidate that decide whether it becomes a boundary
+BOUNDARY_WINDOW = 48
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: ~4 characters or ~0.75 words per token"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+def split_into_chunks(text: str, max_tokens: int = 1500, overlap_tokens: int = 100) -> List[str]:
+    """Split text into chunks of at most max_tokens, breaking at paragraphs, then sentences, then words.
+
+    Consecutive chunks share up to overlap_tokens of trailing text so facts
+    spanning a boundary are seen whole by at least one chunk.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in _units(text, max_tokens):
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current).strip())
+            current, current_tokens = _overlap(current, overlap_tokens)
+            if current_tokens + tokens > max_tokens:
+                current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+def _units(text: str, max_tokens: int) -> List[str]:
+    """Smallest natural pieces of text that each fit in a chunk"""
+    units = []
+    for paragraph in PARAGRAPH_PATTERN.findall(text):
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in SENTENCE_PATTERN.findall(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                units.append(sentence)
+                continue
+            # A single oversized sentence is cut into word windows
+            window: List[str] = []
+            for word in WORD_PATTERN.findall(sentence):
+                if estimate_tokens(word) > max_tokens:
+                    # Unbroken runs (base64, minified code) are sliced by characters
+                    if window:
+                        units.append("".join(window))
+                        window = []
+                    width = max_tokens * 4
+                    units.extend(word[i:i + width] for i in range(0, len(word), width))
+                    continue
+                if window and estimate_tokens("".join(window) + word) > max_tokens:
+                    units.append("".join(window))
+                    window = []
+                window.append(word)
+            if window:
+                units.append("".join(window))
+    return units
+
+def _overlap(units: List[str], overlap_tokens: int):
+    """Trailing units of the previous chunk to repeat at the start of the next"""
+    carried: List[str] = []
+    tokens = 0
+    for unit in reversed(units):
+        unit_tokens = estimate_tokens(unit)
+        if tokens + unit_tokens > overlap_tokens:
+            break
+        carried.insert(0, unit)
+        tokens += unit_tokens
+    return carried, tokens
+
+def content_defined_chunks(
+    text: str,
+    target_tokens: int = 1000,
+    min_tokens: int = 250,
+    max_tokens: int = 1500,
+) -> List[str]:
+    """Split text at boundaries chosen by the content around them, not by offsets.
+
+    A sentence end or line break becomes a boundary when the hash of the
+    BOUNDARY_WINDOW characters before it hits a target_tokens-dependent
+    modulus. Each decision only depends on nearby text, so editing one
+    paragraph changes the chunk(s) around the edit and leaves every other
+    chunk, and its cache key, the same. Text that fits in max_tokens is
+    returned whole: one prompt with the full context beats several partial
+    ones plus a reduce for anything short enough.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    # Assume ~100 characters per sentence to hit the target size on average
+    modulus = max(1, target_tokens * 4 // 100)
+    min_chars = min_tokens * 4
+    chunks = []
+    start = 0
+    for match in BOUNDARY_PATTERN.finditer(text):
+        end = match.end()
+        if end - start < min_chars:
+            continue
+        window = text[max(0, match.start() - BOUNDARY_WINDOW):match.start()]
+        if zlib.crc32(window.encode()) % modulus == 0:
+            chunks.append(text[start:end])
+            start = end
+    if start < len(text):
+        chunks.append(text[start:])
+
+    # Content without boundaries for too long is cut by the token-aware splitter
+    bounded = []
+    for chunk in chunks:
+        bounded.extend(split_into_chunks(chunk, max_tokens, overlap_tokens=0))
+    return bounded
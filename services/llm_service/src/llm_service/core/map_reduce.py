@@ -0,0 +1,89 @@
+"""Merging of per-chunk results from map-reduce document processing"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+DIFFICULTY_ORDER = ["beginner", "intermediate", "advanced"]
+PRIORITY_ORDER = ["low", "medium", "high"]
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+def dedupe(values: Iterable[str]) -> List[str]:
+    """Drop case- and whitespace-insensitive duplicates, keeping first-seen order"""
+    seen = set()
+    result = []
+    for value in values:
+        key = _normalize(value)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
+
+def merge_tasks(task_lists: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Combine task lists, keeping one entry per task text with the highest priority seen"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for tasks in task_lists:
+        for task in tasks:
+            key = _normalize(task.get("task", ""))
+            if not key:
+                continue
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(task)
+            elif _rank(task.get("priority"), PRIORITY_ORDER) > _rank(existing.get("priority"), PRIORITY_ORDER):
+                existing["priority"] = task["priority"]
+    return list(merged.values())
+
+def merge_entities(partials: List[Dict[str, Any]], summary: str) -> Dict[str, Any]:
+    """Merge per-chunk EntityExtractionModel dicts with the given combined summary"""
+    return {
+        "people": dedupe(e for p in partials for e in p.get("people", [])),
+        "organizations": dedupe(e for p in partials for e in p.get("organizations", [])),
+        "concepts": dedupe(c for p in partials for c in p.get("concepts", [])),
+        "summary": summary,
+    }
+
+def merge_task_extractions(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk TaskExtractionModel dicts, re-totalling the estimate from the merged tasks"""
+    tasks = merge_tasks(p.get("tasks", []) for p in partials)
+    hours = sum(task.get("estimated_hours") or 0 for task in tasks)
+    return {
+        "tasks": tasks,
+        "estimated_time": f"{hours} hours",
+    }
+
+def merge_analyses(partials: List[Dict[str, Any]], summary: str) -> Dict[str, Any]:
+    """Merge per-chunk DocumentAnalysisModel dicts into one analysis with the given combined summary"""
+    entity_keys = ["people", "organizations", "technologies", "locations"]
+    difficulties = Counter(p.get("difficulty_level") for p in partials if p.get("difficulty_level"))
+    return {
+        "summary": summary,
+        "key_concepts": dedupe(c for p in partials for c in p.get("key_concepts", [])),
+        "entities": {
+            key: dedupe(e for p in partials for e in p.get("entities", {}).get(key, []))
+            for key in entity_keys
+        },
+        "tasks": merge_tasks(p.get("tasks", []) for p in partials),
+        "themes": dedupe(t for p in partials for t in p.get("themes", [])),
+        # Most common level across chunks; ties go to the harder one
+        "difficulty_level": max(
+            difficulties, key=lambda level: (difficulties[level], _rank(level, DIFFICULTY_ORDER))
+        ) if difficulties else "intermediate",
+    }
+
+def _rank(value: Any, order: List[str]) -> int:
+    return order.index(value) if value in order else -1
+
+def entities_from_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer an entity extraction from a full document analysis of the same text"""
+    entities = analysis.get("entities", {})
+    return {
+        "people": entities.get("people", []),
+        "organizations": entities.get("organizations", []),
+        "concepts": analysis.get("key_concepts", []),
+        "summary": analysis.get("summary", ""),
+    }
+
+def tasks_from_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer a task extraction from a full document analysis of the same text"""
+    return merge_task_extractions([analysis])
@@ -1,4 +1,5 @@
 """Prompt templates for LLM operations"""
+import hashlib
 
 SYSTEM_PROMPT = """You are a helpful assistant for a personal knowledge management system. Be concise and helpful."""
 
@@ -47,6 +48,14 @@ Text: {text}
 
 Summary:"""
 
+# Reduce step for long documents: merge partial summaries of consecutive sections
+COMBINE_SUMMARIES_PROMPT = """These are summaries of consecutive sections of one document.
+Combine them into a single summary of about {max_length} characters. Keep the main points and drop repetition:
+
+{summaries}
+
+Summary:"""
+
 # Document analysis prompt
 DOCUMENT_ANALYSIS_PROMPT = """Analyze this {analysis_type} text and extract key information.
 Return ONLY a JSON object with this exact structure:
@@ -72,6 +81,16 @@ Text: {text}
 JSON:"""
 
 
+def template_version(*templates: str) -> str:
+    """Short hash of prompt templates, so cached results are not reused after a prompt changes"""
+    return hashlib.sha256("\n".join(templates).encode()).hexdigest()[:12]
+
+CHAT_TEMPLATE_VERSION = template_version(SYSTEM_PROMPT, CONTEXT_PROMPT_TEMPLATE)
+EXTRACTION_TEMPLATE_VERSION = template_version(ENTITY_EXTRACTION_PROMPT, COMBINE_SUMMARIES_PROMPT)
+TASK_TEMPLATE_VERSION = template_version(TASK_EXTRACTION_PROMPT)
+SUMMARY_TEMPLATE_VERSION = template_version(SUMMARIZATION_PROMPT, COMBINE_SUMMARIES_PROMPT)
+ANALYSIS_TEMPLATE_VERSION = template_version(DOCUMENT_ANALYSIS_PROMPT, COMBINE_SUMMARIES_PROMPT)
+
 def build_chat_messages(message: str, context: list = None) -> list:
     """Build messages array for chat completion"""
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -98,6 +117,11 @@ def build_summarization_prompt(text: str, max_length: int) -> str:
     """Build prompt for summarization"""
     return SUMMARIZATION_PROMPT.format(text=text, max_length=max_length)
 
+def build_combine_summaries_prompt(summaries: list, max_length: int) -> str:
+    """Build prompt for merging section summaries"""
+    numbered = "\n\n".join(f"Section {i}: {summary}" for i, summary in enumerate(summaries, 1))
+    return COMBINE_SUMMARIES_PROMPT.format(summaries=numbered, max_length=max_length)
+
 def build_analysis_prompt(text: str, analysis_type: str) -> str:
     """Build prompt for document analysis"""
     return DOCUMENT_ANALYSIS_PROMPT.format(text=text, analysis_type=analysis_type)
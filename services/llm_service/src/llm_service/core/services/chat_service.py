@@ -1,69 +1,267 @@
-from llm_service.clients import OllamaClient
+from llm_service.clients import OllamaClient, OllamaOverloaded, OllamaScheduler
 from llm_service.core import (
     build_chat_messages, 
     build_extraction_prompt, 
     build_task_extraction_prompt,
     build_summarization_prompt,
+    build_combine_summaries_prompt,
     build_analysis_prompt,
 )
+from llm_service.core.chunking import content_defined_chunks, split_into_chunks
+from llm_service.core.map_reduce import (
+    entities_from_analysis,
+    merge_analyses,
+    merge_entities,
+    merge_task_extractions,
+    tasks_from_analysis,
+)
+from llm_service.core.prompts import (
+    ANALYSIS_TEMPLATE_VERSION,
+    CHAT_TEMPLATE_VERSION,
+    EXTRACTION_TEMPLATE_VERSION,
+    SUMMARY_TEMPLATE_VERSION,
+    TASK_TEMPLATE_VERSION,
+)
 from infrastructure.redis_cache import RedisCache
-from typing import List, Optional, Dict, Any
+from infrastructure.semantic_cache import SemanticCache
+from infrastructure.singleflight import SingleFlight
+from infrastructure.vector_index import VectorIndex
+from llm_service.core.services.embedding_batcher import EmbeddingBatcher
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Dict, Any
+import asyncio
+import hashlib
 import logging
 import json
 from llm_service.core.models import EntityExtractionModel, TaskExtractionModel, DocumentAnalysisModel
 
 logger = logging.getLogger(__name__)
 
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _normalize_question(message: str) -> str:
+    return " ".join(message.lower().split()).rstrip("?!. ")
+
+def _schema(model) -> str:
+    return json.dumps(model.model_json_schema(), sort_keys=True)
+
 class ChatService:
-    def __init__(self, ollama_url: str = "http://localhost:11434", model: str = "phi3:mini", embedding_model: str = "mxbai-embed-large"):
-        self.ollama = OllamaClient(ollama_url)
+    def __init__(
+        self,
+        ollama_url: str = "http://localhost:11434",
+        model: str = "phi3:mini",
+        embedding_model: str = "mxbai-embed-large",
+        distributed_singleflight: bool = False,
+        cache_l1_max_bytes: int = 0,
+        embedding_batch_size: int = 32,
+        embedding_max_wait_ms: float = 5.0,
+        embedding_queue_size: int = 1024,
+        embedding_cache_dtype: str = "float32",
+        vector_index_enabled: bool = True,
+        vector_index_path: Optional[str] = None,
+        vector_index_mode: str = "exact",
+        vector_index_save_every: int = 256,
+        vector_index_save_interval: float = 60.0,
+        ollama_max_in_flight: int = 4,
+        ollama_model_max_in_flight: Optional[Dict[str, int]] = None,
+        ollama_queue_depths: Optional[Dict[str, int]] = None,
+        ollama_urls: Optional[List[str]] = None,
+        chunk_max_tokens: int = 1500,
+        chunk_overlap_tokens: int = 100,
+        map_concurrency: int = 4,
+        reduce_fan_in: int = 8,
+        cdc_target_tokens: int = 1000,
+        cdc_min_tokens: int = 250,
+        summary_cache_ttl: int = 86400,
+        analysis_cache_ttl: int = 86400,
+        semantic_cache_enabled: bool = False,
+        semantic_cache_threshold: float = 0.92,
+        semantic_cache_max_entries: int = 1024,
+    ):
+        # Interactive chat is served ahead of embeddings and batch extraction
+        self.scheduler = OllamaScheduler(
+            max_in_flight=ollama_max_in_flight,
+            model_max_in_flight=ollama_model_max_in_flight,
+            max_queue_depth=ollama_queue_depths,
+        )
+        # Several Ollama hosts can share the load; ollama_url is used when none are given
+        self.ollama = OllamaClient(ollama_url, scheduler=self.scheduler, base_urls=ollama_urls)
         self.model = model
         self.embedding_model = embedding_model
-        self.cache = RedisCache()
+        self.embedding_batch_size = embedding_batch_size
+        # Long documents are split and map-reduced instead of sent as one prompt
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.map_concurrency = map_concurrency
+        self.reduce_fan_in = reduce_fan_in
+        # Content-defined chunking for analysis and extraction, so an edit only re-runs the chunks it touches
+        self.cdc_target_tokens = cdc_target_tokens
+        self.cdc_min_tokens = cdc_min_tokens
+        self.chunk_counters = {"reused": 0, "computed": 0}
+        self.summary_cache_ttl = summary_cache_ttl
+        self.analysis_cache_ttl = analysis_cache_ttl
+        self.cache = RedisCache(local_max_bytes=cache_l1_max_bytes, vector_dtype=embedding_cache_dtype)
+        self.singleflight = SingleFlight(self.cache, distributed=distributed_singleflight)
+        # Switching models or editing a prompt or schema moves to a fresh namespace, so stale
+        # answers are never served and entries that are still valid stay warm across deploys
+        self.namespaces = {
+            "chat": self.cache.namespace("chat", model, CHAT_TEMPLATE_VERSION),
+            "extract": self.cache.namespace(
+                "extract", model, EXTRACTION_TEMPLATE_VERSION, _schema(EntityExtractionModel)
+            ),
+            "tasks": self.cache.namespace("tasks", model, TASK_TEMPLATE_VERSION, _schema(TaskExtractionModel)),
+            "summary": self.cache.namespace("summary", model, SUMMARY_TEMPLATE_VERSION),
+            "analysis": self.cache.namespace(
+                "analysis", model, ANALYSIS_TEMPLATE_VERSION, _schema(DocumentAnalysisModel)
+            ),
+            "embeddings": self.cache.namespace("embeddings", embedding_model),
+        }
+        self._purges = set()
+        # Answers paraphrased repeats of recent questions by embedding similarity
+        self.semantic_cache = None
+        if semantic_cache_enabled:
+            self.semantic_cache = SemanticCache(
+                max_entries=semantic_cache_max_entries, threshold=semantic_cache_threshold, ttl=3600
+            )
+        # Micro-batches concurrent single-text embedding requests; 0ms disables it
+        self.embedding_batcher = None
+        if embedding_max_wait_ms > 0:
+            self.embedding_batcher = EmbeddingBatcher(
+                lambda texts: self.ollama.generate_embeddings_batch(self.embedding_model, texts),
+                max_batch_size=embedding_batch_size,
+                max_wait_ms=embedding_max_wait_ms,
+                max_queue_size=embedding_queue_size,
+            )
+        # In-process vector index for RAG; needs the optional numpy dependency
+        self.vector_index = None
+        if vector_index_enabled:
+            try:
+                self.vector_index = VectorIndex(
+                    path=vector_index_path,
+                    mode=vector_index_mode,
+                    save_every=vector_index_save_every,
+                    save_interval=vector_index_save_interval,
+                )
+            except RuntimeError as e:
+                logger.warning(f"Local vector index disabled: {e}")
 
     async def initialize(self):
         """Initialize cache connection"""
         await self.cache.connect()
+
+    async def _compute_once(
+        self,
+        cache_key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: int,
+        vector: bool = False,
+    ) -> Any:
+        """Run compute() once for all concurrent callers of cache_key and cache the result"""
+        store = self.cache.set_vector if vector else self.cache.set
+        lookup = self.cache.get_vector if vector else self.cache.get
+
+        async def run():
+            result = await compute()
+            await store(cache_key, result, expire=expire)
+            return result
+
+        return await self.singleflight.do(cache_key, run, lookup=lookup)
         
     async def chat(self, message: str, context: List[str] = None) -> str:
         """Chat with optional context"""
         # Create cache key
-        cache_key = self.cache.make_key("chat", message, str(context or []))
+        cache_key = await self._key("chat", message, str(context or []))
         
         # Check cache
         cached = await self.cache.get(cache_key)
         if cached:
             return cached
         
-        try:
+        # Namespaced, so a model/prompt change or invalidation also retires semantic matches
+        fingerprint = await self._key("chat", str(context or []))
+        question_vector = await self._question_vector(message)
+        if question_vector is not None:
+            answer = self.semantic_cache.lookup(fingerprint, question_vector)
+            if answer is not None:
+                return answer
+        
+        async def generate():
             messages = build_chat_messages(message, context)
             response = await self.ollama.chat(self.model, messages)
-            result = response.strip()
-            await self.cache.set(cache_key, result, expire=3600)
-            return result
+            answer = response.strip()
+            if question_vector is not None:
+                self.semantic_cache.add(fingerprint, question_vector, answer)
+            return answer
+
+        try:
+            return await self._compute_once(cache_key, generate, expire=3600)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Chat error: {e}")
             return f"I'm having trouble processing that request. Error: {str(e)}"
+
+    async def _question_vector(self, message: str) -> Optional[List[float]]:
+        """Embedding of the normalized question for the semantic cache, if it is enabled"""
+        if self.semantic_cache is None:
+            return None
+        try:
+            return await self.create_embeddings(_normalize_question(message))
+        except OllamaOverloaded:
+            # Skip the semantic tier rather than fail the chat request
+            return None
+
+    async def chat_stream(self, message: str, context: List[str] = None) -> AsyncIterator[str]:
+        """Stream a chat answer token by token, sharing the cache with chat()"""
+        cache_key = await self._key("chat", message, str(context or []))
+
+        # A cached answer is replayed as a single chunk
+        cached = await self.cache.get(cache_key)
+        if cached:
+            yield cached
+            return
+
+        parts = []
+        try:
+            messages = build_chat_messages(message, context)
+            async for token in self.ollama.chat_stream(self.model, messages):
+                parts.append(token)
+                yield token
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            yield f"I'm having trouble processing that request. Error: {str(e)}"
+            return
+
+        # Only completed streams are cached so a repeat request replays instantly
+        result = "".join(parts).strip()
+        if result:
+            await self.cache.set(cache_key, result, expire=3600)
     
     async def extract_entities(self, text: str) -> dict:
         """Extract entities from text"""
-        cache_key = self.cache.make_key("extract", text)
+        cache_key = await self._key("extract", text)
         
         cached = await self.cache.get(cache_key)
         if cached:
             return cached
         
+        analysis = await self._cached_analysis(text)
+        if analysis:
+            return entities_from_analysis(analysis)
+        
+        async def generate():
+            chunks = self._content_chunks(text)
+            if len(chunks) == 1:
+                # Cached under the document key only; a chunk entry would duplicate it
+                return await self._generate_entities(text)
+            partials = await self._map(chunks, self._extract_entities_chunk)
+            summary = await self._reduce_summaries([partial["summary"] for partial in partials], 200)
+            return merge_entities(partials, summary)
+
         try:
-            prompt = build_extraction_prompt(text)
-            response = await self.ollama.generate_structured(
-                model=self.model,
-                prompt=prompt,
-                response_format=EntityExtractionModel
-            )
-            # convert pydantic model to dict
-            result_dict = response.model_dump()
-            await self.cache.set(cache_key, result_dict, expire=3600)
-            return result_dict
+            return await self._compute_once(cache_key, generate, expire=3600)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Entity extraction error: {e}")
             return {
@@ -73,43 +271,114 @@ class ChatService:
                 "summary": f"Error: {str(e)}"
             }
         
-    async def create_embeddings(self, text: str) -> List[float]:
-        """Generates embeddings for vector search"""
+    async def create_embeddings(self, text: str, document_id: Optional[str] = None) -> List[float]:
+        """Generates embeddings for vector search, indexing them locally when document_id is given"""
         # Create cache key
-        cache_key = self.cache.make_key("embeddings", text)
+        cache_key = await self._key("embeddings", text)
         
         # Check cache
-        cached = await self.cache.get(cache_key)
+        cached = await self.cache.get_vector(cache_key)
         if cached:
+            self._index_document(document_id, text, cached)
             return cached
         
+        async def generate():
+            if self.embedding_batcher is not None:
+                return await self.embedding_batcher.submit(text)
+            return await self.ollama.generate_embeddings(self.embedding_model, text)
+
         try:
-            embeddings = await self.ollama.generate_embeddings(self.embedding_model, text)
-            await self.cache.set(cache_key, embeddings, expire=86400)
-            return embeddings
+            embeddings = await self._compute_once(cache_key, generate, expire=86400, vector=True)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ollama embeddings error: {e}")
             # Return zero vector
             return [0.0] * 384
+
+        self._index_document(document_id, text, embeddings)
+        return embeddings
         
+    async def create_embeddings_batch(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+    ) -> List[List[float]]:
+        """Generate embeddings for many texts, sending only cache misses to Ollama"""
+        batch_size = batch_size or self.embedding_batch_size
+        unique_texts = list(dict.fromkeys(texts))
+        keys = {text: await self._key("embeddings", text) for text in unique_texts}
+
+        cached = await self.cache.get_vectors([keys[text] for text in unique_texts])
+        vectors = {text: vector for text, vector in zip(unique_texts, cached) if vector}
+        missing = [text for text in unique_texts if text not in vectors]
+
+        if missing:
+            chunks = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+            logger.info(f"Embedding {len(missing)}/{len(unique_texts)} uncached texts in {len(chunks)} batches")
+            results = await asyncio.gather(*(
+                self.ollama.generate_embeddings_batch(self.embedding_model, chunk) for chunk in chunks
+            ))
+
+            fresh = {}
+            for chunk, embeddings in zip(chunks, results):
+                for text, embedding in zip(chunk, embeddings):
+                    vectors[text] = embedding
+                    fresh[keys[text]] = embedding
+            await self.cache.set_vectors(fresh, expire=86400)
+
+        for document_id, text in zip(document_ids or [], texts):
+            self._index_document(document_id, text, vectors[text])
+        return [vectors[text] for text in texts]
+
+    def _index_document(self, document_id: Optional[str], text: str, vector: List[float]):
+        """Feed the local vector index used for in-process RAG retrieval"""
+        if document_id is None or self.vector_index is None:
+            return
+        try:
+            self.vector_index.add(document_id, vector, text)
+        except ValueError as e:
+            logger.error(f"Failed to index {document_id} locally: {e}")
+
+    def remove_document(self, document_id: str) -> bool:
+        """Remove a document from the local vector index"""
+        if self.vector_index is None:
+            return False
+        return self.vector_index.delete(document_id)
+
+    async def search_local(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Top-k retrieval from the local vector index"""
+        if self.vector_index is None or len(self.vector_index) == 0:
+            return []
+        query_vector = await self.create_embeddings(query)
+        return [
+            {"document_id": document_id, "score": score, "content": content}
+            for document_id, score, content in self.vector_index.search(query_vector, limit)
+        ]
+
     async def extract_tasks(self, text: str) -> Dict[str, Any]:
-        cache_key = self.cache.make_key("tasks", text)
+        cache_key = await self._key("tasks", text)
         
         # Check cache
         cached = await self.cache.get(cache_key)
         if cached:
             return cached
         
+        analysis = await self._cached_analysis(text)
+        if analysis:
+            return tasks_from_analysis(analysis)
+        
+        async def generate():
+            chunks = self._content_chunks(text)
+            if len(chunks) == 1:
+                return await self._generate_tasks(text)
+            return merge_task_extractions(await self._map(chunks, self._extract_tasks_chunk))
+
         try:
-            prompt = build_task_extraction_prompt(text)
-            response = await self.ollama.generate_structured(
-                model=self.model,
-                prompt=prompt,
-                response_format=TaskExtractionModel,
-            )
-            result_dict = response.model_dump()
-            await self.cache.set(cache_key, result_dict, expire=3600)
-            return result_dict
+            return await self._compute_once(cache_key, generate, expire=3600)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Task extraction error: {e}")
             return {
@@ -118,33 +387,66 @@ class ChatService:
             }
                 
     async def summarize_text(self, text: str, max_length: int = 200) -> Dict[str, str]:
-        """Generate text summary"""
-        try:
-            prompt = build_summarization_prompt(text, max_length)
-            response = await self.ollama.generate(self.model, prompt)
+        """Generate text summary, map-reducing documents too long for one prompt"""
+        cache_key = await self._key("summary", max_length, _content_hash(text))
+        
+        cached = await self.cache.get(cache_key)
+        if cached:
+            return cached
+        
+        async def generate():
+            chunks = split_into_chunks(text, self.chunk_max_tokens, self.chunk_overlap_tokens)
+            if len(chunks) == 1:
+                # Cached under the document key only; a chunk entry would duplicate it
+                summary = await self._generate_summary(text, max_length)
+            else:
+                logger.info(f"Summarizing {len(chunks)} chunks")
+                partial_length = max(max_length, 500)
+                partials = await self._map(chunks, lambda chunk: self._summarize_chunk(chunk, partial_length))
+                summary = await self._reduce_summaries(partials, max_length)
             
-            summary = response.strip()
             if len(summary) > max_length:
                 summary = summary[:max_length] + "..."
             
             return {"summary": summary}
-            
+        
+        try:
+            return await self._compute_once(cache_key, generate, expire=self.summary_cache_ttl)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Summarization error: {e}")
             return {"summary": f"Failed to generate summary: {str(e)}"}
     
     async def analyze_document(self, text: str, analysis_type: str = "general") -> Dict[str, Any]:
-        """Comprehensive document analysis"""
-        try:
-            prompt = build_analysis_prompt(text, analysis_type)
-            response = await self.ollama.generate_structured(
-                model=self.model,
-                prompt=prompt,
-                response_format=DocumentAnalysisModel
-            )
+        """Comprehensive document analysis, merging per-chunk analyses for long documents"""
+        text_hash = _content_hash(text)
+        cache_key = await self._key("analysis", analysis_type, text_hash)
+        
+        cached = await self.cache.get(cache_key)
+        if cached:
+            return cached
+        
+        async def generate():
+            # Content-defined chunks keep their cache keys when other parts of the text are edited
+            chunks = self._content_chunks(text)
+            if len(chunks) == 1:
+                analysis = await self._generate_analysis(text, analysis_type)
+            else:
+                logger.info(f"Analyzing {len(chunks)} chunks")
+                partials = await self._map(chunks, lambda chunk: self._analyze_chunk(chunk, analysis_type))
+                summary = await self._reduce_summaries([partial["summary"] for partial in partials], 300)
+                analysis = merge_analyses(partials, summary)
             
-            return response.model_dump()
-                    
+            # Any analysis of this text can later answer /extract and /tasks without a generation;
+            # the ref points at the entry rather than storing the analysis a second time
+            await self.cache.set(await self._key("analysis", "ref", text_hash), cache_key, expire=self.analysis_cache_ttl)
+            return analysis
+        
+        try:
+            return await self._compute_once(cache_key, generate, expire=self.analysis_cache_ttl)
+        except OllamaOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Document analysis error: {e}")
             return {
@@ -160,7 +462,133 @@ class ChatService:
                 "themes": [],
                 "difficulty_level": "unknown"
             }
+    
+    async def _key(self, operation: str, *args) -> str:
+        return await self.cache.namespaced_key(self.namespaces[operation], *args)
+    
+    async def _cached_analysis(self, text: str) -> Optional[Dict[str, Any]]:
+        """Most recent full analysis of exactly this text, of any analysis_type"""
+        analysis_key = await self.cache.get(await self._key("analysis", "ref", _content_hash(text)))
+        return await self.cache.get(analysis_key) if analysis_key else None
+    
+    def _content_chunks(self, text: str) -> List[str]:
+        return content_defined_chunks(text, self.cdc_target_tokens, self.cdc_min_tokens, self.chunk_max_tokens)
+    
+    async def _cached_chunk(self, cache_key: str, generate: Callable[[], Awaitable[Any]], expire: int) -> Any:
+        """Per-chunk result from the cache, computed only for new or edited chunks"""
+        cached = await self.cache.get(cache_key)
+        if cached:
+            self.chunk_counters["reused"] += 1
+            return cached
+        self.chunk_counters["computed"] += 1
+        return await self._compute_once(cache_key, generate, expire=expire)
+    
+    async def _map(self, items: List[Any], fn: Callable[[Any], Awaitable[Any]]) -> List[Any]:
+        """Apply fn to all items concurrently, at most map_concurrency at a time"""
+        # Bounded here too so one document cannot fill the scheduler's batch queue
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+        
+        async def run(item):
+            async with semaphore:
+                return await fn(item)
+        
+        return await asyncio.gather(*(run(item) for item in items))
+    
+    async def _reduce_summaries(self, summaries: List[str], max_length: int) -> str:
+        """Combine partial summaries reduce_fan_in at a time until one is left"""
+        while len(summaries) > 1:
+            groups = [summaries[i:i + self.reduce_fan_in] for i in range(0, len(summaries), self.reduce_fan_in)]
+            target = max_length if len(groups) == 1 else max(max_length, 500)
+            summaries = await self._map(groups, lambda group: self._combine_summaries(group, target))
+        return summaries[0]
+    
+    async def _summarize_chunk(self, chunk: str, max_length: int) -> str:
+        cache_key = await self._key("summary", "chunk", max_length, _content_hash(chunk))
+        return await self._cached_chunk(
+            cache_key, lambda: self._generate_summary(chunk, max_length), expire=self.summary_cache_ttl
+        )
+    
+    async def _generate_summary(self, chunk: str, max_length: int) -> str:
+        prompt = build_summarization_prompt(chunk, max_length)
+        response = await self.ollama.generate(self.model, prompt, priority="batch")
+        return response.strip()
+    
+    async def _combine_summaries(self, summaries: List[str], max_length: int) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
+        cache_key = await self._key("summary", "reduce", max_length, _content_hash("\n".join(summaries)))
         
+        async def generate():
+            prompt = build_combine_summaries_prompt(summaries, max_length)
+            response = await self.ollama.generate(self.model, prompt, priority="batch")
+            return response.strip()
+        
+        return await self._cached_chunk(cache_key, generate, expire=self.summary_cache_ttl)
+    
+    async def _analyze_chunk(self, chunk: str, analysis_type: str) -> Dict[str, Any]:
+        cache_key = await self._key("analysis", "chunk", analysis_type, _content_hash(chunk))
+        return await self._cached_chunk(
+            cache_key, lambda: self._generate_analysis(chunk, analysis_type), expire=self.analysis_cache_ttl
+        )
+    
+    async def _generate_analysis(self, chunk: str, analysis_type: str) -> Dict[str, Any]:
+        prompt = build_analysis_prompt(chunk, analysis_type)
+        response = await self.ollama.generate_structured(
+            model=self.model,
+            prompt=prompt,
+            response_format=DocumentAnalysisModel
+        )
+        return response.model_dump()
+    
+    async def _extract_entities_chunk(self, chunk: str) -> Dict[str, Any]:
+        cache_key = await self._key("extract", "chunk", _content_hash(chunk))
+        return await self._cached_chunk(
+            cache_key, lambda: self._generate_entities(chunk), expire=self.analysis_cache_ttl
+        )
+    
+    async def _generate_entities(self, chunk: str) -> Dict[str, Any]:
+        prompt = build_extraction_prompt(chunk)
+        response = await self.ollama.generate_structured(
+            model=self.model,
+            prompt=prompt,
+            response_format=EntityExtractionModel
+        )
+        return response.model_dump()
+    
+    async def _extract_tasks_chunk(self, chunk: str) -> Dict[str, Any]:
+        cache_key = await self._key("tasks", "chunk", _content_hash(chunk))
+        return await self._cached_chunk(
+            cache_key, lambda: self._generate_tasks(chunk), expire=self.analysis_cache_ttl
+        )
+    
+    async def _generate_tasks(self, chunk: str) -> Dict[str, Any]:
+        prompt = build_task_extraction_prompt(chunk)
+        response = await self.ollama.generate_structured(
+            model=self.model,
+            prompt=prompt,
+            response_format=TaskExtractionModel,
+        )
+        return response.model_dump()
+        
+    async def invalidate_cache(self, operations: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Start a new cache generation for the given operations (all by default).
+
+        Entries of the previous generations are removed by a background SCAN.
+        """
+        unknown = set(operations or []) - set(self.namespaces)
+        if unknown:
+            raise ValueError(f"Unknown cache operations: {', '.join(sorted(unknown))}")
+        
+        invalidated = {}
+        for operation in operations or list(self.namespaces):
+            namespace = self.namespaces[operation]
+            generation = await self.cache.invalidate_namespace(namespace)
+            purge = asyncio.create_task(self.cache.purge_stale_generations(namespace))
+            self._purges.add(purge)
+            purge.add_done_callback(self._purges.discard)
+            invalidated[operation] = {"namespace": namespace, "generation": generation}
+        return invalidated
+    
     async def health_check(self) -> dict:
         """Check service health"""
         try:
@@ -178,5 +606,11 @@ class ChatService:
             }
     
     async def close(self):
+        if self.vector_index is not None:
+            await self.vector_index.close()
+        if self.embedding_batcher is not None:
+            await self.embedding_batcher.close()
+        for purge in list(self._purges):
+            purge.cancel()
         await self.ollama.close()
         await self.cache.close()
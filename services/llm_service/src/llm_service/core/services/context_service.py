@@ -0,0 +1,203 @@
+import asyncio
+import httpx
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Order in which tool results are appended to the chat context
+TOOL_ORDER = ["github_repos", "github_code", "github_issues", "github_commits"]
+# Extra time for the batch round-trip on top of the server's per-call deadline
+BATCH_TIMEOUT_MARGIN = 2.0
+
+class ContextService:
+    """Gathers RAG documents and GitHub data for a chat question concurrently"""
+
+    def __init__(
+        self,
+        mcp_client,
+        tool_router,
+        search_service_url: str = "http://localhost:8004",
+        search_timeout: float = 5.0,
+        tool_timeout: float = 10.0,
+        local_search: Optional[Callable[[str, int], Awaitable[List[dict]]]] = None,
+        rag_mode: str = "fallback",
+    ):
+        self.mcp = mcp_client
+        self.tool_router = tool_router
+        self.search_service_url = search_service_url
+        self.tool_timeout = tool_timeout
+        # "remote", "local" (local first) or "fallback" (local when remote fails)
+        self.local_search = local_search
+        self.rag_mode = rag_mode
+        self.client = httpx.AsyncClient(timeout=search_timeout)
+        self.tool_formatters = {
+            "github_repos": self._format_repos,
+            "github_code": self._format_code,
+            "github_issues": self._format_issues,
+            "github_commits": self._format_commits,
+        }
+
+    async def gather(self, message: str, context: Optional[List[str]] = None, search_limit: int = 3) -> Dict[str, Any]:
+        """Run the RAG search alongside tool selection and the selected tools"""
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        search_task = asyncio.create_task(
+            self._timed("rag_search", self._search(message, search_limit), timings)
+        )
+        tool_results = await self._run_tools(message, timings)
+        rag_context, doc_sources = await search_task
+
+        merged_context = list(context or [])
+        merged_context.extend(rag_context)
+        github_data = None
+        tools_used = []
+        for tool in TOOL_ORDER:
+            result = tool_results.get(tool)
+            if not result:
+                continue
+            text, data = result
+            merged_context.append(text)
+            tools_used.append(tool)
+            if github_data is None:
+                github_data = {}
+            github_data[tool.split("_", 1)[1]] = data
+
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"⏱️ Context gathered in {timings['total']}ms: {timings}")
+
+        return {
+            "context": merged_context,
+            "doc_sources": doc_sources,
+            "github_data": github_data,
+            "tools_used": tools_used,
+            "timings": timings,
+        }
+
+    async def _timed(self, name: str, awaitable: Awaitable, timings: Dict[str, float]):
+        """Await a step and record its wall-clock duration in milliseconds"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def _search(self, message: str, limit: int) -> Tuple[List[str], List[dict]]:
+        """Retrieve documents from the search service and/or the local vector index"""
+        if self.rag_mode == "local":
+            results = await self._search_local(message, limit) or await self._search_remote(message, limit)
+        elif self.rag_mode == "fallback":
+            # Only searched once the remote search comes back empty: the local lookup embeds the
+            # question, and a singleflight-shared embedding would not stop if the lookup were cancelled
+            results = await self._search_remote(message, limit) or await self._search_local(message, limit)
+        else:
+            results = await self._search_remote(message, limit)
+
+        rag_context = [result["content"] for result in results]
+        doc_sources = [
+            {
+                "document_id": result["document_id"],
+                "score": result["score"],
+                "preview": result["content"][:150] + "..." if len(result["content"]) > 150 else result["content"]
+            }
+            for result in results
+        ]
+        return rag_context, doc_sources
+
+    async def _search_remote(self, message: str, limit: int) -> List[dict]:
+        try:
+            response = await self.client.get(
+                f"{self.search_service_url}/api/v1/search",
+                params={"q": message, "limit": limit},
+            )
+            if response.status_code != 200:
+                return []
+            return response.json().get("results", [])
+        except Exception as e:
+            logger.warning(f"RAG search failed, using general knowledge: {e}")
+            return []
+
+    async def _search_local(self, message: str, limit: int) -> List[dict]:
+        if self.local_search is None:
+            return []
+        try:
+            return await self.local_search(message, limit)
+        except Exception as e:
+            logger.warning(f"Local vector search failed: {e}")
+            return []
+
+    async def _select_tools(self, message: str) -> List[str]:
+        """Pick the GitHub tools the question needs"""
+        try:
+            return await self.tool_router.select_tools(message)
+        except Exception as e:
+            logger.error(f"Tool selection failed: {e}")
+            return []
+
+    async def _run_tools(self, message: str, timings: Dict[str, float]) -> Dict[str, Optional[Tuple[str, Any]]]:
+        """Select tools, then fetch all of them in one batch call with a per-tool deadline"""
+        needed_tools = await self._timed("tool_selection", self._select_tools(message), timings)
+        selected = [tool for tool in TOOL_ORDER if tool in needed_tools]
+        if not selected:
+            return {}
+
+        calls = [self._tool_call(tool, message) for tool in selected]
+        github_results = await self._timed("github_batch", self._call_batch(calls), timings)
+
+        results = {}
+        for tool, github_result in zip(selected, github_results):
+            if "elapsed_ms" in github_result:
+                timings[tool] = github_result["elapsed_ms"]
+            if github_result.get("error"):
+                logger.warning(f"Tool {tool} failed: {github_result['error']}")
+            results[tool] = self.tool_formatters[tool](github_result) if github_result.get("result") else None
+        return results
+
+    def _tool_call(self, tool: str, message: str) -> Dict[str, Any]:
+        # Issues and commits without a repo are answered across all repositories
+        name, arguments = {
+            "github_repos": ("search_repos", {"query": "", "limit": 10}),
+            "github_code": ("search_code", {"query": message, "limit": 5}),
+            "github_issues": ("get_issues", {"state": "open", "limit": 10}),
+            "github_commits": ("get_commits", {"limit": 10}),
+        }[tool]
+        return {"tool": name, "arguments": arguments}
+
+    async def _call_batch(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run the calls server-side under tool_timeout each, never waiting much past it"""
+        timeout = self.tool_timeout + BATCH_TIMEOUT_MARGIN
+        try:
+            return await asyncio.wait_for(self.mcp.call_many(calls, timeout=self.tool_timeout), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"GitHub batch call timed out after {timeout}s")
+            return [{"tool": call["tool"], "error": "timed out"} for call in calls]
+
+    def _format_repos(self, github_result: Dict[str, Any]) -> Tuple[str, Any]:
+        lines = ["Your GitHub repositories:"]
+        for repo in github_result["result"]:
+            lines.append(f"- {repo['name']}: {repo.get('description', 'No description')}")
+            lines.append(f"  Language: {repo.get('language')}, Stars: {repo.get('stars', 0)}")
+        return "\n".join(lines) + "\n", github_result["result"]
+
+    def _format_code(self, github_result: Dict[str, Any]) -> Tuple[str, Any]:
+        lines = ["Code from your repositories:"]
+        for item in github_result["result"]:
+            lines.append(f"- {item['file']} in {item['repository']}")
+        return "\n".join(lines) + "\n", github_result["result"]
+
+    def _format_issues(self, github_result: Dict[str, Any]) -> Tuple[str, Any]:
+        lines = ["Open issues:"]
+        for issue in github_result["result"]:
+            lines.append(f"- {issue.get('repository') or ''}#{issue['number']}: {issue['title']}")
+        return "\n".join(lines) + "\n", github_result["result"]
+
+    def _format_commits(self, github_result: Dict[str, Any]) -> Tuple[str, Any]:
+        lines = ["Recent commits:"]
+        for commit in github_result["result"]:
+            lines.append(f"- {commit.get('repository') or ''}@{commit['sha']}: {commit['message']}")
+        return "\n".join(lines) + "\n", github_result["result"]
+
+    async def close(self):
+        await self.client.aclose()
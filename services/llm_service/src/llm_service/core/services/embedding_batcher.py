@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Collects concurrent single-text embedding requests into batched model calls.
+
+    A batch is sent once max_batch_size texts are waiting or max_wait_ms has
+    passed since the first one arrived. The queue is bounded, so callers wait
+    for room (backpressure) instead of piling up unbounded work.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 1024,
+        max_in_flight: int = 2,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.max_in_flight = max_in_flight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.counters = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+    async def submit(self, text: str) -> List[float]:
+        """Queue one text and wait for its vector"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self.counters["requests"] += 1
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self):
+        # Queues are bound to the loop they were created on, so start lazily
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = self._loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Bound concurrent model calls; while waiting the queue fills up
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("Embedding batcher closed"))
+                raise
+            task = self._loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            self.counters["batches"] += 1
+            self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+            embeddings = await self.embed_batch([text for text, _ in batch])
+            # zip() would silently leave the unmatched callers waiting forever
+            if len(embeddings) != len(batch):
+                raise ValueError(f"Model returned {len(embeddings)} embeddings for {len(batch)} texts")
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+            self._fail(batch, e)
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Embedding batcher closed"))
+            raise
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, asyncio.Future]], error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> Dict[str, float]:
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "avg_batch_size": round(self.counters["requests"] / batches, 2) if batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self):
+        """Stop the worker and fail every request that has not been answered"""
+        tasks = list(self._dispatches)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        if tasks and self._loop is asyncio.get_running_loop():
+            # Let cancelled batches fail their own futures
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self._queue is not None:
+            queued = []
+            while not self._queue.empty():
+                queued.append(self._queue.get_nowait())
+            self._fail(queued, RuntimeError("Embedding batcher closed"))
@@ -25,6 +25,26 @@ Consider the question needs GitHub data if it mentions:
 
 JSON list:"""
 
+# Phrases that select a tool without an LLM call. Keep in sync with the
+# trigger examples listed in TOOL_SELECTION_PROMPT.
+TOOL_TRIGGERS = {
+    "github_repos": [
+        "my projects", "my project", "my repos", "my repo", "my repositories", "my repository",
+        "what have i built", "what am i working on",
+    ],
+    "github_code": ["my code", "code examples", "code example", "show me code", "show me the code"],
+    "github_issues": ["my issues", "my bugs", "open issues"],
+    "github_commits": ["my commits", "recent commits", "latest commits"],
+}
+
+# Words hinting that GitHub data might help. Questions without any of them
+# skip tool selection entirely; the rest fall back to the LLM.
+GITHUB_HINTS = [
+    "github", "repo", "repos", "repository", "repositories", "project", "projects",
+    "code", "issue", "issues", "bug", "bugs", "commit", "commits", "pull request",
+    "pr", "prs", "branch", "built", "building", "working on",
+]
+
 def build_tool_selection_prompt(question: str) -> str:
     """Build prompt for tool selection"""
     return TOOL_SELECTION_PROMPT.format(question=question)
@@ -0,0 +1,90 @@
+import json
+import logging
+import re
+from typing import Dict, List
+
+from llm_service.core.prompts import template_version
+from llm_service.core.tool_prompts import (
+    TOOL_TRIGGERS, GITHUB_HINTS, TOOL_SELECTION_PROMPT, build_tool_selection_prompt
+)
+
+logger = logging.getLogger(__name__)
+
+KNOWN_TOOLS = list(TOOL_TRIGGERS.keys())
+
+def _phrase_pattern(phrases: List[str]) -> str:
+    # Longest first so "my repositories" wins over "my repo"
+    ordered = sorted(phrases, key=len, reverse=True)
+    return "|".join(re.escape(phrase) for phrase in ordered)
+
+# One precompiled alternation with a named group per tool
+TRIGGER_PATTERN = re.compile(
+    "|".join(rf"\b(?P<{tool}>{_phrase_pattern(phrases)})\b" for tool, phrases in TOOL_TRIGGERS.items())
+)
+HINT_PATTERN = re.compile(rf"\b(?:{_phrase_pattern(GITHUB_HINTS)})\b")
+
+def normalize_question(question: str) -> str:
+    """Lowercase and collapse punctuation/whitespace for matching and cache keys"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", question.lower()).split())
+
+class ToolRouter:
+    """Selects GitHub tools for a question, using the LLM only when rules are inconclusive"""
+
+    def __init__(self, ollama, model: str, cache, cache_ttl: int = 86400):
+        self.ollama = ollama
+        self.model = model
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # Cached routes are only reused by the same model, prompt and tool set
+        self.namespace = cache.namespace(
+            "tool_route", model, template_version(TOOL_SELECTION_PROMPT), *KNOWN_TOOLS
+        )
+        self.counters = {"fast_path": 0, "no_tools": 0, "cache_hit": 0, "llm": 0}
+
+    async def select_tools(self, question: str) -> List[str]:
+        """Return the tools needed for the question, in canonical order"""
+        normalized = normalize_question(question)
+
+        matched = {match.lastgroup for match in TRIGGER_PATTERN.finditer(normalized)}
+        if matched:
+            self.counters["fast_path"] += 1
+            tools = [tool for tool in KNOWN_TOOLS if tool in matched]
+            logger.info(f"⚡ Rule-selected tools: {tools}")
+            return tools
+
+        if not HINT_PATTERN.search(normalized):
+            self.counters["no_tools"] += 1
+            return []
+
+        cache_key = await self.cache.namespaced_key(self.namespace, normalized)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            self.counters["cache_hit"] += 1
+            return cached
+
+        self.counters["llm"] += 1
+        tools = await self._ask_llm(question)
+        await self.cache.set(cache_key, tools, expire=self.cache_ttl)
+        return tools
+
+    async def _ask_llm(self, question: str) -> List[str]:
+        tool_prompt = build_tool_selection_prompt(question)
+        tool_decision = await self.ollama.generate(self.model, tool_prompt)
+
+        json_match = re.search(r'\[.*?\]', tool_decision)
+        if not json_match:
+            return []
+        selected = json.loads(json_match.group())
+        tools = [tool for tool in KNOWN_TOOLS if tool in selected]
+        logger.info(f"🤖 LLM selected tools: {tools}")
+        return tools
+
+    def stats(self) -> Dict[str, float]:
+        """Routing decision counters and the share served without an LLM call"""
+        total = sum(self.counters.values())
+        without_llm = total - self.counters["llm"]
+        return {
+            **self.counters,
+            "total": total,
+            "fast_path_ratio": round(without_llm / total, 4) if total else 0.0,
+        }
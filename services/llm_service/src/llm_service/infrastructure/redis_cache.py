@@ -1,69 +1,405 @@
 import redis.asyncio as redis
+import asyncio
 import json
 import hashlib
 import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from infrastructure.local_cache import LocalCache
+from infrastructure.vector_codec import encode_vector, decode_vector
 
 logger = logging.getLogger(__name__)
 
+# Deletes the lock only if it is still held by the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# How long a namespace generation read from Redis is trusted before re-reading it
+GENERATION_REFRESH_SECONDS = 5.0
+
 class RedisCache:
-    def __init__(self, url: str = "redis://localhost:6379"):
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379",
+        local_max_bytes: int = 0,
+        invalidation_channel: str = "cache:invalidate",
+        vector_dtype: str = "float32",
+        key_prefix: str = "llm",
+    ):
         self.url = url
+        self.key_prefix = key_prefix
         self.client = None
+        # Embedding vectors are stored as packed bytes, which needs a non-decoding client
+        self.binary_client = None
+        self.vector_dtype = vector_dtype
+        # Optional in-process L1; replicas drop their copies via pub/sub
+        self.local = LocalCache(local_max_bytes) if local_max_bytes > 0 else None
+        self.invalidation_channel = invalidation_channel
+        self.instance_id = uuid.uuid4().hex
+        self._listener = None
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        # namespace -> (generation, refresh deadline)
+        self._generations: Dict[str, Tuple[int, float]] = {}
     
     async def connect(self):
         """Connect to Redis"""
         if self.client is None:
             try:
                 self.client = await redis.from_url(self.url, decode_responses=True)
+                self.binary_client = await redis.from_url(self.url, decode_responses=False)
                 logger.info("Connected to Redis")
             except Exception as e:
                 logger.error(f"Failed to connect to Redis: {e}")
                 self.client = None
+                self.binary_client = None
+                return
+        
+        if self.local is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
     
     async def get(self, key: str):
-        """Get value from cache"""
-        if self.client is None:
+        """Get value from cache, checking the in-process tier first"""
+        return await self._get(key, self.client, json.loads)
+    
+    async def set(self, key: str, value: Any, expire: int = 3600):
+        """Set value in cache with expiration (seconds)"""
+        await self._set(key, value, json.dumps(value), self.client, expire)
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values at once; missing keys come back as None"""
+        return await self._get_many(keys, self.client, json.loads)
+    
+    async def set_many(self, items: Dict[str, Any], expire: int = 3600):
+        """Set several values in one pipelined round-trip"""
+        payloads = {key: json.dumps(value) for key, value in items.items()}
+        await self._set_many(items, payloads, self.client, expire)
+    
+    async def get_vector(self, key: str) -> Optional[List[float]]:
+        """Get an embedding vector stored in the binary vector format"""
+        return await self._get(key, self.binary_client, decode_vector, packed=True)
+    
+    async def set_vector(self, key: str, vector: List[float], expire: int = 86400):
+        """Store an embedding vector as packed binary instead of JSON"""
+        await self._set(key, vector, encode_vector(vector, self.vector_dtype), self.binary_client, expire, packed=True)
+    
+    async def get_vectors(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Get several embedding vectors with one MGET"""
+        return await self._get_many(keys, self.binary_client, decode_vector, packed=True)
+    
+    async def set_vectors(self, items: Dict[str, List[float]], expire: int = 86400):
+        """Store several embedding vectors in one pipelined round-trip"""
+        payloads = {key: encode_vector(vector, self.vector_dtype) for key, vector in items.items()}
+        await self._set_many(items, payloads, self.binary_client, expire, packed=True)
+    
+    def _local_get(self, key: str, decode: Callable[[Any], Any], packed: bool):
+        value = self.local.get(key)
+        return decode(value) if packed and value is not None else value
+    
+    def _local_set(self, key: str, value: Any, payload, ttl: float, packed: bool):
+        # Packed vectors stay packed in L1: a decoded list of floats is several times
+        # larger than its float16/int8 payload and would overrun the byte budget
+        self.local.set(key, payload if packed else value, len(payload), ttl)
+    
+    async def _get(self, key: str, client, decode: Callable[[Any], Any], packed: bool = False):
+        if self.local is not None:
+            value = self._local_get(key, decode, packed)
+            if value is not None:
+                self.counters["l1_hits"] += 1
+                return value
+            self.counters["l1_misses"] += 1
+        
+        if client is None:
             return None
         
         try:
-            value = await self.client.get(key)
+            if self.local is not None:
+                # Fetch the remaining TTL too so the L1 copy expires with Redis
+                async with client.pipeline(transaction=False) as pipe:
+                    value, ttl_ms = await pipe.get(key).pttl(key).execute()
+            else:
+                value = await client.get(key)
             if value:
+                self.counters["l2_hits"] += 1
                 logger.info(f"Cache HIT: {key[:30]}...")
-                return json.loads(value)
+                result = decode(value)
+                if self.local is not None and ttl_ms > 0:
+                    self._local_set(key, result, value, ttl_ms / 1000, packed)
+                return result
+            self.counters["l2_misses"] += 1
             logger.debug(f"Cache MISS: {key[:30]}...")
             return None
         except Exception as e:
             logger.error(f"Cache get error: {e}")
             return None
     
-    async def set(self, key: str, value: Any, expire: int = 3600):
-        """Set value in cache with expiration (seconds)"""
-        if self.client is None:
+    async def _set(self, key: str, value: Any, payload, client, expire: int, packed: bool = False):
+        if self.local is not None:
+            self._local_set(key, value, payload, expire, packed)
+        
+        if client is None:
             return
         
         try:
-            await self.client.set(key, json.dumps(value), ex=expire)
+            if self.local is not None:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.set(key, payload, ex=expire)
+                    pipe.publish(self.invalidation_channel, f"{self.instance_id}:{key}")
+                    await pipe.execute()
+            else:
+                await client.set(key, payload, ex=expire)
             logger.debug(f"💾 Cached: {key[:30]}... (TTL: {expire}s)")
         except Exception as e:
             logger.error(f"Cache set error: {e}")
     
+    async def _get_many(
+        self,
+        keys: List[str],
+        client,
+        decode: Callable[[Any], Any],
+        packed: bool = False,
+    ) -> List[Optional[Any]]:
+        results: List[Optional[Any]] = [None] * len(keys)
+        pending = []
+        for i, key in enumerate(keys):
+            value = self._local_get(key, decode, packed) if self.local is not None else None
+            if value is not None:
+                self.counters["l1_hits"] += 1
+                results[i] = value
+            else:
+                if self.local is not None:
+                    self.counters["l1_misses"] += 1
+                pending.append(i)
+        
+        if not pending or client is None:
+            return results
+        
+        try:
+            pending_keys = [keys[i] for i in pending]
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.mget(pending_keys)
+                if self.local is not None:
+                    for key in pending_keys:
+                        pipe.pttl(key)
+                replies = await pipe.execute()
+            
+            values, ttls = replies[0], replies[1:]
+            for n, (i, value) in enumerate(zip(pending, values)):
+                if not value:
+                    self.counters["l2_misses"] += 1
+                    continue
+                self.counters["l2_hits"] += 1
+                results[i] = decode(value)
+                if self.local is not None and ttls[n] > 0:
+                    self._local_set(keys[i], results[i], value, ttls[n] / 1000, packed)
+            hits = sum(1 for value in results if value is not None)
+            logger.info(f"Cache MGET: {hits}/{len(keys)} hits")
+        except Exception as e:
+            logger.error(f"Cache get_many error: {e}")
+        return results
+    
+    async def _set_many(self, items: Dict[str, Any], payloads: Dict[str, Any], client, expire: int, packed: bool = False):
+        if not items:
+            return
+        
+        if self.local is not None:
+            for key, value in items.items():
+                self._local_set(key, value, payloads[key], expire, packed)
+        
+        if client is None:
+            return
+        
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, payload in payloads.items():
+                    pipe.set(key, payload, ex=expire)
+                    if self.local is not None:
+                        pipe.publish(self.invalidation_channel, f"{self.instance_id}:{key}")
+                await pipe.execute()
+            logger.debug(f"💾 Cached {len(items)} entries (TTL: {expire}s)")
+        except Exception as e:
+            logger.error(f"Cache set_many error: {e}")
+    
     async def delete(self, key: str):
         """Delete key from cache"""
+        if self.local is not None:
+            self.local.delete(key)
+        
         if self.client is None:
             return
         
         try:
             await self.client.delete(key)
+            if self.local is not None:
+                await self.client.publish(self.invalidation_channel, f"{self.instance_id}:{key}")
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
     
+    async def _listen_for_invalidations(self):
+        """Drop L1 entries written or deleted by other replicas"""
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.invalidation_channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    origin, _, key = message["data"].partition(":")
+                    if origin != self.instance_id:
+                        self.local.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Invalidations may have been missed, so start from a clean L1
+                logger.error(f"Cache invalidation listener error: {e}")
+                self.local.clear()
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per cache tier"""
+        stats = {
+            "l2": {"hits": self.counters["l2_hits"], "misses": self.counters["l2_misses"]},
+        }
+        if self.local is not None:
+            stats["l1"] = {
+                "hits": self.counters["l1_hits"],
+                "misses": self.counters["l1_misses"],
+                "entries": len(self.local),
+                "bytes": self.local.size,
+                "max_bytes": self.local.max_bytes,
+            }
+        return stats
+    
+    async def acquire_lock(self, key: str, ttl: float = 30.0) -> Optional[str]:
+        """Try to take a short-lived lock for key.
+
+        Returns a release token, or None if another holder has the lock.
+        Without Redis there is nothing to coordinate, so a token is always returned.
+        """
+        token = uuid.uuid4().hex
+        if self.client is None:
+            return token
+        
+        try:
+            acquired = await self.client.set(f"lock:{key}", token, nx=True, px=int(ttl * 1000))
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Cache lock error: {e}")
+            return token
+    
+    async def release_lock(self, key: str, token: str):
+        """Release a lock taken with acquire_lock"""
+        if self.client is None:
+            return
+        
+        try:
+            await self.client.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.error(f"Cache unlock error: {e}")
+    
+    async def is_locked(self, key: str) -> bool:
+        """Check whether a lock for key is currently held"""
+        if self.client is None:
+            return False
+        
+        try:
+            return bool(await self.client.exists(f"lock:{key}"))
+        except Exception as e:
+            logger.error(f"Cache lock check error: {e}")
+            return False
+    
     def make_key(self, prefix: str, *args) -> str:
         """Create cache key from components"""
         combined = f"{prefix}:{':'.join(str(a) for a in args)}"
         # Use hash for consistent key length
         return hashlib.md5(combined.encode()).hexdigest()
     
+    def namespace(self, operation: str, *versions) -> str:
+        """Namespace for an operation's entries; it changes whenever any version component does"""
+        digest = hashlib.sha256(":".join(str(v) for v in versions).encode()).hexdigest()[:12]
+        return f"{operation}:{digest}"
+    
+    async def namespaced_key(self, namespace: str, *args) -> str:
+        """Key in the current generation of namespace, e.g. llm:chat:3f2a9c01b7de:g2:<md5>"""
+        generation = await self.generation(namespace)
+        digest = hashlib.md5(":".join(str(a) for a in args).encode()).hexdigest()
+        return f"{self.key_prefix}:{namespace}:g{generation}:{digest}"
+    
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:generation:{namespace}"
+    
+    async def generation(self, namespace: str) -> int:
+        """Current generation of namespace, re-read from Redis every GENERATION_REFRESH_SECONDS"""
+        known = self._generations.get(namespace)
+        now = time.monotonic()
+        if known is not None and (known[1] > now or self.client is None):
+            return known[0]
+        
+        generation = known[0] if known is not None else 0
+        if self.client is not None:
+            try:
+                generation = int(await self.client.get(self._generation_key(namespace)) or 0)
+            except Exception as e:
+                logger.error(f"Cache generation read error: {e}")
+        self._generations[namespace] = (generation, now + GENERATION_REFRESH_SECONDS)
+        return generation
+    
+    async def invalidate_namespace(self, namespace: str) -> int:
+        """Move namespace to a new generation, orphaning all of its entries in O(1).
+
+        Other replicas pick up the new generation within GENERATION_REFRESH_SECONDS.
+        Orphaned entries expire by TTL or are removed by purge_stale_generations.
+        """
+        generation = await self.generation(namespace) + 1
+        if self.client is not None:
+            try:
+                generation = await self.client.incr(self._generation_key(namespace))
+            except Exception as e:
+                logger.error(f"Cache generation bump error: {e}")
+        self._generations[namespace] = (generation, time.monotonic() + GENERATION_REFRESH_SECONDS)
+        logger.info(f"Invalidated cache namespace {namespace}, now at generation {generation}")
+        return generation
+    
+    async def purge_stale_generations(self, namespace: str, batch_size: int = 500) -> int:
+        """Delete entries from earlier generations of namespace.
+
+        Uses SCAN and UNLINK in batches so large namespaces never block Redis.
+        """
+        if self.client is None:
+            return 0
+        
+        current = await self.generation(namespace)
+        prefix = f"{self.key_prefix}:{namespace}:g"
+        deleted = 0
+        stale: List[str] = []
+        try:
+            async for key in self.client.scan_iter(match=f"{prefix}*", count=batch_size):
+                generation = key[len(prefix):].partition(":")[0]
+                if generation.isdigit() and int(generation) < current:
+                    stale.append(key)
+                if len(stale) >= batch_size:
+                    deleted += await self.client.unlink(*stale)
+                    stale = []
+            if stale:
+                deleted += await self.client.unlink(*stale)
+        except Exception as e:
+            logger.error(f"Cache purge error for {namespace}: {e}")
+        logger.info(f"Purged {deleted} stale entries from cache namespace {namespace}")
+        return deleted
+    
     async def close(self):
         """Close Redis connection"""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
         if self.client:
-            await self.client.close()
\ No newline at end of file
+            await self.client.close()
+        if self.binary_client:
+            await self.binary_client.close()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import itertools
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # installed with the "vector" extra; falls back to pure Python
+    np = None
+
+class SemanticCache:
+    """Bounded LRU of recent answers, looked up by question embedding similarity.
+
+    Entries are grouped by a context fingerprint and only answer questions
+    asked with the same fingerprint. A lookup returns the most similar
+    cached answer whose cosine similarity reaches threshold. Once
+    max_entries answers are held the least recently used one is evicted.
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.92, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        # entry id -> (fingerprint, expires_at, unit vector, answer), least recently used first
+        self._entries: "OrderedDict[int, Tuple[str, float, Any, str]]" = OrderedDict()
+        self._buckets: Dict[str, Set[int]] = {}
+        self._ids = itertools.count()
+        self.counters = {"lookups": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, fingerprint: str, vector: List[float]) -> Optional[str]:
+        """Cached answer for the most similar question, if it is similar enough"""
+        query = self._normalize(vector)
+        if query is None:
+            return None
+
+        self.counters["lookups"] += 1
+        best_id, best_score = None, self.threshold
+        now = time.monotonic()
+        for entry_id in list(self._buckets.get(fingerprint, ())):
+            _, expires_at, row, _ = self._entries[entry_id]
+            if expires_at <= now:
+                self._remove(entry_id)
+                continue
+            score = self._similarity(query, row)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][3]
+
+    def add(self, fingerprint: str, vector: List[float], answer: str):
+        row = self._normalize(vector)
+        if row is None:
+            return
+
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (fingerprint, time.monotonic() + self.ttl, row, answer)
+        self._buckets.setdefault(fingerprint, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def _remove(self, entry_id: int):
+        fingerprint = self._entries.pop(entry_id)[0]
+        bucket = self._buckets[fingerprint]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._buckets[fingerprint]
+
+    @staticmethod
+    def _normalize(vector: List[float]):
+        # Zero vectors come from failed embedding calls and must never match
+        norm = math.sqrt(sum(x * x for x in vector))
+        if norm == 0:
+            return None
+        if np is not None:
+            return np.asarray(vector, dtype=np.float32) / norm
+        return [x / norm for x in vector]
+
+    @staticmethod
+    def _similarity(a, b) -> float:
+        if len(a) != len(b):
+            return -1.0
+        if np is not None:
+            return float(np.dot(a, b))
+        return sum(x * y for x, y in zip(a, b))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["lookups"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution.
+
+    Callers in this process share one task per key. With distributed=True a
+    Redis lock extends this across replicas: the lock holder computes while
+    other replicas poll the cache for its result.
+    """
+
+    def __init__(self, cache=None, distributed: bool = False, lock_ttl: float = 30.0, poll_interval: float = 0.05):
+        self.cache = cache
+        self.distributed = distributed and cache is not None
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {"executions": 0, "coalesced": 0, "remote_waits": 0, "remote_hits": 0}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[str], Awaitable[Any]]] = None,
+    ) -> Any:
+        """Run fn once for all concurrent callers of key.
+
+        lookup reads the cached result another replica may have written;
+        it defaults to cache.get.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["executions"] += 1
+            task = asyncio.ensure_future(self._run(key, fn, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.counters["coalesced"] += 1
+
+        # Shielded so one caller going away does not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]], lookup) -> Any:
+        if not self.distributed:
+            return await fn()
+
+        token = await self.cache.acquire_lock(key, self.lock_ttl)
+        if token is None:
+            self.counters["remote_waits"] += 1
+            result = await self._wait_for_remote(key, lookup or self.cache.get)
+            if result is not None:
+                self.counters["remote_hits"] += 1
+                return result
+            # The other replica gave up or failed; compute it ourselves
+            token = await self.cache.acquire_lock(key, self.lock_ttl)
+
+        try:
+            return await fn()
+        finally:
+            if token is not None:
+                await self.cache.release_lock(key, token)
+
+    async def _wait_for_remote(self, key: str, lookup: Callable[[str], Awaitable[Any]]) -> Any:
+        """Poll the cache until the lock holder publishes a result or releases the lock"""
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await lookup(key)
+            if result is not None:
+                return result
+            if not await self.cache.is_locked(key):
+                return await lookup(key)
+        logger.warning(f"Timed out waiting for another replica to fill {key[:30]}...")
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "in_flight": len(self._inflight)}
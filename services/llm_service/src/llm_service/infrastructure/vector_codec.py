@@ -0,0 +1,75 @@
+"""Compact binary encoding for cached embedding vectors.
+
+Layout: 8-byte header (magic b"KV", version, dtype code, uint32 dimension),
+an optional float32 scale for int8, then little-endian vector data.
+"""
+import json
+import struct
+import sys
+from array import array
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy only speeds up decoding
+    np = None
+
+MAGIC = b"KV"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+SCALE = struct.Struct("<f")
+
+DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+DTYPE_NAMES = {code: name for name, code in DTYPE_CODES.items()}
+
+def encode_vector(values: Sequence[float], dtype: str = "float32") -> bytes:
+    """Encode a vector as header + packed values"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], len(values))
+    if dtype == "float32":
+        body = array("f", values)
+        if sys.byteorder == "big":
+            body.byteswap()
+        return header + body.tobytes()
+    if dtype == "float16":
+        return header + struct.pack(f"<{len(values)}e", *values)
+
+    # int8: symmetric quantization against the largest magnitude
+    scale = max((abs(v) for v in values), default=0.0) / 127 or 1.0
+    quantized = array("b", (max(-127, min(127, round(v / scale))) for v in values))
+    return header + SCALE.pack(scale) + quantized.tobytes()
+
+def decode_vector(data: bytes) -> List[float]:
+    """Decode a vector written by encode_vector.
+
+    Entries cached before the binary format was introduced are JSON lists,
+    so anything without the magic prefix is parsed as JSON.
+    """
+    if not data.startswith(MAGIC):
+        return json.loads(data)
+
+    _, version, code, dim = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unsupported vector encoding version: {version}")
+    dtype = DTYPE_NAMES[code]
+    body = memoryview(data)[HEADER.size:]
+
+    if dtype == "float32":
+        if np is not None:
+            return np.frombuffer(body, dtype="<f4", count=dim).tolist()
+        values = array("f")
+        values.frombytes(body[:dim * 4])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values.tolist()
+    if dtype == "float16":
+        if np is not None:
+            return np.frombuffer(body, dtype="<f2", count=dim).astype(np.float32).tolist()
+        return list(struct.unpack_from(f"<{dim}e", body))
+
+    (scale,) = SCALE.unpack_from(body)
+    if np is not None:
+        return (np.frombuffer(body, dtype=np.int8, count=dim, offset=SCALE.size) * scale).tolist()
+    return [v * scale for v in array("b", body[SCALE.size:SCALE.size + dim])]
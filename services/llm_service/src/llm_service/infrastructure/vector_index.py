@@ -0,0 +1,298 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # installed with the "vector" extra
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """In-process cosine-similarity index for RAG retrieval.
+
+    Rows are unit-normalized float32 vectors. "exact" mode scans the whole
+    matrix; "ivf" mode clusters rows with k-means and only scans the nprobe
+    closest clusters once the index holds at least ivf_min_size vectors.
+    When a path is given the matrix is persisted as raw float32 and loaded
+    back as a copy-on-write memory map. Once changes are made on an event
+    loop, a background task saves them in a worker thread after save_every
+    of them or save_interval seconds, so a crash loses little and requests
+    never wait on the write; close() flushes the rest.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: str = "exact",
+        nlist: int = 64,
+        nprobe: int = 8,
+        ivf_min_size: int = 4096,
+        save_every: int = 256,
+        save_interval: float = 60.0,
+    ):
+        if np is None:
+            raise RuntimeError("VectorIndex requires numpy; install llm-service[vector]")
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown vector index mode: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_size = ivf_min_size
+        self.dim: Optional[int] = None
+        self._matrix = None
+        self._count = 0
+        self._ids: List[Optional[str]] = []
+        self._contents: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._deleted = None
+        self._centroids = None
+        self._lists: List = []
+        self._ivf_size = 0
+        self._unsaved = 0
+        self.save_every = save_every
+        self.save_interval = save_interval
+        # Guards the rows against the saver's snapshot; _save_lock serializes whole saves
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._save_due: Optional[asyncio.Event] = None
+        self._saver: Optional[asyncio.Task] = None
+
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, doc_id: str, vector: List[float], content: str = ""):
+        """Add or replace the vector stored for doc_id"""
+        row_vector = self._normalize(vector)
+        if row_vector is None:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(row_vector)
+            elif len(row_vector) != self.dim:
+                raise ValueError(f"Vector has {len(row_vector)} dimensions, index expects {self.dim}")
+
+            self.delete(doc_id)
+            self._ensure_capacity(self._count + 1)
+            row = self._count
+            self._matrix[row] = row_vector
+            self._deleted[row] = False
+            self._count += 1
+            self._ids.append(doc_id)
+            self._contents.append(content)
+            self._rows[doc_id] = row
+
+            if self._centroids is not None:
+                nearest = int(np.argmax(self._centroids @ row_vector))
+                self._lists[nearest] = np.append(self._lists[nearest], row)
+            self._changed()
+
+    def delete(self, doc_id: str) -> bool:
+        """Tombstone doc_id; its row is left out the next time the index is saved"""
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return False
+            self._deleted[row] = True
+            self._ids[row] = None
+            self._contents[row] = ""
+            self._changed()
+            return True
+
+    def _changed(self):
+        self._unsaved += 1
+        if not self.path:
+            return
+        self._ensure_saver()
+        if self._save_due is not None and self._unsaved >= self.save_every:
+            self._save_due.set()
+
+    def _ensure_saver(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Used outside an event loop: changes are kept until save() is called
+            return
+        if self._loop is loop and self._saver is not None and not self._saver.done():
+            return
+        self._loop = loop
+        self._save_due = asyncio.Event()
+        self._saver = loop.create_task(self._autosave())
+
+    async def _autosave(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._save_due.wait(), timeout=self.save_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._save_due.clear()
+            if self._unsaved:
+                try:
+                    await asyncio.to_thread(self.save)
+                except Exception as e:
+                    logger.error(f"Failed to save vector index to {self.path}: {e}")
+
+    def search(self, vector: List[float], k: int = 3) -> List[Tuple[str, float, str]]:
+        """Return up to k (doc_id, score, content) tuples, best first"""
+        query = self._normalize(vector)
+        if query is None or not self._rows or len(query) != self.dim:
+            return []
+
+        if self.mode == "ivf" and len(self._rows) >= self.ivf_min_size:
+            rows = self._ivf_candidates(query)
+            rows = rows[~self._deleted[rows]]
+            scores = self._matrix[rows] @ query
+        else:
+            # Score the contiguous slice (no copy), then keep live rows
+            rows = np.flatnonzero(~self._deleted[:self._count])
+            scores = (self._matrix[:self._count] @ query)[rows]
+        if rows.size == 0:
+            return []
+
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (self._ids[rows[i]], float(scores[i]), self._contents[rows[i]])
+            for i in top
+        ]
+
+    def _normalize(self, vector: List[float]):
+        row_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(row_vector)
+        # Zero vectors are what create_embeddings returns on failure
+        if norm == 0:
+            return None
+        return row_vector / norm
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        deleted = np.ones(new_capacity, dtype=bool)
+        if self._matrix is not None:
+            matrix[:self._count] = self._matrix[:self._count]
+            deleted[:self._count] = self._deleted[:self._count]
+        self._matrix = matrix
+        self._deleted = deleted
+
+    def _ivf_candidates(self, query):
+        # Retrain once the index has doubled since the last k-means run
+        if self._centroids is None or len(self._rows) >= 2 * self._ivf_size:
+            self._train_ivf()
+        closest = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        return np.concatenate([self._lists[i] for i in closest])
+
+    def _train_ivf(self, iterations: int = 10):
+        """Cluster live rows with spherical k-means"""
+        live = np.flatnonzero(~self._deleted[:self._count])
+        vectors = self._matrix[live]
+        nlist = min(self.nlist, live.size)
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(live.size, nlist, replace=False)]
+
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for i in range(nlist):
+                members = vectors[assignments == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._lists = [live[assignments == i] for i in range(nlist)]
+        self._ivf_size = live.size
+        logger.info(f"Trained IVF index with {nlist} lists over {live.size} vectors")
+
+    def save(self):
+        """Compact tombstones and write the index to disk atomically.
+
+        Safe to run in a worker thread: only the snapshot of the live rows is
+        taken under the lock, the writes happen outside it.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                pending = self._unsaved
+                if pending == 0:
+                    return
+                live = [row for row in range(self._count) if self._ids[row] is not None]
+                dim = self.dim
+                vectors = self._matrix[live] if dim is not None else None
+                meta = {
+                    "dim": dim,
+                    "ids": [self._ids[row] for row in live],
+                    "contents": [self._contents[row] for row in live],
+                }
+            os.makedirs(self.path, exist_ok=True)
+
+            vectors_path = os.path.join(self.path, "vectors.f32")
+            meta_path = os.path.join(self.path, "meta.json")
+            # Each file is written and synced under a temporary name, then renamed over the old one
+            if vectors is not None:
+                with open(vectors_path + ".tmp", "wb") as f:
+                    vectors.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(vectors_path + ".tmp", vectors_path)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(meta_path + ".tmp", meta_path)
+
+            with self._lock:
+                self._unsaved -= pending
+        logger.info(f"Saved vector index with {len(live)} vectors to {self.path}")
+
+    async def close(self):
+        """Stop autosaving and flush unsaved changes without blocking the loop"""
+        if self._saver is not None:
+            self._saver.cancel()
+            if self._loop is asyncio.get_running_loop():
+                await asyncio.gather(self._saver, return_exceptions=True)
+            self._saver = None
+        await asyncio.to_thread(self.save)
+
+    def _load(self):
+        with open(os.path.join(self.path, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.dim = meta["dim"]
+        self._ids = meta["ids"]
+        self._contents = meta["contents"]
+        self._count = len(self._ids)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._deleted = np.zeros(self._count, dtype=bool)
+        if self._count:
+            # Copy-on-write map: pages are read lazily and edits never touch the file
+            self._matrix = np.memmap(
+                os.path.join(self.path, "vectors.f32"),
+                dtype=np.float32,
+                mode="c",
+                shape=(self._count, self.dim),
+            )
+        logger.info(f"Loaded vector index with {self._count} vectors from {self.path}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "vectors": len(self._rows),
+            "dimensions": self.dim,
+            "mode": self.mode,
+            "ivf_lists": len(self._lists),
+            "unsaved_changes": self._unsaved,
+        }
@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import logging
 from llm_service.api import chat
-from llm_service.api.routes.chat import chat_service
+from llm_service.api.routes.chat import chat_service, context_service, mcp_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,6 +13,8 @@ async def lifespan(app: FastAPI):
     await chat_service.initialize()
     yield
     logger.info("LLM Service shutting down...")
+    await context_service.close()
+    await mcp_client.close()
     await chat_service.close()
 
 app = FastAPI(
@@ -1,7 +1,12 @@
+import asyncio
+import json
+import math
+import os
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from llm_service.main import app
+from llm_service.api.routes.chat import chat_service, mcp_client, tool_router
 
 client = TestClient(app)
 
@@ -59,6 +64,124 @@ def test_chat_endpoint_with_context(mock_chat):
     data = response.json()
     assert data["response"] == "Response with context"
 
+@patch('llm_service.core.services.chat_service.ChatService.chat_stream')
+def test_chat_stream_endpoint(mock_chat_stream):
+    """Test streaming chat returns NDJSON metadata, tokens and done events"""
+    async def fake_stream(*args, **kwargs):
+        for token in ["Hello", " there"]:
+            yield token
+
+    mock_chat_stream.return_value = fake_stream()
+
+    response = client.post("/chat/stream", json={"message": "Hello"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[0]["type"] == "metadata"
+    assert events[0]["model"] == "phi3:mini"
+    assert [e["content"] for e in events if e["type"] == "token"] == ["Hello", " there"]
+    assert events[-1]["type"] == "done"
+
+@patch('llm_service.core.services.chat_service.ChatService.chat')
+def test_chat_endpoint_runs_tools_concurrently(mock_chat):
+    """Test selected GitHub tools go out in one batch across all repos and report timings"""
+    mock_chat.return_value = "Here is what you are working on"
+
+    async def fake_batch(calls, timeout=None):
+        results = {
+            "get_issues": {"result": [{"repository": "kb", "number": 1, "title": "Fix login"}]},
+            "get_commits": {"error": "Timed out after 10.0s"},
+        }
+        return [{"tool": call["tool"], **results[call["tool"]], "elapsed_ms": 1.5} for call in calls]
+
+    with patch('llm_service.core.services.context_service.ContextService._select_tools',
+               new=AsyncMock(return_value=["github_issues", "github_commits"])), \
+         patch.object(mcp_client, 'list_github_resources', new=AsyncMock()) as mock_resources, \
+         patch.object(mcp_client, 'call_many', new=AsyncMock(side_effect=fake_batch)) as mock_batch:
+        response = client.post("/chat/", json={"message": "What are my open issues and commits?"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tools_used"] == ["github_issues"]
+    assert data["github_data"]["issues"][0]["title"] == "Fix login"
+    mock_resources.assert_not_awaited()
+    calls = mock_batch.await_args.args[0]
+    assert mock_batch.await_count == 1
+    assert [call["tool"] for call in calls] == ["get_issues", "get_commits"]
+    assert all("repo" not in call["arguments"] for call in calls)
+    assert {"rag_search", "tool_selection", "github_batch", "github_issues", "github_commits", "total"} <= set(data["timings"])
+
+@pytest.mark.asyncio
+async def test_tool_router_fast_path_skips_llm():
+    """Test trigger phrases and plain questions are routed without an LLM call"""
+    with patch.object(tool_router.ollama, 'generate', new=AsyncMock()) as mock_generate:
+        assert await tool_router.select_tools("Show me my repos and my commits!") == ["github_repos", "github_commits"]
+        assert await tool_router.select_tools("Hello, how are you?") == []
+    mock_generate.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_tool_router_falls_back_to_llm_for_ambiguous_questions():
+    """Test questions with GitHub hints but no trigger phrase ask the LLM"""
+    with patch.object(tool_router.ollama, 'generate', new=AsyncMock(return_value='["github_issues", "bogus"]')):
+        assert await tool_router.select_tools("Which bug should I fix first?") == ["github_issues"]
+
+@pytest.mark.asyncio
+async def test_tool_routes_are_cached_per_model():
+    """Test a route cached for one model is not reused by another"""
+    from llm_service.core.tool_router import ToolRouter
+    from infrastructure.redis_cache import RedisCache
+
+    cache = RedisCache(local_max_bytes=4096)
+    generate = AsyncMock(return_value='["github_issues"]')
+    ollama = MagicMock(generate=generate)
+    phi = ToolRouter(ollama, "phi3:mini", cache)
+    llama = ToolRouter(ollama, "llama3", cache)
+
+    for router in (phi, phi, llama):
+        assert await router.select_tools("Which bug should I fix first?") == ["github_issues"]
+    assert generate.await_count == 2
+    assert phi.counters["cache_hit"] == 1 and llama.counters["cache_hit"] == 0
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_chats_share_one_generation():
+    """Test single-flight coalesces identical in-flight prompts"""
+    calls = 0
+
+    async def slow_chat(model, messages):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return " Coalesced answer "
+
+    with patch.object(chat_service.ollama, 'chat', new=slow_chat):
+        results = await asyncio.gather(*(chat_service.chat("Same question?") for _ in range(5)))
+
+    assert results == ["Coalesced answer"] * 5
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_local_cache_tier_serves_hits_and_honours_ttl():
+    """Test the in-process L1 tier works without Redis and expires entries"""
+    from infrastructure.redis_cache import RedisCache
+
+    cache = RedisCache(local_max_bytes=1024)
+    await cache.set("hot", {"answer": 42}, expire=60)
+    await cache.set("cold", "gone", expire=0)
+
+    assert await cache.get("hot") == {"answer": 42}
+    assert await cache.get("cold") is None
+    assert cache.stats()["l1"]["hits"] == 1
+    assert cache.stats()["l1"]["misses"] == 1
+
+def test_stats_endpoint():
+    """Test stats endpoint reports tool routing counters"""
+    response = client.get("/chat/stats")
+    assert response.status_code == 200
+    routing = response.json()["tool_routing"]
+    assert "fast_path" in routing
+    assert "fast_path_ratio" in routing
+
 def test_chat_endpoint_missing_message():
     """Test chat request with missing message field"""
     response = client.post("/chat/", json={})
@@ -125,6 +248,190 @@ def test_embeddings_endpoint_error_handling(mock_embeddings):
     
     assert response.status_code == 500
 
+@patch('llm_service.core.services.chat_service.ChatService.create_embeddings_batch')
+def test_embeddings_batch_endpoint_success(mock_batch):
+    """Test batch embeddings endpoint returns one vector per text"""
+    mock_batch.return_value = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+
+    response = client.post(
+        "/chat/embeddings/batch",
+        json={"texts": ["first chunk", "second chunk"]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    assert data["dimensions"] == 3
+    assert data["embeddings"][1] == [0.4, 0.5, 0.6]
+
+@pytest.mark.asyncio
+async def test_embeddings_batch_sends_only_misses_in_chunks():
+    """Test batch embeddings de-duplicate, chunk and reuse cached vectors"""
+    sent = []
+
+    async def fake_embed(model, inputs):
+        sent.append(list(inputs))
+        return [[float(len(text))] for text in inputs]
+
+    with patch.object(chat_service.ollama, 'generate_embeddings_batch', new=fake_embed):
+        first = await chat_service.create_embeddings_batch(["aa", "bbb", "aa", "c"], batch_size=2)
+        second = await chat_service.create_embeddings_batch(["aa", "dddd"])
+
+    assert first == [[2.0], [3.0], [2.0], [1.0]]
+    assert second == [[2.0], [4.0]]
+    assert sent == [["aa", "bbb"], ["c"], ["dddd"]]
+
+@pytest.mark.asyncio
+async def test_concurrent_single_embeddings_are_micro_batched():
+    """Test concurrent create_embeddings calls share one /api/embed request"""
+    sent = []
+
+    async def fake_embed(model, inputs):
+        sent.append(list(inputs))
+        return [[float(len(text))] for text in inputs]
+
+    with patch.object(chat_service.ollama, 'generate_embeddings_batch', new=fake_embed):
+        vectors = await asyncio.gather(*(chat_service.create_embeddings(text) for text in ["x", "yy", "zzz"]))
+
+    assert vectors == [[1.0], [2.0], [3.0]]
+    assert sent == [["x", "yy", "zzz"]]
+
+@pytest.mark.asyncio
+async def test_embedding_batcher_fails_callers_it_cannot_answer():
+    """Test a short model reply and close() fail pending requests instead of leaving them hanging"""
+    from llm_service.core.services.embedding_batcher import EmbeddingBatcher
+
+    async def short_reply(texts):
+        return [[1.0]] * (len(texts) - 1)
+
+    batcher = EmbeddingBatcher(short_reply, max_wait_ms=20)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True), timeout=1
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+    await batcher.close()
+
+    never = asyncio.Event()
+
+    async def stuck(texts):
+        await never.wait()
+
+    # One batch in flight, one waiting for a model slot, one still queued
+    batcher = EmbeddingBatcher(stuck, max_batch_size=1, max_wait_ms=0, max_in_flight=1)
+    pending = [asyncio.create_task(batcher.submit(text)) for text in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+    await batcher.close()
+    results = await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), timeout=1)
+    assert [str(result) for result in results] == ["Embedding batcher closed"] * 3
+
+@pytest.mark.parametrize("dtype,tolerance", [("float32", 1e-6), ("float16", 1e-3), ("int8", 1e-2)])
+def test_vector_codec_round_trip(dtype, tolerance):
+    """Test binary vector encodings decode back within their precision"""
+    from infrastructure.vector_codec import encode_vector, decode_vector
+
+    vector = [math.sin(i) for i in range(1024)]
+    encoded = encode_vector(vector, dtype)
+
+    assert len(encoded) < len(json.dumps(vector)) / 3
+    assert all(abs(a - b) < tolerance for a, b in zip(decode_vector(encoded), vector))
+
+def test_vector_index_exact_and_ivf_agree_and_persist(tmp_path):
+    """Test IVF search finds the exact top hit and the index reloads from disk"""
+    from infrastructure.vector_index import VectorIndex
+
+    exact = VectorIndex(path=str(tmp_path))
+    ivf = VectorIndex(mode="ivf", nlist=4, nprobe=4, ivf_min_size=8)
+    for i in range(32):
+        vector = [math.sin(i * (d + 1) + 1) for d in range(8)]
+        exact.add(f"doc-{i}", vector, f"content {i}")
+        ivf.add(f"doc-{i}", vector, f"content {i}")
+    exact.delete("doc-3")
+    query = [math.sin(5 * (d + 1) + 1) for d in range(8)]
+
+    assert exact.search(query, 1)[0][0] == "doc-5"
+    assert ivf.search(query, 1)[0][0] == "doc-5"
+
+    exact.save()
+    reloaded = VectorIndex(path=str(tmp_path))
+    assert len(reloaded) == 31
+    assert reloaded.search(query, 1)[0][:1] == ("doc-5",)
+    assert reloaded.search(query, 1)[0][2] == "content 5"
+
+@pytest.mark.asyncio
+async def test_vector_index_autosaves_in_the_background_and_flushes_on_close(tmp_path):
+    """Test changes reach disk off the request path after save_every of them, and close() saves the rest"""
+    from infrastructure.vector_index import VectorIndex
+
+    index = VectorIndex(path=str(tmp_path), save_every=3, save_interval=3600)
+    for i in range(3):
+        index.add(f"doc-{i}", [1.0, float(i)], f"content {i}")
+    assert not os.path.exists(tmp_path / "meta.json")
+
+    for _ in range(100):
+        if index.stats()["unsaved_changes"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    # Simulates a crash: the index is never saved explicitly
+    assert len(VectorIndex(path=str(tmp_path))) == 3
+    assert sorted(os.listdir(tmp_path)) == ["meta.json", "vectors.f32"]
+
+    index.add("doc-3", [1.0, 3.0], "content 3")
+    await index.close()
+    assert len(VectorIndex(path=str(tmp_path))) == 4
+    assert index.stats()["unsaved_changes"] == 0
+
+@pytest.mark.asyncio
+async def test_rag_falls_back_to_local_index_when_search_service_fails():
+    """Test documents embedded with an id are retrieved locally when remote search is down"""
+    from infrastructure.vector_index import VectorIndex
+    from llm_service.core import ContextService
+
+    async def fake_embed(model, inputs):
+        return [[1.0, float(len(text))] for text in inputs]
+
+    with patch.object(chat_service, 'vector_index', VectorIndex()), \
+         patch.object(chat_service.ollama, 'generate_embeddings_batch', new=fake_embed):
+        await chat_service.create_embeddings_batch(["short", "a much longer document"], document_ids=["s", "l"])
+        context_service = ContextService(None, None, local_search=chat_service.search_local)
+        with patch.object(context_service.client, 'get', new=AsyncMock(side_effect=Exception("down"))):
+            rag_context, doc_sources = await context_service._search("tiny", 1)
+        await context_service.close()
+
+        assert rag_context == ["short"]
+        assert doc_sources[0]["document_id"] == "s"
+        assert chat_service.remove_document("s") is True
+        assert [hit["document_id"] for hit in await chat_service.search_local("tiny", 3)] == ["l"]
+
+@pytest.mark.asyncio
+async def test_rag_fallback_skips_local_search_when_remote_answers():
+    """Test the local lookup, and so the question's embedding, only runs when the remote search is empty"""
+    from llm_service.core import ContextService
+
+    local_search = AsyncMock(return_value=[])
+    context_service = ContextService(None, None, local_search=local_search)
+    remote = {"results": [{"document_id": "d", "score": 0.9, "content": "remote hit"}]}
+    response = AsyncMock(status_code=200, json=lambda: remote)
+    with patch.object(context_service.client, 'get', new=AsyncMock(return_value=response)):
+        rag_context, _ = await context_service._search("question", 1)
+    await context_service.close()
+
+    assert rag_context == ["remote hit"]
+    local_search.assert_not_awaited()
+
+def test_embeddings_batch_rejects_mismatched_document_ids():
+    """Test document_ids must pair up with texts"""
+    response = client.post(
+        "/chat/embeddings/batch",
+        json={"texts": ["one", "two"], "document_ids": ["only-one"]}
+    )
+    assert response.status_code == 422
+
+def test_vector_codec_reads_legacy_json_entries():
+    """Test vectors cached as JSON before the binary format still decode"""
+    from infrastructure.vector_codec import decode_vector
+
+    assert decode_vector(b"[0.1, 0.2]") == [0.1, 0.2]
+
 # Document analysis endpoint tests
 @patch('llm_service.core.services.chat_service.ChatService.analyze_document')
 def test_analyze_endpoint_success(mock_analyze):
@@ -246,4 +553,430 @@ def test_summarize_endpoint_with_defaults():
         
         assert response.status_code == 200
         # Verify default max_length was used (200)
-        mock_summarize.assert_called_once()
\ No newline at end of file
+        mock_summarize.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_ollama_scheduler_serves_interactive_before_batch():
+    """Test queued calls start by priority class once a slot frees up"""
+    from llm_service.clients import OllamaScheduler
+
+    scheduler = OllamaScheduler(max_in_flight=1)
+    order = []
+    release = asyncio.Event()
+
+    async def call(priority):
+        async with scheduler.slot("phi3:mini", priority):
+            order.append(priority)
+            await release.wait()
+
+    running = asyncio.create_task(call("batch"))
+    await asyncio.sleep(0)
+    waiting = [asyncio.create_task(call(p)) for p in ("batch", "embedding", "interactive")]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(running, *waiting)
+
+    assert order == ["batch", "interactive", "embedding", "batch"]
+    assert scheduler.stats()["classes"]["interactive"]["admitted"] == 1
+
+def test_overloaded_queue_returns_429_with_retry_after():
+    """Test a full queue is rejected with 429 and Retry-After instead of waiting"""
+    with patch.dict(chat_service.scheduler.max_queue_depth, {"batch": 0}), \
+         patch.dict(chat_service.scheduler._in_flight, {chat_service.model: chat_service.scheduler.max_in_flight}):
+        response = client.post("/chat/analyze", json={"text": "A long report"})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert chat_service.scheduler.stats()["classes"]["batch"]["rejected"] >= 1
+
+@pytest.mark.asyncio
+async def test_ollama_pool_prefers_loaded_backends_and_ejects_failures():
+    """Test calls spread by outstanding load, favour warm models and skip failing hosts"""
+    import httpx
+    from llm_service.clients import OllamaClient
+
+    hits = []
+
+    def handler(request):
+        hits.append(request.url.host)
+        if request.url.host == "bad":
+            raise httpx.ConnectError("connection refused")
+        if request.url.path == "/api/ps":
+            loaded = [{"name": "phi3:mini"}] if request.url.host == "warm" else []
+            return httpx.Response(200, json={"models": loaded})
+        return httpx.Response(200, json={"response": request.url.host})
+
+    ollama = OllamaClient(base_urls=["http://cold:11434", "http://warm:11434", "http://bad:11434"], health_check_interval=0)
+    ollama.client = ollama.pool.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert await ollama.is_available()
+    assert [b.ejected for b in ollama.pool.backends] == [False, False, True]
+    assert await ollama.generate("phi3:mini", "hi") == "warm"
+
+    # Hold calls open on the warm host until the cold one becomes the cheaper choice
+    busy = [ollama.pool.acquire("phi3:mini") for _ in range(ollama.pool.load_penalty)]
+    assert {b.url for b in busy} == {"http://warm:11434"}
+    assert ollama.pool.acquire("phi3:mini").url == "http://cold:11434"
+    await ollama.close()
+
+@pytest.mark.asyncio
+async def test_ollama_pool_ejects_backends_answering_health_checks_with_garbage():
+    """Test a 200 health response that is not JSON ejects the backend instead of raising"""
+    import httpx
+    from llm_service.clients import OllamaClient
+
+    def handler(request):
+        if request.url.host == "proxied":
+            return httpx.Response(200, text="<html>502 Bad Gateway</html>")
+        return httpx.Response(200, json={"models": []})
+
+    ollama = OllamaClient(base_urls=["http://ok:11434", "http://proxied:11434"], health_check_interval=0)
+    ollama.client = ollama.pool.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert await ollama.pool.check_all() == [True, False]
+    assert [b.ejected for b in ollama.pool.backends] == [False, True]
+    await ollama.close()
+
+def test_split_into_chunks_respects_token_budget():
+    """Test long text is split at sentence boundaries within the token budget"""
+    from llm_service.core.chunking import estimate_tokens, split_into_chunks
+
+    text = " ".join(f"Sentence number {i} talks about caching." for i in range(200))
+    chunks = split_into_chunks(text, max_tokens=100, overlap_tokens=10)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert split_into_chunks("short text", max_tokens=100) == ["short text"]
+
+@pytest.mark.asyncio
+async def test_long_document_summary_is_map_reduced_and_chunks_cached():
+    """Test long documents are summarized per chunk, reduced, and chunk summaries reused"""
+    prompts = []
+
+    async def fake_generate(model, prompt, priority="interactive"):
+        prompts.append(prompt)
+        return "combined" if prompt.startswith("These are summaries") else f"part {len(prompts)}"
+
+    text = "\n\n".join(f"Paragraph {i}. " + "Details about the system. " * 20 for i in range(6))
+    with patch.object(chat_service, 'chunk_max_tokens', 200), \
+         patch.object(chat_service, 'reduce_fan_in', 4), \
+         patch.object(chat_service.ollama, 'generate', new=fake_generate):
+        first = await chat_service.summarize_text(text, max_length=100)
+        calls_after_first = len(prompts)
+        second = await chat_service.summarize_text(text, max_length=100)
+
+    assert first == second == {"summary": "combined"}
+    map_calls = [p for p in prompts if not p.startswith("These are summaries")]
+    assert len(map_calls) == 6
+    assert calls_after_first > 6
+    assert len(prompts) == calls_after_first
+
+@pytest.mark.asyncio
+async def test_summary_cache_writes_use_the_summary_ttl_once_per_result():
+    """Test chunk summaries use the configured TTL and a single-chunk summary is stored once"""
+    async def fake_generate(model, prompt, priority="interactive"):
+        return "combined" if prompt.startswith("These are summaries") else "part"
+
+    long_text = "\n\n".join(f"Section {i}. " + "Notes on the ingest path. " * 20 for i in range(4))
+    with patch.object(chat_service, 'chunk_max_tokens', 200), \
+         patch.object(chat_service, 'summary_cache_ttl', 123), \
+         patch.object(chat_service.ollama, 'generate', new=fake_generate), \
+         patch.object(chat_service.cache, 'set', wraps=chat_service.cache.set) as spy:
+        await chat_service.summarize_text(long_text, max_length=90)
+        assert spy.await_count > 1
+        assert {call.kwargs["expire"] for call in spy.await_args_list} == {123}
+
+        spy.reset_mock()
+        await chat_service.summarize_text("A short note about ingest.", max_length=90)
+        assert spy.await_count == 1
+
+def test_merge_analyses_dedupes_entities_and_tasks():
+    """Test partial analyses merge without duplicate entities or tasks"""
+    from llm_service.core.map_reduce import merge_analyses
+
+    partials = [
+        {"key_concepts": ["Caching"], "entities": {"people": ["Ada"], "technologies": ["Redis"]},
+         "tasks": [{"task": "Add TTLs", "priority": "low"}], "themes": ["speed"], "difficulty_level": "advanced"},
+        {"key_concepts": ["caching", "Batching"], "entities": {"people": ["ada", "Linus"], "technologies": ["redis"]},
+         "tasks": [{"task": "add  TTLs", "priority": "high"}], "themes": ["Speed"], "difficulty_level": "intermediate"},
+    ]
+
+    merged = merge_analyses(partials, "summary")
+
+    assert merged["key_concepts"] == ["Caching", "Batching"]
+    assert merged["entities"]["people"] == ["Ada", "Linus"]
+    assert merged["entities"]["technologies"] == ["Redis"]
+    assert merged["tasks"] == [{"task": "Add TTLs", "priority": "high"}]
+    assert merged["themes"] == ["speed"]
+    assert merged["difficulty_level"] == "advanced"
+
+def test_content_defined_chunks_are_stable_under_edits():
+    """Test an edit in one place leaves the chunks elsewhere in the document unchanged"""
+    from llm_service.core.chunking import content_defined_chunks, estimate_tokens
+
+    sentences = [f"Sentence {i} describes component {i * 7 % 13} of the pipeline." for i in range(300)]
+    text = " ".join(sentences)
+    edited = text.replace("Sentence 150 describes", "Sentence 150 now thoroughly describes")
+
+    chunks = content_defined_chunks(text, target_tokens=100, min_tokens=30, max_tokens=300)
+    edited_chunks = content_defined_chunks(edited, target_tokens=100, min_tokens=30, max_tokens=300)
+
+    assert "".join(chunks) == text
+    assert len(chunks) > 3
+    assert all(estimate_tokens(chunk) <= 300 for chunk in chunks)
+    assert len(set(chunks) - set(edited_chunks)) == 1
+    # Text that fits one prompt is not split at all
+    assert content_defined_chunks(text[:1000], target_tokens=100, min_tokens=30, max_tokens=300) == [text[:1000]]
+
+@pytest.mark.asyncio
+async def test_reanalysis_only_recomputes_edited_chunks():
+    """Test re-analyzing an edited document only sends the changed chunk to the model"""
+    from llm_service.core.models import DocumentAnalysisModel
+
+    analyzed = []
+
+    async def fake_structured(model, prompt, response_format, priority="batch"):
+        analyzed.append(prompt)
+        return DocumentAnalysisModel(summary=f"part {len(analyzed)}", key_concepts=["pipelines"])
+
+    async def fake_generate(model, prompt, priority="interactive"):
+        return "combined"
+
+    text = " ".join(f"Stage {i} hands work to stage {i + 1} through queue {i % 5}." for i in range(300))
+    edited = text.replace("Stage 200 hands", "Stage 200 reliably hands")
+    with patch.object(chat_service, 'cdc_target_tokens', 100), \
+         patch.object(chat_service, 'cdc_min_tokens', 30), \
+         patch.object(chat_service.ollama, 'generate_structured', new=fake_structured), \
+         patch.object(chat_service.ollama, 'generate', new=fake_generate):
+        first = await chat_service.analyze_document(text, "technical")
+        first_calls = len(analyzed)
+        second = await chat_service.analyze_document(edited, "technical")
+
+    assert first_calls > 3
+    assert len(analyzed) == first_calls + 1
+    assert first["key_concepts"] == second["key_concepts"] == ["pipelines"]
+
+def test_merge_task_extractions_totals_merged_estimates():
+    """Test per-chunk task lists merge and the time estimate is re-totalled"""
+    from llm_service.core.map_reduce import merge_task_extractions
+
+    merged = merge_task_extractions([
+        {"tasks": [{"task": "Write docs", "priority": "low", "estimated_hours": 2}], "estimated_time": "2 hours"},
+        {"tasks": [{"task": "write docs", "priority": "high", "estimated_hours": 2},
+                   {"task": "Ship", "priority": "medium", "estimated_hours": 3}], "estimated_time": "5 hours"},
+    ])
+
+    assert [task["task"] for task in merged["tasks"]] == ["Write docs", "Ship"]
+    assert merged["tasks"][0]["priority"] == "high"
+    assert merged["estimated_time"] == "5 hours"
+
+@pytest.mark.asyncio
+async def test_cached_analysis_answers_extract_and_tasks():
+    """Test a full analysis is cached and reused for entity and task extraction of the same text"""
+    from llm_service.core.models import DocumentAnalysisModel, EntityDict, TaskModel
+
+    calls = []
+
+    async def fake_structured(model, prompt, response_format, priority="batch"):
+        calls.append(response_format)
+        return DocumentAnalysisModel(
+            summary="Grace plans the migration",
+            key_concepts=["migration"],
+            entities=EntityDict(people=["Grace"], organizations=["Navy"]),
+            tasks=[TaskModel(task="Move the database", priority="high", estimated_hours=3)],
+        )
+
+    text = "Grace from the Navy plans to move the database next week."
+    with patch.object(chat_service.ollama, 'generate_structured', new=fake_structured):
+        first = await chat_service.analyze_document(text, "technical")
+        second = await chat_service.analyze_document(text, "technical")
+        entities = await chat_service.extract_entities(text)
+        tasks = await chat_service.extract_tasks(text)
+
+    assert calls == [DocumentAnalysisModel]
+    assert first == second
+    assert entities == {
+        "people": ["Grace"], "organizations": ["Navy"], "concepts": ["migration"],
+        "summary": "Grace plans the migration",
+    }
+    assert [task["task"] for task in tasks["tasks"]] == ["Move the database"]
+    assert tasks["estimated_time"] == "3 hours"
+
+@pytest.mark.asyncio
+async def test_single_chunk_results_are_stored_once():
+    """Test one-chunk texts are cached only under their document key, with the analysis ref as a pointer"""
+    from llm_service.core.models import DocumentAnalysisModel, EntityExtractionModel, TaskExtractionModel
+
+    async def fake_structured(model, prompt, response_format, priority="batch"):
+        if response_format is DocumentAnalysisModel:
+            return DocumentAnalysisModel(summary="Ada reviews the cache", key_concepts=["caching"])
+        if response_format is EntityExtractionModel:
+            return EntityExtractionModel(people=["Ada"], summary="Ada reviews the cache")
+        return TaskExtractionModel(tasks=[], estimated_time="0 hours")
+
+    with patch.object(chat_service.ollama, 'generate_structured', new=fake_structured), \
+         patch.object(chat_service.cache, 'set', wraps=chat_service.cache.set) as spy:
+        await chat_service.extract_entities("Ada reviews the cache layer today.")
+        await chat_service.extract_tasks("Ada reviews the cache layer tomorrow.")
+        assert spy.await_count == 2
+
+        spy.reset_mock()
+        text = "Ada reviews the cache layer on Friday."
+        analysis = await chat_service.analyze_document(text)
+        stored = [call.args[1] for call in spy.await_args_list]
+        assert stored.count(analysis) == 1 and len(stored) == 2
+        assert await chat_service._cached_analysis(text) == analysis
+
+@pytest.mark.asyncio
+async def test_cache_namespaces_follow_model_and_invalidate_by_generation():
+    """Test keys are namespaced by model and prompt version and bumped by invalidation"""
+    from infrastructure.redis_cache import RedisCache
+
+    cache = RedisCache(local_max_bytes=1024)
+    phi = cache.namespace("chat", "phi3:mini", "v1")
+    llama = cache.namespace("chat", "llama3", "v1")
+    assert phi != llama and phi.startswith("chat:")
+
+    key = await cache.namespaced_key(phi, "hello")
+    assert key.startswith(f"llm:{phi}:g0:")
+    assert key != await cache.namespaced_key(llama, "hello")
+
+    await cache.set(key, "cached answer", expire=60)
+    assert await cache.invalidate_namespace(phi) == 1
+    new_key = await cache.namespaced_key(phi, "hello")
+    assert new_key.startswith(f"llm:{phi}:g1:")
+    assert await cache.get(new_key) is None
+
+@pytest.mark.asyncio
+async def test_l1_keeps_vectors_packed_and_decodes_on_read():
+    """Test L1 holds the packed vector bytes it is sized by and decodes them on a hit"""
+    from infrastructure.redis_cache import RedisCache
+
+    cache = RedisCache(local_max_bytes=4096, vector_dtype="int8")
+    vector = [0.5, -0.25, 1.0, 0.0] * 64
+    await cache.set_vector("embed:a", vector, expire=60)
+
+    held = cache.local.get("embed:a")
+    assert isinstance(held, bytes) and cache.local.size == len(held)
+    first = await cache.get_vector("embed:a")
+    assert first == pytest.approx(vector, abs=0.01)
+    assert (await cache.get_vectors(["embed:a"]))[0] == first
+    assert cache.stats()["l1"]["hits"] == 2
+
+@pytest.mark.asyncio
+async def test_purge_stale_generations_scans_and_unlinks_old_entries():
+    """Test the background purge deletes only entries from earlier generations"""
+    from infrastructure.redis_cache import RedisCache
+
+    class FakeRedis:
+        def __init__(self):
+            self.data = {}
+
+        async def get(self, key):
+            return self.data.get(key)
+
+        async def incr(self, key):
+            self.data[key] = int(self.data.get(key, 0)) + 1
+            return self.data[key]
+
+        async def scan_iter(self, match, count):
+            for key in list(self.data):
+                if key.startswith(match.rstrip("*")):
+                    yield key
+
+        async def unlink(self, *keys):
+            for key in keys:
+                del self.data[key]
+            return len(keys)
+
+    cache = RedisCache()
+    cache.client = FakeRedis()
+    namespace = cache.namespace("summary", "phi3:mini", "v1")
+    cache.client.data[await cache.namespaced_key(namespace, "a")] = "old"
+    cache.client.data[await cache.namespaced_key(cache.namespace("chat", "phi3:mini"), "a")] = "other"
+    await cache.invalidate_namespace(namespace)
+    fresh = await cache.namespaced_key(namespace, "a")
+    cache.client.data[fresh] = "new"
+
+    assert await cache.purge_stale_generations(namespace) == 1
+    assert fresh in cache.client.data
+    assert set(cache.client.data.values()) == {1, "new", "other"}
+
+def test_cache_invalidate_endpoint_forces_recompute():
+    """Test invalidating the chat namespace makes the next identical chat call the model again"""
+    calls = []
+
+    async def fake_chat(model, messages, priority="interactive"):
+        calls.append(messages)
+        return f"answer {len(calls)}"
+
+    with patch.object(chat_service.ollama, 'chat', new=fake_chat):
+        first = asyncio.run(chat_service.chat("namespaced question"))
+        assert asyncio.run(chat_service.chat("namespaced question")) == first
+
+        response = client.post("/chat/cache/invalidate", json={"operations": ["chat"]})
+        assert response.status_code == 200
+        assert response.json()["invalidated"]["chat"]["generation"] >= 1
+
+        assert asyncio.run(chat_service.chat("namespaced question")) != first
+    assert len(calls) == 2
+
+    assert client.post("/chat/cache/invalidate", json={"operations": ["nope"]}).status_code == 422
+
+def test_semantic_cache_matches_by_similarity_and_evicts_lru():
+    """Test the semantic tier honours the threshold, context fingerprint, and LRU bound"""
+    from infrastructure.semantic_cache import SemanticCache
+
+    cache = SemanticCache(max_entries=2, threshold=0.9)
+    cache.add("ctx", [1.0, 0.0, 0.0], "repos answer")
+    cache.add("ctx", [0.0, 1.0, 0.0], "issues answer")
+
+    assert cache.lookup("ctx", [0.95, 0.1, 0.0]) == "repos answer"
+    assert cache.lookup("other ctx", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("ctx", [0.6, 0.6, 0.5]) is None
+    assert cache.lookup("ctx", [0.0, 0.0, 0.0]) is None
+
+    # "repos answer" was used last, so the issues entry is evicted
+    cache.add("ctx", [0.0, 0.0, 1.0], "pulls answer")
+    assert cache.lookup("ctx", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("ctx", [1.0, 0.0, 0.0]) == "repos answer"
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["lookups"] == 5
+    assert stats["hit_rate"] == 0.4
+
+@pytest.mark.asyncio
+async def test_chat_semantic_cache_answers_paraphrases():
+    """Test a paraphrased question is answered from the semantic cache without a generation"""
+    from infrastructure.semantic_cache import SemanticCache
+
+    vectors = {
+        "what are my repos": [1.0, 0.1, 0.0],
+        "list my repositories": [0.98, 0.15, 0.0],
+        "what is the weather": [0.0, 0.2, 1.0],
+    }
+    generations = []
+
+    async def fake_embeddings(text, document_id=None):
+        return vectors[text]
+
+    async def fake_chat(model, messages, priority="interactive"):
+        generations.append(messages[-1]["content"])
+        return f"answer {len(generations)}"
+
+    with patch.object(chat_service, 'semantic_cache', SemanticCache(threshold=0.95)), \
+         patch.object(chat_service, 'create_embeddings', new=fake_embeddings), \
+         patch.object(chat_service.ollama, 'chat', new=fake_chat):
+        first = await chat_service.chat("What are my repos?")
+        paraphrase = await chat_service.chat("List my   repositories")
+        unrelated = await chat_service.chat("What is the weather?")
+        stats = chat_service.semantic_cache.stats()
+
+    assert first == paraphrase == "answer 1"
+    assert unrelated == "answer 2"
+    assert len(generations) == 2
+    assert stats["hits"] == 1